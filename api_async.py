@@ -0,0 +1,337 @@
+"""Serveur HTTP asyncio (stdlib) : mêmes routes que api_server, ressources bornées.
+
+- le travail SQLite part dans un exécuteur de taille fixe (une connexion du pool par thread) ;
+- les appels LLM passent par une voie séparée, à concurrence limitée, pour ne pas
+  affamer /search ;
+- à saturation : 503 (voie SQL, connexions) ou 429 (voie LLM) avec Retry-After,
+  au lieu d'empiler des threads. Sans cache de réponses (use_cache=false), la voie
+  LLM pleine est refusée avant tout travail SQL ; avec le cache, la recherche passe
+  d'abord par la voie SQL (un succès du cache est servi même voie LLM pleine) et le
+  refus n'intervient qu'ensuite, à l'entrée de la voie LLM.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from api_server import (
+    CORS_HEADERS,
+    JSONL_HEADERS,
+    SSE_HEADERS,
+    answer_generate,
+    answer_retrieve,
+    answer_stream_events,
+    handle_get,
+    parse_answer_request,
+    parse_batch_request,
+    prepare_db,
+    sse_event,
+)
+from batch import DEFAULT_WORKERS, encode_record, result_record, run_item
+from store.sqlite import ConnectionPool, PoolExhausted
+
+MAX_BODY_BYTES = 1_000_000
+READ_TIMEOUT_S = 30.0
+
+
+class HttpError(Exception):
+    """Réponse d'erreur immédiate (voie pleine, corps trop gros...), Retry-After si > 0."""
+
+    def __init__(self, status: int, message: str, retry_after: int = 0):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Lane:
+    """Exécuteur à threads borné : au plus workers tâches actives + max_pending en attente.
+
+    Le compteur n'est manipulé que depuis la boucle asyncio (pas de verrou).
+    """
+
+    def __init__(self, name: str, workers: int, max_pending: int, *, status: int, retry_after: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.limit = self.workers + max(0, max_pending)
+        self.status = status
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"raglite-{name}")
+
+    async def run(self, fn, *args):
+        if self.inflight >= self.limit:
+            self.rejected += 1
+            raise HttpError(self.status, f"{self.name} saturated", self.retry_after)
+        self.inflight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+        finally:
+            self.inflight -= 1
+
+    def stats(self) -> Dict:
+        return {"workers": self.workers, "limit": self.limit, "inflight": self.inflight, "rejected": self.rejected}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncApiServer:
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        pool_size: int = 8,
+        llm_concurrency: int = 2,
+        max_pending: int = 64,
+        max_connections: int = 512,
+    ):
+        self.db_path = db_path
+        # une connexion par thread SQL : l'acquisition ne bloque jamais
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        self.sql = Lane("sql", pool_size, max_pending, status=503, retry_after=1)
+        self.llm = Lane("llm", llm_concurrency, max_pending, status=429, retry_after=10)
+        self.max_connections = max_connections
+        self.connections = 0
+        self._tasks: set = set()
+
+    # ---- HTTP ----
+
+    @staticmethod
+    def _head(status: int, headers: List[Tuple[str, str]]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", "Server: raglite/0.2"]
+        lines += [f"{k}: {v}" for k, v in headers + CORS_HEADERS]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def _encode(self, status: int, payload: Optional[Dict], extra: List[Tuple[str, str]] = ()) -> bytes:
+        headers = [("Connection", "close")]
+        data = b""
+        if payload is not None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            headers += [("Content-Type", "application/json; charset=utf-8"), ("Content-Length", str(len(data)))]
+        return self._head(status, headers + list(extra)) + data
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        line = await reader.readline()
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        length = 0
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "payload too large")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method.upper(), target, body
+
+    def _check_llm(self) -> None:
+        # refus immédiat si la voie LLM est pleine ; appelé avant la voie SQL seulement
+        # quand le cache de réponses est désactivé (sinon un succès du cache serait refusé)
+        if self.llm.inflight >= self.llm.limit:
+            self.llm.rejected += 1
+            raise HttpError(self.llm.status, "llm saturated", self.llm.retry_after)
+
+    async def _stream(self, req: Dict, retrieved) -> AsyncIterator[bytes]:
+        """SSE : en-têtes puis événements produits par un thread de la voie LLM."""
+        yield self._head(200, SSE_HEADERS)
+        if retrieved[4] is not None:
+            # réponse du cache persistant : rejouée sans thread ni voie LLM
+            for part in answer_stream_events(req, retrieved, self.db_path):
+                yield part
+            return
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        abandoned = []
+
+        def pump() -> None:
+            for part in answer_stream_events(req, retrieved, self.db_path):
+                if abandoned:  # client parti : on coupe la génération Ollama
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, part)
+
+        async def run() -> None:
+            try:
+                await self.llm.run(pump)
+            except HttpError as e:
+                queue.put_nowait(sse_event("error", {"error": str(e)}))
+            finally:
+                queue.put_nowait(None)
+
+        self._tasks.add(task := asyncio.ensure_future(run()))
+        task.add_done_callback(self._tasks.discard)
+        try:
+            while (part := await queue.get()) is not None:
+                yield part
+        finally:
+            abandoned.append(True)
+
+    async def _batch(self, items: List[Any], ordered: bool) -> AsyncIterator[bytes]:
+        """POST /batch : un enregistrement JSONL par élément, exécuté par la voie SQL.
+
+        Au plus DEFAULT_WORKERS éléments en cours : un lot n'occupe pas toute la voie
+        et ne remplit pas sa file d'attente (voie saturée -> 503 pour l'élément).
+        """
+        yield self._head(200, JSONL_HEADERS)
+        window = min(DEFAULT_WORKERS, self.sql.workers)
+        pending: deque = deque()
+
+        async def one(i: int, item: Any) -> Dict:
+            try:
+                return await self.sql.run(run_item, self.pool, self.db_path, i, item)
+            except HttpError as e:
+                return result_record(i, item, e.status, {"error": str(e)}, 0.0)
+
+        todo = enumerate(items)
+        try:
+            while True:
+                for i, item in todo:
+                    pending.append(asyncio.ensure_future(one(i, item)))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    break
+                if ordered:
+                    done = [await pending.popleft()]
+                else:
+                    finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        pending.remove(task)
+                    done = [task.result() for task in finished]
+                for record in done:
+                    yield encode_record(record)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Union[None, Dict, AsyncIterator[bytes]]]:
+        parsed = urlparse(target)
+        if method == "OPTIONS":
+            return 204, None
+        if method == "GET":
+            if parsed.path == "/health":
+                return 200, {"ok": True, "sql": self.sql.stats(), "llm": self.llm.stats()}
+            if parsed.path == "/stats":
+                # pas d'accès SQLite : servi directement par la boucle
+                status, payload = handle_get(self.pool, parsed.path, {})
+                return status, dict(payload, sql=self.sql.stats(), llm=self.llm.stats())
+            return await self.sql.run(handle_get, self.pool, parsed.path, parse_qs(parsed.query))
+        if method == "POST" and parsed.path == "/answer":
+            req, error = parse_answer_request(body)
+            if error:
+                return error
+            if req["mode"] not in ("context", "rules") and not req["use_cache"]:
+                self._check_llm()
+            response, retrieved = await self.sql.run(answer_retrieve, self.pool, self.db_path, req)
+            if response is None:
+                if retrieved[4] is not None:
+                    # réponse du cache persistant : pas de passage par la voie LLM
+                    return answer_generate(req, retrieved, self.db_path)
+                response = await self.llm.run(answer_generate, req, retrieved, self.db_path)
+            return response
+        if method == "POST" and parsed.path == "/batch":
+            items, ordered = parse_batch_request(body, parse_qs(parsed.query))
+            return 200, self._batch(items, ordered)
+        if method == "POST" and parsed.path == "/answer/stream":
+            req, error = parse_answer_request(body)
+            if error:
+                return error
+            req["mode"] = "ollama"
+            if not req["use_cache"]:
+                self._check_llm()
+            _, retrieved = await self.sql.run(answer_retrieve, self.pool, self.db_path, req)
+            if retrieved[4] is None:
+                self._check_llm()
+            return 200, self._stream(req, retrieved)
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self.connections >= self.max_connections:
+            writer.write(self._error(HttpError(503, "too many connections", 1)))
+            writer.close()
+            return
+        self.connections += 1
+        try:
+            out = await self._respond(reader)
+            if isinstance(out, bytes):
+                writer.write(out)
+                await writer.drain()
+            else:
+                async for part in out:
+                    writer.write(part)
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Union[bytes, AsyncIterator[bytes]]:
+        try:
+            method, target, body = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT_S)
+        except HttpError as e:
+            return self._error(e)
+        except (TimeoutError, ValueError, asyncio.IncompleteReadError):
+            return self._encode(400, {"error": "bad request"})
+        try:
+            status, payload = await self._dispatch(method, target, body)
+        except HttpError as e:
+            return self._error(e)
+        except PoolExhausted:
+            # pool SQLite épuisé malgré le dimensionnement de la voie SQL
+            return self._error(HttpError(503, "database busy", 1))
+        except ValueError as e:
+            # paramètre invalide (top_k=abc...) remonté par une route
+            return self._encode(400, {"error": str(e)})
+        except Exception:
+            print(f"[serve] {method} {target}", file=sys.stderr)
+            traceback.print_exc()
+            return self._encode(500, {"error": "internal error"})
+        if payload is not None and not isinstance(payload, dict):
+            return payload
+        return self._encode(status, payload)
+
+    def _error(self, e: HttpError) -> bytes:
+        extra = [("Retry-After", str(e.retry_after))] if e.retry_after else []
+        return self._encode(e.status, {"error": str(e)}, extra)
+
+    def close(self) -> None:
+        self.sql.shutdown()
+        self.llm.shutdown()
+        self.pool.close()
+
+
+async def _serve(app: AsyncApiServer, host: str, port: int) -> None:
+    server = await asyncio.start_server(app.handle, host, port, backlog=app.max_connections)
+    async with server:
+        await server.serve_forever()
+
+
+def serve_async(
+    db_path: str,
+    host: str = "127.0.0.1",
+    port: int = 8787,
+    *,
+    pool_size: int = 8,
+    llm_concurrency: int = 2,
+    max_pending: int = 64,
+) -> None:
+    prepare_db(db_path)
+    app = AsyncApiServer(db_path, pool_size=pool_size, llm_concurrency=llm_concurrency, max_pending=max_pending)
+    print(f"[serve] http://{host}:{port}  db={db_path}  async sql={pool_size} llm={llm_concurrency} pending={max_pending}")
+    try:
+        asyncio.run(_serve(app, host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.close()
@@ -1,13 +1,241 @@
 from __future__ import annotations
 
 import json
+import time
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from typing import Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
-from store.sqlite import connect_db, init_db, search_fts, get_chunk
-from rag import answer_with_ollama, build_context, answer_rules
+from store.sqlite import ConnectionPool, PoolExhausted, connect_db, ensure_schema, search_fts, get_chunk, drop_text, xref_lookup
+from batch import encode_record, iter_items, run_batch
+from cache import cached_query, query_cache, query_key
+from llm import client_stats
+from rag import answer_from_context, answer_stream_from_context, build_context, answer_rules, lookup_answer, store_answer
+from rerank import FETCH_FACTOR, search_reranked
 
+# Attente max d'une connexion du pool avant de répondre 503
+POOL_TIMEOUT_S = 10.0
+
+CORS_HEADERS = [
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+    ("Access-Control-Allow-Headers", "Content-Type"),
+]
+
+SSE_HEADERS = [
+    ("Content-Type", "text/event-stream; charset=utf-8"),
+    ("Cache-Control", "no-cache"),
+    ("Connection", "close"),
+]
+
+JSONL_HEADERS = [
+    ("Content-Type", "application/x-ndjson; charset=utf-8"),
+    ("Cache-Control", "no-cache"),
+    ("Connection", "close"),
+]
+
+Response = Tuple[int, Dict]
+
+
+# -------------------------
+# Routes (communes aux serveurs thread et asyncio)
+# -------------------------
+
+def handle_get(pool: ConnectionPool, path: str, qs: Dict[str, List[str]]) -> Response:
+    """GET /health, /search, /xref, /chunk, /stats. Bloquant (SQLite) : à appeler hors boucle asyncio."""
+    if path == "/health":
+        return 200, {"ok": True}
+
+    if path == "/search":
+        q = (qs.get("q") or [""])[0].strip()
+        if not q:
+            return 400, {"error": "missing q"}
+        top_k = int((qs.get("top_k") or ["10"])[0])
+        doc_type = (qs.get("type") or [None])[0]
+        scope = (qs.get("scope") or [None])[0]
+        hybrid = (qs.get("hybrid") or ["0"])[0].lower() in ("1", "true", "yes")
+        reranked = (qs.get("rerank") or ["0"])[0].lower() in ("1", "true", "yes")
+        fetch = int((qs.get("fetch") or [str(FETCH_FACTOR)])[0])
+        min_score = float((qs.get("min_score") or ["0"])[0])
+
+        def compute() -> Dict:
+            stages: List[Dict] = []
+            timings: List[Dict] = []
+            t0 = time.perf_counter()
+            if reranked:
+                hits = search_reranked(
+                    conn, q, top_k=top_k, doc_type=doc_type, scope=scope, hybrid=hybrid,
+                    fetch=fetch, min_score=min_score, stages=stages, timings=timings,
+                )
+            else:
+                hits = search_fts(conn, q=q, top_k=top_k, doc_type=doc_type, scope=scope, hydrate=True, hybrid=hybrid, stages=stages)
+                hits = [drop_text(h) for h in hits if h["score"] >= min_score]
+                timings.append({"stage": "retrieve", "ms": round((time.perf_counter() - t0) * 1000, 3), "candidates": len(hits)})
+            return {"hits": hits, "stages": stages, "timings": timings}
+
+        with pool.connection(timeout=POOL_TIMEOUT_S) as conn:
+            key = query_key("search", q, top_k, doc_type, scope, "api", hybrid, reranked, fetch, min_score)
+            result = cached_query(conn, pool.db_path, key, compute)
+        # stages (plan FTS) et timings (retrieve, rerank) : mesurés lors du calcul
+        # (éventuellement mis en cache depuis)
+        return 200, {"query": q, "top_k": top_k, **result}
+
+    if path == "/xref":
+        name = (qs.get("name") or [""])[0].strip()
+        if not name:
+            return 400, {"error": "missing name"}
+        kind = (qs.get("kind") or [None])[0]
+        prefix = (qs.get("prefix") or ["0"])[0].lower() in ("1", "true", "yes")
+        limit = int((qs.get("limit") or ["200"])[0])
+        with pool.connection(timeout=POOL_TIMEOUT_S) as conn:
+            key = query_key("xref", name, limit, kind, None, prefix)
+            result = cached_query(conn, pool.db_path, key, lambda: xref_lookup(conn, name, kind=kind, prefix=prefix, limit=limit))
+        return 200, {"name": name, **result}
+
+    if path == "/stats":
+        return 200, {"query_cache": query_cache(pool.db_path).stats(), "ollama": client_stats()}
+
+    if path == "/chunk":
+        cid = (qs.get("id") or [""])[0].strip()
+        if not cid.isdigit():
+            return 400, {"error": "missing or invalid id"}
+        try:
+            with pool.connection(timeout=POOL_TIMEOUT_S) as conn:
+                ch = get_chunk(conn, int(cid))
+        except KeyError:
+            return 404, {"error": "chunk not found"}
+        return 200, ch
+
+    return 404, {"error": "not found"}
+
+
+def parse_answer_request(raw: bytes) -> Tuple[Optional[Dict[str, Any]], Optional[Response]]:
+    """Corps JSON de POST /answer -> (paramètres, None) ou (None, réponse d'erreur)."""
+    try:
+        payload = json.loads((raw or b"{}").decode("utf-8", errors="replace"))
+    except Exception:
+        return None, (400, {"error": "invalid json"})
+    if not isinstance(payload, dict):
+        return None, (400, {"error": "invalid json"})
+    return answer_params(payload)
+
+
+def answer_params(payload: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Response]]:
+    """Objet JSON de /answer (ou d'un élément explain de /batch) -> (paramètres, None) ou (None, erreur)."""
+    question = (payload.get("question") or "").strip()
+    if not question:
+        return None, (400, {"error": "missing question"})
+
+    return {
+        "question": question,
+        "top_k": int(payload.get("top_k") or 8),
+        "doc_type": payload.get("type"),
+        "scope": payload.get("scope"),
+        "mode": (payload.get("mode") or "ollama").lower(),
+        "model": payload.get("model"),
+        "base_url": payload.get("base_url"),
+        "timeout_s": int(payload.get("timeout_s") or 120),
+        "use_cache": not payload.get("no_cache"),
+        "hybrid": bool(payload.get("hybrid")),
+    }, None
+
+
+def answer_retrieve(pool: ConnectionPool, db_path: str, req: Dict[str, Any]) -> Tuple[Optional[Response], Any]:
+    """Partie SQLite de /answer.
+
+    Modes context/rules : (réponse, None). Mode ollama : (None, retrieved) à passer
+    à answer_generate, la connexion étant déjà rendue au pool ; retrieved porte aussi
+    la clé et l'éventuelle réponse du cache persistant (retrieved[4]).
+    """
+    question, top_k, doc_type, scope, hybrid = req["question"], req["top_k"], req["doc_type"], req["scope"], req["hybrid"]
+    with pool.connection(timeout=POOL_TIMEOUT_S) as conn:
+        if req["mode"] == "rules":
+            try:
+                result = answer_rules(db_path, question, top_k=top_k, doc_type=doc_type, scope=scope, conn=conn, hybrid=hybrid)
+            except Exception as e:
+                return (502, {"error": str(e)}), None
+            return (200, result), None
+
+        context, hits, citations = build_context(
+            db_path, question, top_k=top_k, doc_type=doc_type, scope=scope, conn=conn, hybrid=hybrid
+        )
+        if req["mode"] == "context":
+            return (200, {"question": question, "context": context, "hits": hits, "citations": [c.__dict__ for c in citations]}), None
+        key = cached = None
+        if req["use_cache"]:
+            key, cached = lookup_answer(conn, req["model"], question, context, hits)
+    return None, (context, hits, citations, key, cached)
+
+
+def _store_answer(db_path: str, key: str, model: Optional[str], result: Dict) -> None:
+    # le pool est en lecture seule : connexion d'écriture dédiée, le temps de l'insertion
+    conn = connect_db(db_path)
+    try:
+        store_answer(conn, key, model, result)
+    finally:
+        conn.close()
+
+
+def answer_generate(req: Dict[str, Any], retrieved: Any, db_path: str) -> Response:
+    """Partie LLM de /answer (mode ollama) : peut durer timeout_s ; immédiate si réponse en cache."""
+    context, hits, citations, key, cached = retrieved
+    if cached is not None:
+        return 200, cached
+    try:
+        result = answer_from_context(
+            req["question"],
+            context,
+            hits,
+            citations,
+            model=req["model"],
+            base_url=req["base_url"],
+            timeout_s=req["timeout_s"],
+        )
+    except Exception as e:
+        return 502, {"error": str(e)}
+    if key is not None:
+        _store_answer(db_path, key, req["model"], result)
+    return 200, result
+
+
+def parse_batch_request(raw: bytes, qs: Dict[str, List[str]]) -> Tuple[List[Any], bool]:
+    """POST /batch : corps JSONL ou tableau JSON (voir batch.py) -> (éléments, ordered).
+
+    ?ordered=0 : résultats dans l'ordre de fin, repérés par index et id."""
+    ordered = (qs.get("ordered") or ["1"])[0].lower() not in ("0", "false", "no")
+    return list(iter_items(raw.decode("utf-8", errors="replace").splitlines())), ordered
+
+
+def sse_event(event: str, data: Dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def answer_stream_events(req: Dict[str, Any], retrieved: Any, db_path: str) -> Iterator[bytes]:
+    """POST /answer/stream : événements SSE meta (hits, citations), token*, done | error."""
+    context, hits, citations, key, cached = retrieved
+    on_done = None
+    if key is not None:
+        on_done = lambda result: _store_answer(db_path, key, req["model"], result)  # noqa: E731
+    try:
+        for event, data in answer_stream_from_context(
+            req["question"],
+            context,
+            hits,
+            citations,
+            model=req["model"],
+            base_url=req["base_url"],
+            timeout_s=req["timeout_s"],
+            cached=cached,
+            on_done=on_done,
+        ):
+            yield sse_event(event, data)
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+
+
+# -------------------------
+# Serveur thread (http.server)
+# -------------------------
 
 class ApiHandler(BaseHTTPRequestHandler):
     server_version = "raglite/0.2"
@@ -17,118 +245,114 @@ class ApiHandler(BaseHTTPRequestHandler):
         self.send_response(status)
         self.send_header("Content-Type", "application/json; charset=utf-8")
         self.send_header("Content-Length", str(len(data)))
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(data)
 
+    def send_response(self, code, message=None):
+        self._responded = True
+        super().send_response(code, message)
+
+    def _dispatch(self, route) -> None:
+        """Pool épuisé -> 503 tant qu'aucune réponse n'est partie ; après les en-têtes
+        (SSE, /batch au fil de l'eau), la connexion est seulement fermée."""
+        self._responded = False
+        try:
+            route()
+        except PoolExhausted:
+            if self._responded:
+                self.close_connection = True
+            else:
+                self._send_json(503, {"error": "database busy"})
+
     def do_OPTIONS(self):
         self.send_response(204)
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
         self.end_headers()
 
     def do_GET(self):
-        parsed = urlparse(self.path)
-        qs = parse_qs(parsed.query)
-
-        if parsed.path == "/health":
-            return self._send_json(200, {"ok": True})
-
-        if parsed.path == "/search":
-            q = (qs.get("q") or [""])[0].strip()
-            if not q:
-                return self._send_json(400, {"error": "missing q"})
-            top_k = int((qs.get("top_k") or ["10"])[0])
-            doc_type = (qs.get("type") or [None])[0]
-            scope = (qs.get("scope") or [None])[0]
-
-            conn = connect_db(self.server.db_path)  # type: ignore[attr-defined]
-            hits = search_fts(conn, q=q, top_k=top_k, doc_type=doc_type, scope=scope)
-            out_hits = []
-            for h in hits:
-                ch = get_chunk(conn, int(h["chunk_id"]))
-                out_hits.append({**h, "start_line": ch["start_line"], "end_line": ch["end_line"], "kind": ch["kind"]})
-            return self._send_json(200, {"query": q, "top_k": top_k, "hits": out_hits})
-
-        if parsed.path == "/chunk":
-            cid = (qs.get("id") or [""])[0].strip()
-            if not cid.isdigit():
-                return self._send_json(400, {"error": "missing or invalid id"})
-            conn = connect_db(self.server.db_path)  # type: ignore[attr-defined]
-            try:
-                ch = get_chunk(conn, int(cid))
-            except KeyError:
-                return self._send_json(404, {"error": "chunk not found"})
-            return self._send_json(200, ch)
-
-        return self._send_json(404, {"error": "not found"})
+        self._dispatch(self._get)
 
     def do_POST(self):
+        self._dispatch(self._post)
+
+    def _get(self):
         parsed = urlparse(self.path)
+        status, payload = handle_get(self.server.pool, parsed.path, parse_qs(parsed.query))  # type: ignore[attr-defined]
+        return self._send_json(status, payload)
 
-        if parsed.path != "/answer":
+    def _post(self):
+        parsed = urlparse(self.path)
+
+        if parsed.path not in ("/answer", "/answer/stream", "/batch"):
             return self._send_json(404, {"error": "not found"})
 
         try:
             length = int(self.headers.get("Content-Length", "0"))
             raw = self.rfile.read(length) if length > 0 else b"{}"
-            payload = json.loads(raw.decode("utf-8", errors="replace"))
         except Exception:
             return self._send_json(400, {"error": "invalid json"})
 
-        question = (payload.get("question") or "").strip()
-        if not question:
-            return self._send_json(400, {"error": "missing question"})
+        if parsed.path == "/batch":
+            items, ordered = parse_batch_request(raw, parse_qs(parsed.query))
+            self.send_response(200)
+            for name, value in JSONL_HEADERS + CORS_HEADERS:
+                self.send_header(name, value)
+            self.end_headers()
+            # DEFAULT_WORKERS threads au plus : le reste du pool sert les autres requêtes
+            for record in run_batch(self.server.pool, self.server.db_path, items, ordered=ordered):  # type: ignore[attr-defined]
+                self.wfile.write(encode_record(record))
+                self.wfile.flush()
+            return
 
-        top_k = int(payload.get("top_k") or 8)
-        doc_type = payload.get("type")
-        scope = payload.get("scope")
-        mode = (payload.get("mode") or "ollama").lower()
-        model = payload.get("model")
-        base_url = payload.get("base_url")
-        timeout_s = int(payload.get("timeout_s") or 120)
+        req, error = parse_answer_request(raw)
+        if error:
+            return self._send_json(*error)
 
-        db_path = self.server.db_path  # type: ignore[attr-defined]
+        if parsed.path == "/answer/stream":
+            req["mode"] = "ollama"
+            _, retrieved = answer_retrieve(self.server.pool, self.server.db_path, req)  # type: ignore[attr-defined]
+            self.send_response(200)
+            for name, value in SSE_HEADERS + CORS_HEADERS:
+                self.send_header(name, value)
+            self.end_headers()
+            for event in answer_stream_events(req, retrieved, self.server.db_path):  # type: ignore[attr-defined]
+                self.wfile.write(event)
+                self.wfile.flush()
+            return
 
-        if mode == "context":
-            context, hits, citations = build_context(db_path, question, top_k=top_k, doc_type=doc_type, scope=scope)
-            return self._send_json(200, {"question": question, "context": context, "hits": hits, "citations": [c.__dict__ for c in citations]})
-
-        if mode == "rules":
-            try:
-                result = answer_rules(db_path, question, top_k=top_k, doc_type=doc_type, scope=scope)
-                return self._send_json(200, result)
-            except Exception as e:
-                return self._send_json(502, {"error": str(e)})
-
-        try:
-            result = answer_with_ollama(
-                db_path,
-                question,
-                top_k=top_k,
-                doc_type=doc_type,
-                scope=scope,
-                model=model,
-                base_url=base_url,
-                timeout_s=timeout_s,
-            )
-            return self._send_json(200, result)
-        except Exception as e:
-            return self._send_json(502, {"error": str(e)})
+        response, retrieved = answer_retrieve(self.server.pool, self.server.db_path, req)  # type: ignore[attr-defined]
+        if response is None:
+            response = answer_generate(req, retrieved, self.server.db_path)  # type: ignore[attr-defined]
+        return self._send_json(*response)
 
     def log_message(self, fmt, *args):
         return
 
 
-def serve(db_path: str, host: str = "127.0.0.1", port: int = 8787) -> None:
+class ApiServer(ThreadingHTTPServer):
+    # file d'attente listen() assez profonde pour des rafales de clients concurrents
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def prepare_db(db_path: str) -> None:
+    """Crée/migre le schéma une fois, avant d'ouvrir les connexions en lecture seule."""
     conn = connect_db(db_path)
-    init_db(conn)
+    ensure_schema(conn)
     conn.close()
 
-    httpd = ThreadingHTTPServer((host, port), ApiHandler)
+
+def serve(db_path: str, host: str = "127.0.0.1", port: int = 8787, pool_size: int = 8) -> None:
+    prepare_db(db_path)
+
+    httpd = ApiServer((host, port), ApiHandler)
     httpd.db_path = db_path  # type: ignore[attr-defined]
-    print(f"[serve] http://{host}:{port}  db={db_path}")
-    httpd.serve_forever()
+    httpd.pool = ConnectionPool(db_path, size=pool_size)  # type: ignore[attr-defined]
+    print(f"[serve] http://{host}:{port}  db={db_path}  pool={pool_size}")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.pool.close()  # type: ignore[attr-defined]
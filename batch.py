@@ -0,0 +1,200 @@
+"""Traitement par lots : des milliers de requêtes dans un seul processus.
+
+Chaque élément est un objet JSON (ligne JSONL ou élément d'un tableau) :
+- {"op": "query", "q": ..., "top_k", "type", "scope", "hybrid", "rerank", "fetch", "min_score"}
+  -> même résultat que GET /search ;
+- {"op": "xref", "name": ..., "kind", "prefix", "limit"} -> GET /xref ;
+- {"op": "explain", "question": ..., "mode": "rules" | "context", "top_k", "type", "scope", "hybrid"}
+  -> POST /answer (pas de mode ollama : le débit d'un lot est borné par SQLite) ;
+une ligne qui n'est pas un objet JSON est une question pour default_op.
+"id" (facultatif) est recopié dans le résultat.
+
+Les éléments passent par les routes du serveur (handle_get, answer_retrieve) sur
+un pool de connexions en lecture ouvert une fois, avec un pool de threads ; les
+résultats sortent au fil de l'eau, une ligne JSON par élément :
+{"index", "id", "status", "ms", "result"}, dans l'ordre d'entrée (fenêtre bornée
+de résultats en attente) ou dans l'ordre de fin (ordered=False, repérés par index/id).
+"""
+from __future__ import annotations
+
+import json
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from store.sqlite import ConnectionPool, PoolExhausted
+
+OPS = ("query", "xref", "explain")
+BATCH_MODES = ("context", "rules")
+DEFAULT_WORKERS = 4
+# Résultats en attente par thread (ordre d'entrée : un élément lent retient les suivants)
+WINDOW_PER_WORKER = 4
+
+_SEARCH_PARAMS = ("top_k", "type", "scope", "hybrid", "rerank", "fetch", "min_score")
+_XREF_PARAMS = ("name", "kind", "prefix", "limit")
+
+
+class InvalidItem(ValueError):
+    """Ligne d'entrée illisible : rendue comme un résultat 400, le lot continue."""
+
+
+def _qs(params: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Paramètres d'un élément -> query string analysée (parse_qs) pour handle_get."""
+    out: Dict[str, List[str]] = {}
+    for k, v in params.items():
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            v = "1" if v else "0"
+        out[k] = [str(v)]
+    return out
+
+
+def route_item(pool: ConnectionPool, db_path: str, item: Any, default_op: str = "query") -> Tuple[int, Dict]:
+    """Exécute un élément du lot -> (statut HTTP, résultat). Bloquant (SQLite)."""
+    # import local : api_server (http.server, rag) n'est chargé qu'à l'exécution d'un
+    # lot, pas par le parseur de la CLI ; api_server importe ce module
+    from api_server import answer_params, answer_retrieve, handle_get
+
+    if isinstance(item, InvalidItem):
+        return 400, {"error": str(item)}
+    if isinstance(item, str):
+        item = {"op": default_op, "q": item}
+    if not isinstance(item, dict):
+        return 400, {"error": "item must be a JSON object or a line of text"}
+    op = (item.get("op") or default_op).lower()
+    text = item.get("q") or item.get("question")
+    if op == "query":
+        return handle_get(pool, "/search", _qs(dict({k: item.get(k) for k in _SEARCH_PARAMS}, q=text)))
+    if op == "xref":
+        return handle_get(pool, "/xref", _qs(dict({k: item.get(k) for k in _XREF_PARAMS}, name=item.get("name") or text)))
+    if op == "explain":
+        req, error = answer_params(dict(item, question=text, mode=item.get("mode") or "rules"))
+        if error:
+            return error
+        if req["mode"] not in BATCH_MODES:
+            return 400, {"error": f"mode {req['mode']} not supported in batch (use {'|'.join(BATCH_MODES)})"}
+        response, _ = answer_retrieve(pool, db_path, req)
+        return response
+    return 400, {"error": f"unknown op {op!r} (use {'|'.join(OPS)})"}
+
+
+def result_record(index: int, item: Any, status: int, result: Dict, ms: float) -> Dict:
+    item_id = item.get("id") if isinstance(item, dict) else None
+    return {"index": index, "id": item_id, "status": status, "ms": round(ms, 3), "result": result}
+
+
+def run_item(pool: ConnectionPool, db_path: str, index: int, item: Any, default_op: str = "query") -> Dict:
+    """route_item chronométré ; une erreur ne concerne que son élément."""
+    t0 = time.perf_counter()
+    try:
+        status, result = route_item(pool, db_path, item, default_op)
+    except PoolExhausted:
+        status, result = 503, {"error": "database busy"}
+    except (TypeError, ValueError) as e:
+        status, result = 400, {"error": str(e)}
+    except Exception as e:
+        status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+    return result_record(index, item, status, result, (time.perf_counter() - t0) * 1000)
+
+
+def iter_items(lines: Iterable[str]) -> Iterator[Any]:
+    """Éléments d'une entrée JSONL ou d'un tableau JSON (première ligne non vide qui
+    commence par '['). Lignes vides ignorées ; ligne '{' invalide -> InvalidItem."""
+    it = iter(lines)
+    for line in it:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("["):
+            try:
+                items = json.loads(line + "".join(it))
+            except ValueError as e:
+                yield InvalidItem(f"invalid json array: {e}")
+                return
+            yield from items if isinstance(items, list) else [InvalidItem("expected a JSON array")]
+            return
+        yield _parse_line(line)
+        break
+    for line in it:
+        line = line.strip()
+        if line:
+            yield _parse_line(line)
+
+
+def _parse_line(line: str) -> Any:
+    if not line.startswith("{"):
+        return line
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidItem(f"invalid json: {e}")
+
+
+def run_batch(
+    pool: ConnectionPool,
+    db_path: str,
+    items: Iterable[Any],
+    *,
+    workers: int = DEFAULT_WORKERS,
+    ordered: bool = True,
+    default_op: str = "query",
+) -> Iterator[Dict]:
+    """Exécute les éléments sur workers threads (au plus une connexion du pool chacun)
+    et rend un enregistrement par élément, au fil de l'eau. Mémoire bornée : au plus
+    workers × WINDOW_PER_WORKER éléments lus d'avance."""
+    workers = max(1, min(workers, pool.size))
+    if workers == 1:
+        for i, item in enumerate(items):
+            yield run_item(pool, db_path, i, item, default_op)
+        return
+
+    # import local : concurrent.futures pèse sur le démarrage de la CLI, qui importe ce module
+    from concurrent.futures import ThreadPoolExecutor
+
+    max_pending = workers * WINDOW_PER_WORKER
+    ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    pending: deque = deque()
+    try:
+        for i, item in enumerate(items):
+            pending.append(ex.submit(run_item, pool, db_path, i, item, default_op))
+            if len(pending) < max_pending:
+                continue
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                yield from _completed(pending)
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            while pending:
+                yield from _completed(pending)
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
+def _completed(pending: deque) -> List[Dict]:
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for f in done:
+        pending.remove(f)
+    return [f.result() for f in done]
+
+
+def encode_record(record: Dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def summarize(ms: List[float], errors: int, elapsed_s: float) -> Dict:
+    """Bilan d'un lot : éléments, erreurs (statut != 200), débit, durées médiane et p95 (ms)."""
+    ms = sorted(ms)
+    return {
+        "items": len(ms),
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 3),
+        "per_s": round(len(ms) / elapsed_s, 1) if elapsed_s > 0 else None,
+        "p50_ms": ms[len(ms) // 2] if ms else None,
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))] if ms else None,
+    }
@@ -0,0 +1,119 @@
+"""Lot de questions : un processus `cli.py query` / `explain --mode rules` par question
+(imports, connexion, init_db à chaque fois) vs un seul `cli.py batch` (pool de
+connexions et threads partagés), sur les mêmes questions.
+
+Débit (questions/s, démarrage des processus compris) et contrôle : mêmes hits
+(chunk_id, dans l'ordre) et mêmes réponses rules. Échec -> code 1.
+Usage : python3 bench/bench_batch.py [--db rag.db | --files 3000] [--n 200] [--workers 1,4]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+
+CLI = str(Path(__file__).resolve().parent.parent / "raglite")
+
+TEMPLATES = [
+    "SUB_{n:03d}",
+    "PROG_{n:03d} erreur",
+    "where is LIB$SIGNAL called with status {n}",
+    "que fait le batch en cas d'erreur, GOTO ERR_HANDLER {n}",
+    "mise à jour de la table T_CLIENT {n}",
+]
+
+
+def questions(n: int) -> List[Dict]:
+    items = []
+    for i in range(n):
+        q = TEMPLATES[i % len(TEMPLATES)].format(n=i % 200)
+        if i % 2:
+            items.append({"id": i, "op": "explain", "question": q, "mode": "rules", "top_k": 8})
+        else:
+            items.append({"id": i, "op": "query", "q": q, "top_k": 10})
+    return items
+
+
+def _digest(op: str, result: Dict):
+    if op == "query":
+        return [h["chunk_id"] for h in result["hits"]]
+    return result["answer"]
+
+
+def per_process(db: str, items: List[Dict]) -> Tuple[float, List]:
+    out = []
+    t0 = time.perf_counter()
+    for it in items:
+        if it["op"] == "query":
+            cmd = ["query", "--db", db, "--q", it["q"], "--top-k", str(it["top_k"]), "--format", "json"]
+        else:
+            cmd = ["explain", "--db", db, "--question", it["question"], "--mode", "rules", "--top-k", str(it["top_k"]), "--format", "json"]
+        res = subprocess.run([sys.executable, CLI, *cmd], capture_output=True, text=True, check=True)
+        out.append(_digest(it["op"], json.loads(res.stdout)))
+    return time.perf_counter() - t0, out
+
+
+def batched(db: str, items: List[Dict], workers: int) -> Tuple[float, List, Dict]:
+    data = "".join(json.dumps(it, ensure_ascii=False) + "\n" for it in items)
+    t0 = time.perf_counter()
+    res = subprocess.run(
+        [sys.executable, CLI, "batch", "--db", db, "--workers", str(workers)],
+        input=data, capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - t0
+    records = [json.loads(ln) for ln in res.stdout.splitlines()]
+    assert [r["index"] for r in records] == list(range(len(items)))
+    summary = json.loads(res.stderr.strip().split("] ", 1)[1])
+    return elapsed, [_digest(it["op"], r["result"]) for it, r in zip(items, records)], summary
+
+
+def run(db: str, n: int, workers: List[int]) -> bool:
+    items = questions(n)
+    # cache de pages chaud pour tout le monde
+    batched(db, items[:20], 1)
+    base_s, expected = per_process(db, items)
+    print(f"{'':<22} {'durée':>8} {'q/s':>8} {'p50':>8} {'p95':>8}  identique")
+    print(f"{'1 processus / question':<22} {base_s:7.2f}s {n / base_s:8.1f} {'':>8} {'':>8}  -")
+    ok = True
+    for w in workers:
+        elapsed, got, summary = batched(db, items, w)
+        same = got == expected
+        ok &= same
+        print(
+            f"{f'batch --workers {w}':<22} {elapsed:7.2f}s {n / elapsed:8.1f} {summary['p50_ms']:6.1f}ms "
+            f"{summary['p95_ms']:6.1f}ms  {'oui' if same else 'NON'}"
+        )
+    return ok
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=3000)
+    ap.add_argument("--n", type=int, default=200, help="Questions (moitié query, moitié explain --mode rules)")
+    ap.add_argument("--workers", default="1,4")
+    args = ap.parse_args()
+    workers = [int(w) for w in args.workers.split(",")]
+
+    if args.db:
+        return 0 if run(args.db, args.n, workers) else 1
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False)
+        return 0 if run(db, args.n, workers) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
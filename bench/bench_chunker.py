@@ -0,0 +1,164 @@
+"""PlainChunker : taille du tampon recalculée à chaque ligne (ancien, O(n²) sans ligne vide)
+vs taille incrémentale (nouveau, linéaire), en mémoire et en flux (indexing.TextStream).
+
+1) Contrôle d'équivalence (golden) : mêmes chunks (bornes, texte, kind) que l'ancien
+   chunker sur le corpus synthétique et sur des cas limites (lignes > max_chars,
+   lignes vides seules, CRLF, fichier vide, sans fin de ligne finale). Échec -> code 1.
+2) Durée de découpage de .log/.csv sans ligne vide de taille croissante.
+Usage : python3 bench/bench_chunker.py [--sizes-mb 0.5,1,2,4] [--files 300]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from chunkers.plain import PlainChunker  # noqa: E402
+from indexing import TextStream, safe_read_text  # noqa: E402
+from models import Chunk, Document  # noqa: E402
+
+
+def legacy_chunk(doc: Document, max_chars: int = 4500) -> List[Chunk]:
+    """PlainChunker.chunk avant réécriture (référence des bornes), plage ramenée aux
+    lignes gardées comme aujourd'hui (chunkers.base.strip_blank_edges)."""
+    lines = doc.text.splitlines()
+    chunks: List[Chunk] = []
+    buf: List[str] = []
+    start_line = 1
+
+    def flush(end_line: int) -> None:
+        nonlocal start_line, buf
+        txt = "\n".join(buf).strip("\n")
+        if txt.strip():
+            lead = len(buf) - len("\n".join(buf).lstrip("\n").split("\n"))
+            first = start_line + lead
+            chunks.append(Chunk(len(chunks), first, first + txt.count("\n"), txt, "block", {"doc_type": doc.doc_type, "path": doc.path}))
+        buf = []
+        start_line = end_line + 1
+
+    for i, ln in enumerate(lines, start=1):
+        buf.append(ln)
+        if len("\n".join(buf)) >= max_chars:
+            flush(i)
+            continue
+        if ln.strip() == "" and len(buf) >= 10:
+            flush(i)
+    if buf:
+        flush(len(lines))
+    return chunks
+
+
+def _log_text(size: int, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    out, total, n = [], 0, 0
+    while total < size:
+        ln = f"2024-05-{rnd.randint(1, 28):02d} 12:{rnd.randint(0, 59):02d}:{n % 60:02d} JOB_{rnd.randint(1, 999):03d} status=%X{rnd.randint(0, 2**28):08X} " + "x" * rnd.randint(0, 60)
+        out.append(ln)
+        total += len(ln) + 1
+        n += 1
+    return "\n".join(out) + "\n"
+
+
+def _csv_text(size: int, seed: int = 2) -> str:
+    """Lignes courtes (le coût de l'ancien chunker croît avec le nombre de lignes par chunk)."""
+    rnd = random.Random(seed)
+    out, total = [], 0
+    while total < size:
+        ln = f"{rnd.randint(0, 9999)};{rnd.randint(0, 99)}"
+        out.append(ln)
+        total += len(ln) + 1
+    return "\n".join(out) + "\n"
+
+
+def _edge_cases() -> List[str]:
+    rnd = random.Random(7)
+    para = "\n".join(f"ligne {i}" for i in range(12))
+    return [
+        "",
+        "\n\n\n",
+        "une seule ligne sans fin",
+        "x" * 20_000,
+        ("y" * 5000 + "\n") * 5,
+        (para + "\n\n") * 50,
+        ("a\r\nb\r\n\r\n" * 400),
+        "\n".join("" if rnd.random() < 0.2 else "z" * rnd.randint(1, 900) for _ in range(3000)),
+        "\n".join(" " * rnd.randint(0, 3) for _ in range(200)) + "\nfin",
+    ]
+
+
+def _same(a: List[Chunk], b: List[Chunk]) -> bool:
+    key = lambda c: (c.chunk_index, c.start_line, c.end_line, c.text, c.kind, c.meta)  # noqa: E731
+    return [key(c) for c in a] == [key(c) for c in b]
+
+
+def golden(tmp: Path, n_files: int) -> int:
+    chunker = PlainChunker()
+    root = tmp / "corpus"
+    generate_corpus(root, n_files=n_files)
+    texts = [(str(p), safe_read_text(p)) for p in sorted(root.rglob("*")) if p.is_file()]
+    texts += [(f"edge_{i}", t) for i, t in enumerate(_edge_cases())]
+    texts.append(("big.log", _log_text(1_000_000)))
+    texts.append(("big.csv", _csv_text(1_000_000)))
+    failures = 0
+    for path, text in texts:
+        doc = Document("id", path, "", "text", text, {})
+        ref = legacy_chunk(doc)
+        if not _same(ref, chunker.chunk(doc)):
+            failures += 1
+            print(f"  DIFF (mémoire) {path}")
+        f = tmp / "stream.txt"
+        f.write_text(text, encoding="utf-8", newline="")
+        with TextStream(f, "utf-8") as ts:
+            streamed = list(chunker.iter_chunks(ts.lines(), "text", path))
+        if not _same(ref, streamed):
+            failures += 1
+            print(f"  DIFF (flux) {path}")
+    print(f"golden : {len(texts)} textes, {failures} différence(s)")
+    return failures
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes-mb", default="0.5,1,2,4")
+    ap.add_argument("--files", type=int, default=300)
+    ap.add_argument("--legacy-max-mb", type=float, default=2.0, help="Taille max mesurée pour l'ancien chunker (quadratique)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = golden(Path(tmp), args.files)
+
+        chunker = PlainChunker()
+        print(f"\n{'fichier':>12} {'chunks':>7} {'ancien':>10} {'nouveau':>10} {'flux':>10}")
+        for kind, gen in (("log", _log_text), ("csv", _csv_text)):
+            for mb in (float(x) for x in args.sizes_mb.split(",")):
+                text = gen(int(mb * 1_000_000))
+                doc = Document("id", f"big.{kind}", "", "text", text, {})
+                old_s = None
+                if mb <= args.legacy_max_mb:
+                    t0 = time.perf_counter()
+                    legacy_chunk(doc)
+                    old_s = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                n = len(chunker.chunk(doc))
+                new_s = time.perf_counter() - t0
+                f = Path(tmp) / f"big.{kind}"
+                f.write_text(text, encoding="utf-8")
+                t0 = time.perf_counter()
+                with TextStream(f, "utf-8") as ts:
+                    for _ in chunker.iter_chunks(ts.lines(), "text", str(f)):
+                        pass
+                stream_s = time.perf_counter() - t0
+                old = f"{old_s * 1000:8.0f}ms" if old_s is not None else f"{'-':>10}"
+                print(f"{kind} {mb:6.1f}Mo {n:>7} {old} {new_s * 1000:8.0f}ms {stream_s * 1000:8.0f}ms")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
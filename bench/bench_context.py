@@ -0,0 +1,143 @@
+"""Contexte envoyé au LLM : ancien assemblage (chunks entiers par rang jusqu'à 18 000
+caractères, arrêt au premier qui dépasse) vs packing.pack (fusion des plages
+contiguës, réduction autour des termes, sac à dos sous budget de tokens).
+
+Pour chaque question : tokens estimés, caractères, hits représentés et
+couverture des preuves (lignes des top-k hits contenant un terme de la question
+présentes dans le contexte), durée d'assemblage.
+Usage : python3 bench/bench_context.py [--db rag.db | --files 3000] [--top-k 12] [--budget 6000]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from packing import estimate_tokens, pack  # noqa: E402
+from store.fts_query import query_terms  # noqa: E402
+from store.sqlite import connect_db, search_fts  # noqa: E402
+
+QUESTIONS = [
+    "ON ERROR THEN GOTO ERR_HANDLER",
+    "comment est traitée l'erreur du lot ?",
+    "where is LIB$SIGNAL called with status",
+    "UPDATE T_CLIENT SET ETAT",
+    "lib_compte facture",
+    "SUB_042",
+    "SET NOON",
+    "JOB status erreur",
+]
+
+
+def legacy_pack(hits: List[Dict], max_chars: int = 18_000) -> Tuple[str, List[Tuple[str, int, int]]]:
+    """rag._retrieve_context avant packing.pack."""
+    pieces, spans, total = [], [], 0
+    for i, h in enumerate(hits, start=1):
+        piece = f"[{i}] {h['path']} ({h['doc_type']}) lines {h['start_line']}-{h['end_line']}\n{h['text']}"
+        if total + len(piece) > max_chars:
+            break
+        pieces.append(piece)
+        spans.append((h["path"], int(h["start_line"]), int(h["end_line"])))
+        total += len(piece)
+    return "\n\n".join(pieces), spans
+
+
+def _evidence(hits: List[Dict], question: str) -> Set[Tuple[str, int]]:
+    """Lignes source des hits qui contiennent un terme ; hits dont le texte n'a pas
+    autant de lignes que la plage (lignes vides retirées) ignorés : lignes inconnues."""
+    terms = [t.lower() for t in query_terms(question)]
+    out = set()
+    for h in hits:
+        lines = h["text"].split("\n")
+        if len(lines) != int(h["end_line"]) - int(h["start_line"]) + 1:
+            continue
+        for i, ln in enumerate(lines):
+            if any(t in ln.lower() for t in terms):
+                out.add((h["path"], int(h["start_line"]) + i))
+    return out
+
+
+def _covered(evidence: Set[Tuple[str, int]], spans: List[Tuple[str, int, int]]) -> int:
+    return sum(1 for path, line in evidence if any(p == path and a <= line <= b for p, a, b in spans))
+
+
+def _hits_in(hits: List[Dict], spans: List[Tuple[str, int, int]]) -> int:
+    return sum(
+        1 for h in hits
+        if any(p == h["path"] and a <= int(h["end_line"]) and int(h["start_line"]) <= b for p, a, b in spans)
+    )
+
+
+def _median_ms(fn, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def run(db: str, top_k: int, budget: int) -> None:
+    conn = connect_db(db)
+    print(f"{'question':<40} {'':>8} {'tokens':>7} {'car.':>7} {'hits':>6} {'preuves':>9} {'durée':>8}")
+    totals = {"ancien": [0, 0, 0], "pack": [0, 0, 0]}
+    for q in QUESTIONS:
+        hits = search_fts(conn, q, top_k=top_k, hydrate=True)
+        if not hits:
+            continue
+        evidence = _evidence(hits, q)
+
+        old_ctx, old_spans = legacy_pack(hits)
+        context, packed, _ = pack(hits, q, max_tokens=budget)
+        new_spans = [(block.path, a, b) for block, ranges in packed for a, b in ranges]
+        rows = (
+            ("ancien", old_ctx, old_spans, _median_ms(lambda: legacy_pack(hits))),
+            ("pack", context, new_spans, _median_ms(lambda: pack(hits, q, max_tokens=budget))),
+        )
+        for name, ctx, spans, ms in rows:
+            tokens = estimate_tokens(ctx)
+            cov = _covered(evidence, spans)
+            totals[name][0] += tokens
+            totals[name][1] += cov
+            totals[name][2] += len(evidence)
+            label = q[:40] if name == "ancien" else ""
+            print(
+                f"{label:<40} {name:>8} {tokens:>7} {len(ctx):>7} {_hits_in(hits, spans):>3}/{len(hits):<2} "
+                f"{cov:>4}/{len(evidence):<4} {ms:6.2f}ms"
+            )
+    print()
+    for name, (tokens, cov, ev) in totals.items():
+        print(f"total {name:<7} : {tokens} tokens estimés, preuves couvertes {cov}/{ev}")
+    conn.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=3000)
+    ap.add_argument("--top-k", type=int, default=12)
+    ap.add_argument("--budget", type=int, default=6000, help="Budget de tokens de pack()")
+    args = ap.parse_args()
+
+    if args.db:
+        run(args.db, args.top_k, args.budget)
+        return 0
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False)
+        run(db, args.top_k, args.budget)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+"""Benchmark filtres doc_type/scope : ancienne requête (filtre post-MATCH) vs search_fts.
+
+Fait varier la sélectivité du filtre (aucun, type, type+dossier, dossier feuille).
+Usage : python3 bench/bench_filters.py [--files 8000] [--repeat 10]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.sqlite import _escape_fts5_query, _filter_sql, connect_db, search_fts  # noqa: E402
+
+# Requête d'origine : filtres sur colonnes UNINDEXED après MATCH, snippet pour chaque hit
+LEGACY_SQL = """
+    SELECT chunk_id, path, doc_type, rel_folder, bm25(chunks_fts) AS rank,
+           snippet(chunks_fts, 0, '<<<', '>>>', ' … ', 24) AS snip
+    FROM chunks_fts
+    WHERE chunks_fts MATCH ?
+      AND (? IS NULL OR doc_type = ?)
+      AND (? IS NULL OR rel_folder LIKE ? || '%')
+    ORDER BY rank
+    LIMIT ?;
+"""
+
+FILTERS = [
+    ("none", None, None),
+    ("type", "dcl", None),
+    ("type+folder", "dcl", "batch"),
+    ("type+leaf", "dcl", "batch/nightly"),
+]
+QUERIES = ["facture", "ERR_HANDLER", "LIB$SIGNAL"]
+
+
+def _p50(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=8000)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False, fts_layout="inline")
+        conn = connect_db(db)
+        total = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        print(f"files={args.files} chunks={total}")
+        print(f"{'filter':<12} {'selectivity':>11} {'query':<12} {'legacy p50':>11} {'new p50':>9}")
+        for name, doc_type, scope in FILTERS:
+            sql, params = _filter_sql(doc_type, scope)
+            cand = total
+            if sql:
+                sub = sql[sql.index("(SELECT") + 1:-1].replace("SELECT c.id", "SELECT COUNT(*)", 1)
+                cand = conn.execute(sub, params).fetchone()[0]
+            for q in QUERIES:
+                qe = _escape_fts5_query(q)
+                legacy = _p50(lambda: conn.execute(LEGACY_SQL, (qe, doc_type, doc_type, scope, scope, 10)).fetchall(), args.repeat)
+                new = _p50(lambda: search_fts(conn, q, top_k=10, doc_type=doc_type, scope=scope), args.repeat)
+                print(f"{name:<12} {cand / total:>10.1%} {q:<12} {legacy:>9.2f}ms {new:>7.2f}ms")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
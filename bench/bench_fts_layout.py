@@ -0,0 +1,75 @@
+"""Benchmark disposition FTS : taille de base et latence de requête, inline vs external.
+
+Usage : python3 bench/bench_fts_layout.py [--files 3000] [--repeat 30]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.sqlite import connect_db, migrate_fts, search_fts  # noqa: E402
+
+QUERIES = ["ERR_HANDLER", "LIB$SIGNAL", "SELECT", "facture", "RUN SYS$SYSTEM"]
+
+
+def _size(db: str) -> int:
+    conn = connect_db(db)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return sum(os.path.getsize(db + ext) for ext in ("", "-wal") if os.path.exists(db + ext))
+
+
+def _latency(db: str, repeat: int) -> dict:
+    conn = connect_db(db)
+    out = {}
+    for q in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            search_fts(conn, q, top_k=10)
+            samples.append((time.perf_counter() - t0) * 1000)
+        out[q] = statistics.median(samples)
+    conn.close()
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=3000)
+    ap.add_argument("--repeat", type=int, default=30)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False, fts_layout="inline")
+        conn = connect_db(db)
+        conn.execute("VACUUM")
+        conn.close()
+
+        results = {"inline": (_size(db), _latency(db, args.repeat))}
+        conn = connect_db(db)
+        migrate_fts(conn, "external")
+        conn.close()
+        results["external"] = (_size(db), _latency(db, args.repeat))
+
+        print(f"files={args.files}")
+        for layout, (size, lat) in results.items():
+            print(f"{layout:<9} size={size / 1e6:7.2f} Mo")
+            for q, ms in lat.items():
+                print(f"    {q:<16} p50={ms:7.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
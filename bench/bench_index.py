@@ -0,0 +1,67 @@
+"""Benchmark index_root : débit série vs pool de processus (--workers).
+
+Usage : python3 bench/bench_index.py [--files 2000] [--workers 1,2,4]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.sqlite import connect_db  # noqa: E402
+
+
+def _dump(db_path: str) -> str:
+    conn = connect_db(db_path)
+    try:
+        # index_runs contient des horodatages : hors comparaison
+        return "\n".join(ln for ln in conn.iterdump() if "index_runs" not in ln)
+    finally:
+        conn.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--workers", default="")
+    args = ap.parse_args()
+
+    cpus = os.cpu_count() or 1
+    levels = [int(w) for w in args.workers.split(",")] if args.workers else sorted({1, 2, 4, cpus})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        ref_dump = None
+        base = None
+        print(f"files={args.files} cpus={cpus}")
+        for w in levels:
+            db = str(Path(tmp) / f"w{w}.db")
+            t0 = time.perf_counter()
+            index_root(db, str(root), verbose=False, workers=w)
+            dt = time.perf_counter() - t0
+            base = base or dt
+            dump = _dump(db)
+            ref_dump = ref_dump or dump
+            same = "identical" if dump == ref_dump else "DIFFERENT"
+            print(f"workers={w:<3} {dt:8.2f}s  {args.files / dt:8.1f} files/s  speedup={base / dt:4.2f}x  index={same}")
+
+        # Réindexation sans changement : stat seul, puis hachage complet (--rehash)
+        db = str(Path(tmp) / f"w{levels[0]}.db")
+        for label, rehash in (("noop", False), ("noop --rehash", True)):
+            t0 = time.perf_counter()
+            journal = index_root(db, str(root), verbose=False, rehash=rehash)
+            dt = time.perf_counter() - t0
+            print(f"{label:<14} {dt:8.3f}s  hashed={journal['timings']['hashed']} unchanged={journal['unchanged']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Client Ollama : urllib (une connexion par appel, en série) vs OllamaClient (keep-alive,
+concurrence bornée, lots /api/embed, retries), contre le faux serveur bench/fake_ollama.py.
+
+Scénarios : surcoût par appel (latence serveur nulle), N générations à --latency-ms,
+M embeddings, puis générations avec --fail-rate de 503.
+Usage : python3 bench/bench_llm_client.py [--calls 100] [--latency-ms 50] [--texts 2000] [--fail-rate 0.2]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fake_ollama import start_fake_ollama  # noqa: E402
+from llm import OllamaClient  # noqa: E402
+
+
+def _legacy_post(base_url: str, path: str, payload: dict) -> dict:
+    """Ancien llm.ollama_generate : urllib.request, nouvelle connexion à chaque appel."""
+    req = urllib.request.Request(base_url + path, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        return json.loads(resp.read())
+
+
+def _row(label: str, elapsed: float, n: int, server, extra: str = "") -> None:
+    s = server.stats(reset=True)
+    print(
+        f"  {label:<28} {elapsed:>7.2f}s  {n / elapsed:>8.0f}/s  "
+        f"connexions={s.get('connections', 0):<5} requêtes={s.get('requests', 0):<5} {extra}"
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=100)
+    ap.add_argument("--latency-ms", type=float, default=50)
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--fail-rate", type=float, default=0.2)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+    prompts = [f"Résume le chunk {i}" for i in range(args.calls)]
+
+    url, server = start_fake_ollama(latency_s=0.0)
+    print(f"[overhead] {args.calls * 5} appels /api/generate, latence serveur nulle")
+    t0 = time.perf_counter()
+    for i in range(args.calls * 5):
+        _legacy_post(url, "/api/generate", {"model": "m", "prompt": "x", "stream": False})
+    _row("urllib série", time.perf_counter() - t0, args.calls * 5, server)
+    client = OllamaClient(url, max_concurrency=1)
+    t0 = time.perf_counter()
+    for i in range(args.calls * 5):
+        client.generate("x", model="m")
+    _row("client série (keep-alive)", time.perf_counter() - t0, args.calls * 5, server, f"p50={client.stats()['latency_p50_ms']}ms")
+
+    server.latency_s = args.latency_ms / 1000
+    print(f"[generate] {args.calls} appels, latence serveur {args.latency_ms:.0f}ms")
+    t0 = time.perf_counter()
+    for p in prompts:
+        _legacy_post(url, "/api/generate", {"model": "m", "prompt": p, "stream": False})
+    _row("urllib série", time.perf_counter() - t0, args.calls, server)
+    for conc in (1, 4, args.concurrency):
+        client = OllamaClient(url, max_concurrency=conc)
+        t0 = time.perf_counter()
+        client.generate_many(prompts, model="m")
+        _row(f"client generate_many c={conc}", time.perf_counter() - t0, args.calls, server)
+
+    print(f"[embed] {args.texts} textes, latence serveur {args.latency_ms:.0f}ms + 0.5ms/entrée")
+    texts = [f"chunk {i} ON ERROR THEN GOTO ERR_HANDLER" for i in range(args.texts)]
+    t0 = time.perf_counter()
+    for t in texts[: args.texts // 10]:
+        _legacy_post(url, "/api/embed", {"model": "e", "input": t})
+    elapsed = (time.perf_counter() - t0) * 10
+    _row("urllib 1 texte/appel (extrap.)", elapsed, args.texts, server, "(1/10 mesuré)")
+    for batch, conc in ((32, 1), (32, 4), (128, 4)):
+        client = OllamaClient(url, max_concurrency=conc)
+        t0 = time.perf_counter()
+        vecs = client.embed(texts, model="e", batch_size=batch)
+        assert len(vecs) == len(texts)
+        _row(f"client lots={batch} c={conc}", time.perf_counter() - t0, args.texts, server)
+
+    server.fail_rate = args.fail_rate
+    print(f"[retries] {args.calls} appels, {args.fail_rate:.0%} de 503")
+    client = OllamaClient(url, max_concurrency=args.concurrency, backoff_s=0.05)
+    t0 = time.perf_counter()
+    out = client.generate_many(prompts, model="m")
+    st = client.stats()
+    _row(
+        f"client c={args.concurrency}", time.perf_counter() - t0, args.calls, server,
+        f"réussis={len(out)} retries={st['retries']} erreurs={st['errors']} p95={st['latency_p95_ms']}ms",
+    )
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""Lecture des fichiers modifiés : ancien chargement (sha256_file, puis stat + lecture
+complète + décodage, aperçu par splitlines() du texte entier) vs SourceFile (une
+lecture : fstat, sha256 et texte des mêmes octets, aperçu limité aux 120 lignes).
+
+Cache de pages vidé avant chaque mesure (posix_fadvise DONTNEED sur chaque
+fichier, sans privilège) : octets lus sur disque (read_bytes), octets et appels
+read() (rchar, syscr, /proc/self/io ; les défauts de page d'un mmap ne comptent
+pas dans rchar) et durée. Contrôle : mêmes sha256, texte et type. Échec -> code 1.
+Usage : python3 bench/bench_load.py [--files 2000] [--big 20] [--big-mb 2]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import ENCODINGS, SourceFile, detect_doc_type  # noqa: E402
+
+
+def legacy_load(p: Path) -> Tuple[str, str, str]:
+    """prepare_file avant SourceFile : deux lectures, un stat, aperçu sur tout le texte."""
+    h = hashlib.sha256()
+    with p.open("rb") as f:
+        for blk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(blk)
+    file_hash = h.hexdigest()
+    p.stat()
+    data = p.read_bytes()
+    text = None
+    for enc in ENCODINGS:
+        try:
+            text = data.decode(enc)
+            break
+        except UnicodeDecodeError:
+            continue
+    preview = "\n".join(text.splitlines()[:120])
+    return file_hash, text, detect_doc_type(p, preview)
+
+
+def new_load(p: Path) -> Tuple[str, str, str]:
+    with SourceFile(p) as src:
+        return src.sha256, src.text(), detect_doc_type(p, src.preview)
+
+
+def _io() -> Dict[str, int]:
+    with open("/proc/self/io") as f:
+        return {k: int(v) for k, v in (ln.split(":") for ln in f)}
+
+
+def _evict(files: List[Path]) -> None:
+    for p in files:
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _measure(fn, files: List[Path], cold: bool):
+    if cold:
+        _evict(files)
+    before = _io()
+    t0 = time.perf_counter()
+    out = [fn(p) for p in files]
+    elapsed = time.perf_counter() - t0
+    after = _io()
+    return out, elapsed, {k: after[k] - before[k] for k in ("read_bytes", "rchar", "syscr")}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--big", type=int, default=20, help="Fichiers .log supplémentaires de --big-mb Mo")
+    ap.add_argument("--big-mb", type=float, default=2.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        rnd = random.Random(3)
+        for i in range(args.big):
+            lines, size = [], 0
+            while size < args.big_mb * 1_000_000:
+                ln = f"2024-05-{rnd.randint(1, 28):02d} JOB_{rnd.randint(1, 999):03d} état={rnd.randint(0, 2**28):08X} " + "x" * rnd.randint(0, 80)
+                lines.append(ln)
+                size += len(ln) + 1
+            (root / f"big_{i}.log").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        files = sorted(p for p in root.rglob("*") if p.is_file())
+        total_mb = sum(p.stat().st_size for p in files) / 1e6
+        print(f"corpus : {len(files)} fichiers, {total_mb:.0f} Mo\n")
+
+        print(f"{'':<14} {'cache':<6} {'disque':>9} {'rchar':>9} {'read()':>8} {'durée':>9}")
+        results = {}
+        for cold in (True, False):
+            for name, fn in (("ancien", legacy_load), ("SourceFile", new_load)):
+                out, elapsed, io = _measure(fn, files, cold)
+                results[name] = out
+                print(
+                    f"{name:<14} {'froid' if cold else 'chaud':<6} {io['read_bytes'] / 1e6:7.1f}Mo {io['rchar'] / 1e6:7.1f}Mo "
+                    f"{io['syscr']:>8} {elapsed * 1000:7.0f}ms"
+                )
+        same = results["ancien"] == results["SourceFile"]
+        print(f"\nsha256, texte et type identiques : {'oui' if same else 'NON'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+"""Planificateur FTS : phrase forcée (ancien comportement) vs plan phrase -> NEAR -> OR.
+
+Pour chaque requête : nombre de hits, étape finale, durée par étape et totale.
+Usage : python3 bench/bench_query_plan.py [--db rag.db | --files 4000] [--top-k 10] [--repeat 20]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.fts_query import escape_phrase  # noqa: E402
+from store.sqlite import _hit_rows, connect_db, search_fts  # noqa: E402
+
+# Ancien search_fts : toute la saisie en une phrase, puis snippets des hits
+LEGACY_SQL = """
+    SELECT chunks_fts.rowid AS id, bm25(chunks_fts) AS rank
+    FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?;
+"""
+
+
+def _legacy(conn, phrase: str, top_k: int) -> int:
+    ids = [r["id"] for r in conn.execute(LEGACY_SQL, (phrase, top_k)).fetchall()]
+    return len(_hit_rows(conn, phrase, ids, False))
+
+
+QUERIES = [
+    "ERR_HANDLER",
+    "ON ERROR THEN GOTO",
+    "F$SEARCH OR SET NOON",
+    "SET NOON",
+    "erreur facture",
+    "comment est traitée l'erreur du lot ?",
+    "where is LIB$SIGNAL called with status",
+    '"WHERE A" SOLDE',
+    "UPDATE SET ETAT client",
+    "how are errors handled",
+]
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=4000)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = args.db
+        if not db:
+            root = Path(tmp) / "corpus"
+            generate_corpus(root, n_files=args.files)
+            db = str(Path(tmp) / "rag.db")
+            index_root(db, str(root), verbose=False)
+        conn = connect_db(db)
+
+        print(f"{'requête':<42} {'phrase seule':>16} {'plan':>24}   étapes")
+        zero_old = zero_new = 0
+        for q in QUERIES:
+            phrase = escape_phrase(q)
+            old_hits = _legacy(conn, phrase, args.top_k)
+            old_ms = _median_ms(lambda: _legacy(conn, phrase, args.top_k), args.repeat)
+            stages: list = []
+            hits = search_fts(conn, q, top_k=args.top_k, stages=stages)
+            new_ms = _median_ms(lambda: search_fts(conn, q, top_k=args.top_k), args.repeat)
+            zero_old += old_hits == 0
+            zero_new += not hits
+            detail = " ".join(f"{s['stage']}={s['new']}/{s['ms']:.2f}ms" for s in stages)
+            print(f"{q[:42]:<42} {old_hits:>4} hits {old_ms:>6.2f}ms {len(hits):>4} hits {new_ms:>6.2f}ms ({stages[-1]['stage']:<6})   {detail}")
+        print(f"\nrequêtes sans résultat : phrase seule {zero_old}/{len(QUERIES)}, plan {zero_new}/{len(QUERIES)}")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
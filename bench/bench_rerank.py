@@ -0,0 +1,115 @@
+"""Recherche en deux étapes (rerank.search_reranked) vs bm25 top-k seul (search_fts).
+
+Vérité terrain : pour chaque question, les chunks qui définissent ou référencent
+le symbole visé (tables symbols/refs, extraites à l'indexation). Mesures :
+précision@k, scores des pertinents et des non pertinents parmi fetch × top-k
+candidats (un seuil les sépare-t-il ?), durée médiane de chaque étape.
+Usage : python3 bench/bench_rerank.py [--db rag.db | --files 3000] [--top-k 10] [--fetch 4]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from rerank import search_reranked  # noqa: E402
+from store.sqlite import connect_db, search_fts  # noqa: E402
+
+# (question, symbole dont les chunks sont pertinents)
+QUESTIONS = [
+    ("qui appelle lib_compte et avec quel statut ?", "lib_compte"),
+    ("where is LIB$SIGNAL called with status", "LIB$SIGNAL"),
+    ("mise à jour de la table T_CLIENT", "T_CLIENT"),
+    ("que fait le batch en cas d'erreur, GOTO ERR_HANDLER", "ERR_HANDLER"),
+    ("procédure SUB_042 lancée par quel batch", "SUB_042"),
+    ("status error handling in SUB_010", "SUB_010"),
+    ("archive facture erreur PROG_144", "PROG_144"),
+    # symbole absent du corpus : aucun hit pertinent
+    ("appel de lib_inconnu en erreur", "lib_inconnu"),
+]
+
+
+def _relevant(conn, name: str) -> Set[int]:
+    rows = conn.execute(
+        "SELECT chunk_id FROM symbols WHERE name = ? UNION SELECT chunk_id FROM refs WHERE name = ?", (name, name)
+    )
+    return {int(r[0]) for r in rows}
+
+
+def _precision(hits: List[Dict], relevant: Set[int], k: int) -> float:
+    """Précision@k rapportée au maximum atteignable (moins de k chunks pertinents)."""
+    best = min(k, len(relevant))
+    return sum(1 for h in hits[:k] if h["chunk_id"] in relevant) / best if best else 1.0
+
+
+def _spread(scores: List[float]) -> str:
+    return f"{min(scores):.2f}/{statistics.mean(scores):.2f}/{max(scores):.2f}" if scores else "-"
+
+
+def run(db: str, top_k: int, fetch: int, repeat: int) -> None:
+    conn = connect_db(db)
+    print(f"{'question':<46} {'bm25 P@k':>9} {'rerank P@k':>11}")
+    p_old: List[float] = []
+    p_new: List[float] = []
+    # scores des fetch x top-k candidats, pertinents / non pertinents
+    scores: Dict[str, Dict[bool, List[float]]] = {"bm25": {True: [], False: []}, "rerank": {True: [], False: []}}
+    ms: Dict[str, List[float]] = {"search_fts": [], "retrieve": [], "rerank": []}
+    for q, name in QUESTIONS:
+        relevant = _relevant(conn, name)
+        depth = top_k * fetch
+        old = search_fts(conn, q, top_k=depth, hydrate=True)
+        new = search_reranked(conn, q, top_k=depth, fetch=1)
+        for label, hits in (("bm25", old), ("rerank", new)):
+            for h in hits:
+                scores[label][h["chunk_id"] in relevant].append(h["score"])
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            search_fts(conn, q, top_k=top_k, hydrate=True)
+            ms["search_fts"].append((time.perf_counter() - t0) * 1000)
+            timings: List[Dict] = []
+            search_reranked(conn, q, top_k=top_k, fetch=fetch, timings=timings)
+            for t in timings:
+                ms[t["stage"]].append(t["ms"])
+        po, pn = _precision(old, relevant, top_k), _precision(new, relevant, top_k)
+        p_old.append(po)
+        p_new.append(pn)
+        print(f"{q[:46]:<46} {po:>9.2f} {pn:>11.2f}")
+    print(f"\nprécision@{top_k} moyenne : bm25 {statistics.mean(p_old):.2f}, rerank {statistics.mean(p_new):.2f}")
+    print("scores min/moyen/max des candidats (un seuil sépare-t-il pertinents et non pertinents ?)")
+    for label, parts in scores.items():
+        print(f"  {label:<7} pertinents {_spread(parts[True]):>16}   non pertinents {_spread(parts[False]):>16}")
+    print("durées médianes : " + ", ".join(f"{k} {statistics.median(v):.2f}ms" for k, v in ms.items()))
+    conn.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=3000)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--fetch", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    if args.db:
+        run(args.db, args.top_k, args.fetch, args.repeat)
+        return 0
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False)
+        run(db, args.top_k, args.fetch, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,227 @@
+"""Test de charge du serveur HTTP : N clients concurrents sur /chunk, /search et /answer (mode context).
+
+Lance `raglite serve` en sous-processus (--raglite pour comparer un autre arbre,
+--serve-args=--async pour le serveur asyncio), puis mesure débit et latences p50/p99.
+Avec --llm-delay, un faux Ollama lent est démarré et une rafale de /answer (mode ollama)
+tourne pendant la charge /search : latences /search et statuts /answer (200/429/503).
+Usage : python3 bench/bench_server.py [--db rag.db | --files 4000] [--clients 50] [--requests 20]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+QUERIES = [
+    ("facture", None, None),
+    ("ERR_HANDLER", "dcl", None),
+    ("LIB$SIGNAL", "c", "app"),
+    ("commit", None, "db"),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base: str, timeout_s: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base + "/health", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("serveur non prêt")
+
+
+def _search(base: str, i: int) -> None:
+    q, doc_type, scope = QUERIES[i % len(QUERIES)]
+    params = {"q": q, "top_k": 10}
+    if doc_type:
+        params["type"] = doc_type
+    if scope:
+        params["scope"] = scope
+    with urllib.request.urlopen(f"{base}/search?{urllib.parse.urlencode(params)}", timeout=60) as r:
+        r.read()
+
+
+def _chunk(base: str, i: int) -> None:
+    with urllib.request.urlopen(f"{base}/chunk?id={1 + i * 7919 % 5000}", timeout=60) as r:
+        r.read()
+
+
+def _answer(base: str, i: int) -> None:
+    q, doc_type, scope = QUERIES[i % len(QUERIES)]
+    body = json.dumps({"question": q, "mode": "context", "type": doc_type, "scope": scope}).encode()
+    req = urllib.request.Request(base + "/answer", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as r:
+        r.read()
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    delay_s = 1.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        time.sleep(self.delay_s)
+        data = json.dumps({"response": "ok [1]", "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        return
+
+
+def _start_fake_ollama(delay_s: float) -> str:
+    handler = type("FakeOllama", (_FakeOllama,), {"delay_s": delay_s})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    httpd.request_queue_size = 256
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+
+def _answer_ollama(base: str, ollama_url: str, i: int) -> int:
+    q, doc_type, scope = QUERIES[i % len(QUERIES)]
+    body = json.dumps({"question": q, "mode": "ollama", "base_url": ollama_url, "type": doc_type, "scope": scope}).encode()
+    req = urllib.request.Request(base + "/answer", data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=300) as r:
+            r.read()
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _mixed(base: str, ollama_url: str, llm_clients: int, clients: int, requests: int):
+    """Rafale de /answer ollama (1 requête par client) pendant la charge /search."""
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    def llm_client(cid: int) -> None:
+        code = _answer_ollama(base, ollama_url, cid)
+        with lock:
+            statuses[code] += 1
+
+    burst = [threading.Thread(target=llm_client, args=(c,)) for c in range(llm_clients)]
+    for t in burst:
+        t.start()
+    time.sleep(0.2)
+    search = _load(base, _search, clients, requests)
+    for t in burst:
+        t.join()
+    return search, dict(sorted(statuses.items()))
+
+
+def _load(base: str, fn, clients: int, requests: int):
+    samples: list = []
+    errors = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(clients)
+
+    def client(cid: int) -> None:
+        local = []
+        start.wait()
+        for n in range(requests):
+            t0 = time.perf_counter()
+            try:
+                fn(base, cid + n)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+                continue
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+    return {
+        "rps": len(samples) / wall,
+        "p50_ms": statistics.median(samples) if samples else 0.0,
+        "p99_ms": p99,
+        "errors": errors[0],
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=4000)
+    ap.add_argument("--clients", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=20, help="Requêtes par client et par endpoint")
+    ap.add_argument("--raglite", default=str(ROOT / "raglite"), help="Script raglite à lancer")
+    ap.add_argument("--serve-args", default="", help="Arguments supplémentaires pour serve")
+    ap.add_argument("--llm-delay", type=float, default=0.0, help="Durée d'un appel au faux Ollama (0 = pas de rafale LLM)")
+    ap.add_argument("--llm-clients", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = args.db
+        if not db:
+            root = Path(tmp) / "corpus"
+            generate_corpus(root, n_files=args.files)
+            db = str(Path(tmp) / "rag.db")
+            index_root(db, str(root), verbose=False)
+
+        port = _free_port()
+        cmd = [sys.executable, args.raglite, "serve", "--db", db, "--port", str(port)] + args.serve_args.split()
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+        try:
+            base = f"http://127.0.0.1:{port}"
+            _wait_ready(base)
+            _load(base, _search, 4, 5)  # préchauffe
+            print(f"clients={args.clients} requests/client={args.requests}")
+            for name, fn in (("/chunk", _chunk), ("/search", _search), ("/answer context", _answer)):
+                r = _load(base, fn, args.clients, args.requests)
+                print(
+                    f"{name:<16} {r['rps']:>7.1f} req/s  p50={r['p50_ms']:>7.1f}ms  "
+                    f"p99={r['p99_ms']:>7.1f}ms  errors={r['errors']}"
+                )
+            if args.llm_delay > 0:
+                ollama_url = _start_fake_ollama(args.llm_delay)
+                r, statuses = _mixed(base, ollama_url, args.llm_clients, args.clients, args.requests)
+                print(
+                    f"{'/search+LLM':<16} {r['rps']:>7.1f} req/s  p50={r['p50_ms']:>7.1f}ms  "
+                    f"p99={r['p99_ms']:>7.1f}ms  errors={r['errors']}  /answer ollama statuts={statuses}"
+                )
+        finally:
+            proc.terminate()
+            proc.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+"""Démarrage de la CLI : imports (python -X importtime) et durée totale par commande.
+
+Pour chaque commande : durée cumulée des imports (somme des imports de premier
+niveau, moins ceux de l'interpréteur seul : site, encodings...), modules les plus
+coûteux, modules interdits chargés (serveurs HTTP, llm, indexing, numpy... sur une
+commande de lecture), durée médiane d'une exécution complète. En plus : connexion + init_db vs connexion + ensure_schema.
+Budget : relatif à l'interpréteur seul, mesuré en alternance avec chaque commande
+(la charge de la machine pèse sur les deux) ; médiane de --repeat rapports
+imports de la commande / imports de l'interpréteur. Au-delà de --budget-x ou
+module interdit -> code 1.
+Usage : python3 bench/bench_startup.py [--db rag.db | --files 300] [--budget-x 10] [--raglite autre/raglite]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.sqlite import connect_db, ensure_schema, init_db  # noqa: E402
+
+# Modules dont le chargement par une commande de lecture est une régression
+HEAVY = ("indexing", "embeddings", "numpy", "api_server", "api_async", "http.server", "asyncio", "llm", "http.client", "multiprocessing")
+
+# (nom, arguments après la base, modules interdits)
+COMMANDS: List[Tuple[str, List[str], Sequence[str]]] = [
+    ("query", ["query", "--q", "SUB_042 erreur", "--top-k", "5", "--format", "json"], HEAVY),
+    ("query --rerank", ["query", "--q", "SUB_042 erreur", "--top-k", "5", "--rerank", "--format", "json"], HEAVY),
+    ("xref", ["xref", "--name", "lib_compte", "--format", "json"], HEAVY),
+    ("explain rules", ["explain", "--question", "que fait le batch en cas d'erreur", "--mode", "rules", "--format", "json"], HEAVY),
+    ("explain context", ["explain", "--question", "GOTO ERR_HANDLER", "--mode", "context", "--format", "json"], HEAVY),
+]
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """(durée cumulée des imports en ms, [(module, ms propre)] triés, modules chargés)."""
+    total_us = 0
+    own: List[Tuple[str, float]] = []
+    names: List[str] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        names.append(name.strip())
+        own.append((name.strip(), int(self_us) / 1000))
+        if not name[1:].startswith(" "):  # premier niveau : pas d'indentation
+            total_us += int(cumulative_us)
+    own.sort(key=lambda x: -x[1])
+    return total_us / 1000, own, names
+
+
+def _run(cmd: List[str], importtime: bool = False) -> subprocess.CompletedProcess:
+    pre = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    return subprocess.run(pre + cmd, capture_output=True, text=True, check=True)
+
+
+def _median_s(cmd: List[str], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        _run(cmd)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _schema_check_ms(db: str, check, repeat: int = 50) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn = connect_db(db)
+        check(conn)
+        conn.close()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def _base_import_ms() -> float:
+    return parse_importtime(_run(["-c", "pass"], importtime=True).stderr)[0]
+
+
+def run(db: str, raglite: str, repeat: int, budget_x: float, commands: Optional[Sequence[str]] = None) -> bool:
+    base_s = _median_s(["-c", "pass"], repeat)
+    base_ms = statistics.median(_base_import_ms() for _ in range(repeat))
+    print(f"interpréteur seul : {base_s * 1000:.0f}ms dont imports {base_ms:.1f}ms\n")
+    print(f"{'commande':<16} {'imports':>9} {'×interp.':>9} {'exécution':>10}  modules les plus coûteux (ms propres)")
+    ok = True
+    for name, argv, forbidden in COMMANDS:
+        if commands and name not in commands:
+            continue
+        cmd = [raglite, argv[0], "--db", db, *argv[1:]]
+        # -X importtime suit la charge de la machine : chaque mesure de la commande est
+        # rapportée à une mesure de l'interpréteur seul prise juste avant
+        runs, ratios, import_ms = [], [], []
+        for _ in range(repeat):
+            base = _base_import_ms()
+            r = parse_importtime(_run(cmd, importtime=True).stderr)
+            runs.append(r)
+            import_ms.append(r[0] - base)
+            ratios.append((r[0] - base) / base)
+        ratio = statistics.median(ratios)
+        _, own, names = runs[0]
+        heavy = [m for m in forbidden if m in names]
+        wall_s = _median_s(cmd, repeat)
+        over = ratio > budget_x
+        ok &= not over and not heavy
+        top = ", ".join(f"{m} {ms:.1f}" for m, ms in own[:4])
+        flag = ("  BUDGET" if over else "") + (f"  INTERDITS: {', '.join(heavy)}" if heavy else "")
+        print(f"{name:<16} {statistics.median(import_ms):7.1f}ms {ratio:8.1f}× {wall_s * 1000:8.0f}ms  {top}{flag}")
+    init_ms = _schema_check_ms(db, init_db)
+    ensure_ms = _schema_check_ms(db, ensure_schema)
+    print(f"\nconnexion + init_db : {init_ms:.2f}ms, connexion + ensure_schema : {ensure_ms:.2f}ms")
+    print(f"budget imports {budget_x:.1f}× l'interpréteur : {'respecté' if ok else 'DÉPASSÉ'}")
+    return ok
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=300)
+    ap.add_argument("--raglite", default=str(ROOT / "raglite"), help="Script raglite à lancer (autre arbre pour comparer)")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--budget-x", type=float, default=10.0, help="Imports max par commande, en multiple des imports de l'interpréteur seul (7.5 à 9× attendus, ~30× avant les imports paresseux)")
+    ap.add_argument("--commands", default="", help="Sous-ensemble de commandes, séparées par des virgules")
+    args = ap.parse_args()
+    commands = [c.strip() for c in args.commands.split(",") if c.strip()] or None
+
+    if args.db:
+        return 0 if run(args.db, args.raglite, args.repeat, args.budget_x, commands) else 1
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False)
+        return 0 if run(db, args.raglite, args.repeat, args.budget_x, commands) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
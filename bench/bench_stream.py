@@ -0,0 +1,145 @@
+"""Time-to-first-token : réponse Ollama complète vs streaming (NDJSON -> CLI / SSE).
+
+Un faux Ollama émet --tokens fragments espacés de --token-ms après --first-ms de latence.
+Mesure en processus (answer_with_ollama vs answer_with_ollama_stream) puis via HTTP
+(/answer vs /answer/stream) pour les serveurs thread et asyncio.
+Usage : python3 bench/bench_stream.py [--db rag.db | --files 2000] [--tokens 200] [--token-ms 20]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.bench_server import ROOT, _free_port, _wait_ready  # noqa: E402
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from rag import answer_with_ollama, answer_with_ollama_stream  # noqa: E402
+
+QUESTION = "Que fait la procédure ERR_HANDLER ?"
+
+
+class _StreamingOllama(BaseHTTPRequestHandler):
+    first_s = 0.5
+    token_s = 0.02
+    tokens = 200
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))))
+        time.sleep(self.first_s)
+        parts = [f"mot{i} " for i in range(self.tokens)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        if not body.get("stream"):
+            time.sleep(self.token_s * self.tokens)
+            data = json.dumps({"response": "".join(parts), "done": True}).encode()
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.end_headers()
+        for part in parts:
+            self.wfile.write((json.dumps({"response": part, "done": False}) + "\n").encode())
+            self.wfile.flush()
+            time.sleep(self.token_s)
+        self.wfile.write((json.dumps({"response": "", "done": True}) + "\n").encode())
+
+    def log_message(self, fmt, *args):
+        return
+
+
+def _start_ollama(first_s: float, token_s: float, tokens: int) -> str:
+    handler = type("StreamingOllama", (_StreamingOllama,), {"first_s": first_s, "token_s": token_s, "tokens": tokens})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+
+def _in_process(db: str, ollama_url: str):
+    t0 = time.perf_counter()
+    answer_with_ollama(db, QUESTION, base_url=ollama_url, use_cache=False)
+    full = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ttft = None
+    for event, _ in answer_with_ollama_stream(db, QUESTION, base_url=ollama_url, use_cache=False):
+        if event == "token" and ttft is None:
+            ttft = time.perf_counter() - t0
+    return full, ttft, time.perf_counter() - t0
+
+
+def _http(base: str, ollama_url: str):
+    body = json.dumps({"question": QUESTION, "mode": "ollama", "base_url": ollama_url, "no_cache": True}).encode()
+    headers = {"Content-Type": "application/json"}
+
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(base + "/answer", data=body, headers=headers), timeout=300) as r:
+        r.read()
+    full = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    first_meta = first_token = None
+    with urllib.request.urlopen(urllib.request.Request(base + "/answer/stream", data=body, headers=headers), timeout=300) as r:
+        for line in r:
+            if line.startswith(b"event: meta") and first_meta is None:
+                first_meta = time.perf_counter() - t0
+            elif line.startswith(b"event: token") and first_token is None:
+                first_token = time.perf_counter() - t0
+    return full, first_meta, first_token, time.perf_counter() - t0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="Base existante (sinon corpus généré)")
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--first-ms", type=float, default=500)
+    ap.add_argument("--token-ms", type=float, default=20)
+    ap.add_argument("--tokens", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    ollama_url = _start_ollama(args.first_ms / 1000, args.token_ms / 1000, args.tokens)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = args.db
+        if not db:
+            root = Path(tmp) / "corpus"
+            generate_corpus(root, n_files=args.files)
+            db = str(Path(tmp) / "rag.db")
+            index_root(db, str(root), verbose=False)
+
+        runs = [_in_process(db, ollama_url) for _ in range(args.repeat)]
+        full, ttft, total = (statistics.median(x) for x in zip(*runs))
+        print(f"{'in-process':<12} complet={full * 1000:>7.0f}ms  stream: ttft={ttft * 1000:>6.0f}ms total={total * 1000:>7.0f}ms")
+
+        for label, extra in (("http thread", []), ("http async", ["--async"])):
+            port = _free_port()
+            cmd = [sys.executable, str(ROOT / "raglite"), "serve", "--db", db, "--port", str(port)] + extra
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+            try:
+                base = f"http://127.0.0.1:{port}"
+                _wait_ready(base)
+                runs = [_http(base, ollama_url) for _ in range(args.repeat)]
+                full, meta, ttft, total = (statistics.median(x) for x in zip(*runs))
+                print(
+                    f"{label:<12} complet={full * 1000:>7.0f}ms  stream: meta={meta * 1000:>6.0f}ms "
+                    f"ttft={ttft * 1000:>6.0f}ms total={total * 1000:>7.0f}ms"
+                )
+            finally:
+                proc.terminate()
+                proc.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
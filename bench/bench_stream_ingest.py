@@ -0,0 +1,99 @@
+"""Ingestion de gros fichiers : lecture en flux (TextStream, au-delà de STREAM_BYTES)
+vs chargement complet en mémoire (safe_read_text sans limite).
+
+Chaque mode indexe le même corpus (.log et .sql de --size-mb Mo) dans un processus
+séparé : pic de mémoire (ru_maxrss), durée, nombre de chunks. Contrôle : les
+deux index ont les mêmes chunks (bornes, texte) et les mêmes sha256. Échec -> code 1.
+Usage : python3 bench/bench_stream_ingest.py [--size-mb 30]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def _write_corpus(root: Path, size: int) -> None:
+    rnd = random.Random(5)
+    root.mkdir(parents=True)
+    with (root / "batch.log").open("w", encoding="utf-8") as f:
+        n = 0
+        while f.tell() < size:
+            f.write(f"2024-05-{rnd.randint(1, 28):02d} 12:{n % 60:02d} JOB_{rnd.randint(1, 999):03d} état=%X{rnd.randint(0, 2**28):08X} " + "x" * rnd.randint(0, 80) + "\n")
+            if rnd.random() < 0.02:
+                f.write("\n")
+            n += 1
+    with (root / "module.sql").open("w", encoding="utf-8") as f:
+        i = 0
+        while f.tell() < size:
+            f.write(f"PROCEDURE P_{i}\n    SQLCODE\n    :id INTEGER;\n    SELECT nom INTO :nom FROM T_CLIENT_{i % 40} WHERE id = :id;\n\n")
+            i += 1
+
+
+def _child(mode: str, db: str, root: str) -> None:
+    import indexing
+
+    if mode == "memory":
+        read = indexing.safe_read_text
+        indexing.safe_read_text = lambda p: read(p, max_bytes=1 << 62)
+        indexing.STREAM_BYTES = 1 << 62
+    t0 = time.perf_counter()
+    journal = indexing.index_root(db, root, verbose=False)
+    elapsed = time.perf_counter() - t0
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"s": elapsed, "rss_mb": rss_kb / 1024, "added": journal["added"], "ignored": journal["ignored"]}))
+
+
+def _dump(db: str):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(
+            "SELECT d.path, d.sha256, c.chunk_index, c.start_line, c.end_line, c.text "
+            "FROM chunks c JOIN documents d ON d.id = c.doc_id ORDER BY d.path, c.chunk_index"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=float, default=30.0, help="Taille de chaque fichier (> 20 Mo pour passer en flux)")
+    ap.add_argument("--child", nargs=3, metavar=("MODE", "DB", "ROOT"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(*args.child)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        _write_corpus(root, int(args.size_mb * 1_000_000))
+        total_mb = sum(p.stat().st_size for p in root.iterdir()) / 1e6
+        print(f"corpus : 2 fichiers, {total_mb:.0f} Mo\n")
+        print(f"{'mode':<8} {'durée':>8} {'pic RSS':>10} {'chunks':>8}")
+        dumps = {}
+        for mode in ("stream", "memory"):
+            db = str(Path(tmp) / f"{mode}.db")
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, db, str(root)],
+                check=True, capture_output=True, text=True, cwd=str(ROOT),
+            ).stdout
+            res = json.loads(out.strip().splitlines()[-1])
+            dumps[mode] = _dump(db)
+            print(f"{mode:<8} {res['s']:7.1f}s {res['rss_mb']:8.0f}Mo {len(dumps[mode]):>8}  (ignorés : {res['ignored']})")
+        same = dumps["stream"] == dumps["memory"]
+        print(f"\nchunks et sha256 identiques : {'oui' if same else 'NON'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
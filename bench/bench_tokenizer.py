@@ -0,0 +1,107 @@
+"""Tokenizer FTS : unicode61 vs code (tokenchars '$_') [+ trigramme] pour la recherche de symboles.
+
+Même corpus indexé une fois, puis converti par migrate_fts. Pour des symboles DCL et C
+($STATUS, LIB$SIGNAL, FACTURE_12, ...) : chunks qui matchent le symbole dans toute la base
+(précision/rappel : le chunk contient le symbole entier), précision@k et latence p50 de
+search_fts, taille de la base et durée de migration.
+Usage : python3 bench/bench_tokenizer.py [--files 4000] [--top-k 10] [--repeat 20]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.fts_query import escape_phrase  # noqa: E402
+from store.sqlite import connect_db, migrate_fts, search_fts  # noqa: E402
+
+SYMBOLS = ["$STATUS", "LIB$SIGNAL", "SYS$SYSTEM", "SYS$OUTPUT", "DISK$DATA", "ERR_HANDLER", "FACTURE_12", "lib_compte", "T_CLIENT"]
+# sous-chaînes : utiles seulement avec l'index trigramme une fois les identifiants entiers indexés
+SUBSTRINGS = ["SIGNAL", "HANDLER"]
+
+CONFIGS = [
+    ("unicode61", dict(tokenizer="unicode61")),
+    ("code", dict(tokenizer="code")),
+    ("code+trigram", dict(tokenizer="code", trigram=True)),
+]
+
+
+def _symbol_re(sym: str) -> re.Pattern:
+    return re.compile(r"(?<![A-Za-z0-9_$])" + re.escape(sym) + r"(?![A-Za-z0-9_$])", re.IGNORECASE)
+
+
+def _db_size(db: str) -> int:
+    return sum(os.path.getsize(db + ext) for ext in ("", "-wal") if os.path.exists(db + ext))
+
+
+def _match_quality(conn, texts, sym: str, pattern: re.Pattern):
+    """Sur toute la base : précision et rappel de l'ensemble des chunks qui matchent le symbole."""
+    matched = {r[0] for r in conn.execute("SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ?", (escape_phrase(sym),))}
+    relevant = {cid for cid, text in texts if pattern.search(text)}
+    both = len(matched & relevant)
+    return len(matched), both / len(matched) if matched else 0.0, both / len(relevant) if relevant else 0.0
+
+
+def _measure(conn, q: str, top_k: int, repeat: int, pattern: re.Pattern):
+    hits = search_fts(conn, q, top_k=top_k, hydrate=True)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        search_fts(conn, q, top_k=top_k)
+        samples.append(time.perf_counter() - t0)
+    relevant = sum(1 for h in hits if pattern.search(h["text"]))
+    return relevant / top_k, len(hits), statistics.median(samples) * 1000, hits[0]["stage"] if hits else "-"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=4000)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        base = str(Path(tmp) / "base.db")
+        index_root(base, str(root), verbose=False)
+
+        for label, opts in CONFIGS:
+            db = str(Path(tmp) / f"{label}.db")
+            shutil.copy(base, db)
+            conn = connect_db(db)
+            t0 = time.perf_counter()
+            migrate_fts(conn, rebuild=True, **opts)
+            print(f"\n== {label} : migration {time.perf_counter() - t0:.1f}s, base {_db_size(db) / 1e6:.1f} Mo")
+            texts = conn.execute("SELECT id, text FROM chunks").fetchall()
+            precisions = []
+            for sym in SYMBOLS:
+                pattern = _symbol_re(sym)
+                matched, m_prec, m_rec = _match_quality(conn, texts, sym, pattern)
+                p, n, ms, stage = _measure(conn, sym, args.top_k, args.repeat, pattern)
+                precisions.append(m_prec)
+                print(
+                    f"  {sym:<12} matches={matched:<6} precision={m_prec:.2f} rappel={m_rec:.2f}  "
+                    f"precision@{args.top_k}={p:.2f} p50={ms:6.2f}ms ({stage})"
+                )
+            for sub in SUBSTRINGS:
+                # pertinent : le texte contient la sous-chaîne (dans n'importe quel identifiant)
+                p, n, ms, stage = _measure(conn, sub, args.top_k, args.repeat, re.compile(re.escape(sub), re.IGNORECASE))
+                print(f"  ~{sub:<11} {'':<39} precision@{args.top_k}={p:.2f} p50={ms:6.2f}ms ({stage}, {n} hits)")
+            print(f"  symboles : precision moyenne des matches {statistics.mean(precisions):.2f}")
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
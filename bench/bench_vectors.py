@@ -0,0 +1,162 @@
+"""Recherche dense : rappel/latence int8 vs float32 à grande échelle, puis bm25 vs hybride (RRF).
+
+1) Vecteurs synthétiques (--n, 1M par défaut, dimension --dim) générés par blocs :
+   vérité terrain float32 exacte, rappel@10 de l'index int8 (VectorIndex) et
+   latence p50/p95 par requête. NumPy requis.
+2) Corpus généré indexé avec --embed hash : requêtes paraphrasées, précision@10
+   et latence de search_fts(hybrid=False/True).
+Usage : python3 bench/bench_vectors.py [--n 1000000] [--dim 256] [--queries 50] [--files 2000]
+        [--no-numpy]  (partie 2 avec le repli Python pur)
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import embeddings  # noqa: E402
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+from store.sqlite import connect_db, search_fts  # noqa: E402
+
+K = 10
+
+# (question paraphrasée, motif attendu dans un chunk pertinent)
+PARAPHRASES = [
+    ("how are errors handled", r"ERR_HANDLER|ON ERROR|LIB\$SIGNAL"),
+    ("error handler routine", r"ERR_HANDLER"),
+    ("signal a failed status", r"LIB\$SIGNAL"),
+    ("submit batch jobs", r"SUBMIT"),
+    ("purge archived files", r"PURGE ARCHIVE"),
+    ("update the state of rows", r"UPDATE T_\w+ SET ETAT"),
+    ("join client tables", r"JOIN T_CLIENT|FROM T_CLIENT"),
+]
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def _synthetic(n: int, dim: int, n_queries: int, seed: int = 7):
+    """Vecteurs groupés autour de centres (comme des embeddings de code), normalisés."""
+    np = embeddings.np
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 2000), dim)).astype(np.float32)
+    queries = None
+    scales = np.empty(n, dtype=np.float32)
+    data = np.empty((n, dim), dtype=np.int8)
+    truth_ids = truth_sims = None
+    block = 65_536
+    for start in range(0, n, block):
+        m = min(block, n - start)
+        x = centers[rng.integers(0, len(centers), m)] + 0.6 * rng.standard_normal((m, dim)).astype(np.float32)
+        x /= np.linalg.norm(x, axis=1, keepdims=True)
+        if queries is None:
+            q = x[:n_queries] + 0.3 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+            queries = q / np.linalg.norm(q, axis=1, keepdims=True)
+        # vérité terrain float32 exacte, fusionnée bloc par bloc
+        sims = queries @ x.T
+        top = np.argpartition(-sims, K - 1, axis=1)[:, :K]
+        ids = top + start
+        vals = np.take_along_axis(sims, top, axis=1)
+        if truth_ids is not None:
+            ids = np.concatenate([truth_ids, ids], axis=1)
+            vals = np.concatenate([truth_sims, vals], axis=1)
+            keep = np.argsort(-vals, axis=1)[:, :K]
+            ids, vals = np.take_along_axis(ids, keep, axis=1), np.take_along_axis(vals, keep, axis=1)
+        truth_ids, truth_sims = ids, vals
+        # quantification int8 par vecteur (même schéma que embeddings.quantize)
+        peak = np.abs(x).max(axis=1)
+        peak[peak == 0] = 1.0
+        scales[start:start + m] = peak / 127.0
+        data[start:start + m] = np.rint(x / scales[start:start + m, None]).astype(np.int8)
+    return queries, truth_ids, scales, data
+
+
+def bench_scale(n: int, dim: int, n_queries: int) -> None:
+    np = embeddings.np
+    t0 = time.perf_counter()
+    queries, truth, scales, data = _synthetic(n, dim, n_queries)
+    print(f"[scale] n={n} dim={dim} généré en {time.perf_counter() - t0:.1f}s ; int8 {data.nbytes / 1e6:.0f} Mo (float32 {n * dim * 4 / 1e6:.0f} Mo)")
+
+    index = embeddings.VectorIndex.from_arrays(np.arange(n, dtype=np.int64), scales, data)
+    lat, recall = [], []
+    for q, expected in zip(queries, truth):
+        t = time.perf_counter()
+        got = index.search(q, K)
+        lat.append(time.perf_counter() - t)
+        recall.append(len({cid for cid, _ in got} & set(expected.tolist())) / K)
+    print(
+        f"[scale] int8 brute force : recall@{K}={statistics.mean(recall):.3f} "
+        f"p50={_pct(lat, 0.5) * 1000:.0f}ms p95={_pct(lat, 0.95) * 1000:.0f}ms"
+    )
+
+    # filtre doc_type/scope : 10 % des chunks autorisés
+    allowed = set(range(0, n, 10))
+    lat = []
+    for q in queries[:10]:
+        t = time.perf_counter()
+        index.search(q, K, allowed)
+        lat.append(time.perf_counter() - t)
+    print(f"[scale] int8 + filtre 10% : p50={_pct(lat, 0.5) * 1000:.0f}ms")
+
+
+def bench_corpus(files: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=files)
+        db = str(Path(tmp) / "rag.db")
+        index_root(db, str(root), verbose=False)
+        t0 = time.perf_counter()
+        journal = index_root(db, str(root), verbose=False, embed="hash")
+        print(f"[corpus] embeddings hash:256 de {journal['timings']['embedded']} chunks en {time.perf_counter() - t0:.1f}s")
+
+        conn = connect_db(db)
+        chunks = conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+        print(f"[corpus] {chunks} chunks, numpy={'oui' if embeddings.np is not None else 'non'}")
+        for hybrid in (False, True):
+            search_fts(conn, "warmup", top_k=K, hybrid=hybrid)  # chargement de l'index vectoriel
+            precision, lat = [], []
+            for q, pattern in PARAPHRASES:
+                rx = re.compile(pattern)
+                t = time.perf_counter()
+                hits = search_fts(conn, q, top_k=K, hybrid=hybrid, hydrate=True)
+                lat.append(time.perf_counter() - t)
+                precision.append(sum(1 for h in hits if rx.search(h["text"])) / K)
+            label = "hybride" if hybrid else "bm25"
+            print(
+                f"[corpus] {label:<8} precision@{K}={statistics.mean(precision):.2f} "
+                f"(requêtes avec >=1 pertinent : {sum(1 for p in precision if p)}/{len(PARAPHRASES)}) "
+                f"p50={_pct(lat, 0.5) * 1000:.1f}ms"
+            )
+        conn.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=1_000_000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--no-numpy", action="store_true", help="Partie corpus avec le repli Python pur")
+    args = ap.parse_args()
+
+    if embeddings.np is not None and not args.no_numpy:
+        bench_scale(args.n, args.dim, args.queries)
+    else:
+        print("[scale] ignoré (NumPy absent ou --no-numpy)")
+    if args.no_numpy:
+        embeddings.np = None
+    bench_corpus(args.files)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
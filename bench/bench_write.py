@@ -0,0 +1,45 @@
+"""Benchmark écriture SQLite : commit par fichier vs transactions groupées vs bulk.
+
+Usage : python3 bench/bench_write.py [--files 2000]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root  # noqa: E402
+
+CONFIGS = [
+    ("commit-per-file", {"batch_docs": 1}),
+    ("batch-200", {"batch_docs": 200}),
+    ("batch-200+bulk", {"batch_docs": 200, "bulk_load": True}),
+]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--dir", default=None, help="Répertoire de travail (disque réel plutôt que tmpfs)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        print(f"files={args.files}")
+        for name, kwargs in CONFIGS:
+            db = str(Path(tmp) / f"{name}.db")
+            t0 = time.perf_counter()
+            index_root(db, str(root), verbose=False, **kwargs)
+            dt = time.perf_counter() - t0
+            print(f"{name:<16} {dt:8.2f}s  {args.files / dt:8.1f} docs/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Index de symboles (symbols/refs) vs recherche FTS + regex pour les questions de structure.
+
+"Qui appelle lib_compte ?", "Qui touche T_CLIENT ?", "Où aboutit GOTO ERR_HANDLER ?" :
+- xref  : xref_lookup (tables symbols/refs indexées, ligne + appelant) ;
+- fts   : search_fts sur le nom (top-k), puis regex sur le texte des chunks trouvés
+          (ce qu'il fallait faire avant, limité à top-k chunks).
+Rappel : lignes trouvées / lignes qui référencent réellement le symbole (scan complet).
+Mesure aussi answer_rules (features précalculées vs extraction à la volée) et le
+surcoût de l'extraction à l'indexation.
+Contrôle (corpus + sources/ du dépôt) : pour chaque ligne des tables symbols et
+refs, la ligne source indiquée contient le symbole. Échec -> code 1.
+Usage : python3 bench/bench_xref.py [--files 4000] [--top-k 50] [--repeat 20]
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from indexing import index_root, safe_read_text  # noqa: E402
+from rag import answer_rules  # noqa: E402
+from store.sqlite import chunk_features, connect_db, search_fts, xref_lookup  # noqa: E402
+from symbols import analyze_chunks, extract_features  # noqa: E402
+from models import Chunk  # noqa: E402
+
+# (symbole, kind de référence, motif d'une ligne qui le référence)
+SYMBOLS = [
+    ("lib_compte", "call", r"\blib_compte\s*\("),
+    ("LIB$SIGNAL", "call", r"LIB\$SIGNAL\s*\("),
+    ("T_CLIENT", "table", r"\b(?:FROM|JOIN|UPDATE|INTO)\s+T_CLIENT\b"),
+    ("ERR_HANDLER", "goto", r"\bGOTO\s+ERR_HANDLER\b"),
+    ("SUB_042", "call", r"@\S*SUB_042\b"),
+]
+RULES_QUESTIONS = ["gestion des erreurs ERR_HANDLER", "appels lib_compte", "UPDATE T_CLIENT"]
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def _fts_regex(conn, name: str, pattern: re.Pattern, top_k: int):
+    """Ancienne approche : chunks FTS puis lignes qui matchent le motif."""
+    found = set()
+    for h in search_fts(conn, name, top_k=top_k, hydrate=True):
+        for i, line in enumerate(h["text"].splitlines()):
+            if pattern.search(line):
+                found.add((h["path"], h["start_line"] + i))
+    return found
+
+
+def _truth(conn, pattern: re.Pattern):
+    found = set()
+    for path, start, text in conn.execute("SELECT d.path, c.start_line, c.text FROM chunks c JOIN documents d ON d.id = c.doc_id"):
+        for i, line in enumerate(text.splitlines()):
+            if pattern.search(line):
+                found.add((path, start + i))
+    return found
+
+
+def check_lines(conn) -> int:
+    """Lignes symbols/refs dont la ligne source ne contient pas le nom (casse ignorée)."""
+    rows = conn.execute(
+        "SELECT d.path, x.kind, x.name, x.line FROM symbols x JOIN chunks c ON c.id = x.chunk_id JOIN documents d ON d.id = c.doc_id "
+        "UNION ALL "
+        "SELECT d.path, x.kind, x.name, x.line FROM refs x JOIN chunks c ON c.id = x.chunk_id JOIN documents d ON d.id = c.doc_id"
+    ).fetchall()
+    sources = {}
+    bad = []
+    for path, kind, name, line in rows:
+        if path not in sources:
+            sources[path] = safe_read_text(Path(path)).splitlines()
+        lines = sources[path]
+        if not (0 < line <= len(lines) and name.lower() in lines[line - 1].lower()):
+            bad.append((path, kind, name, line))
+    for path, kind, name, line in bad[:10]:
+        print(f"  DÉCALÉ {path}:{line} {kind} {name}")
+    print(f"lignes xref : {len(rows)} lignes contrôlées, {len(bad)} décalée(s)\n")
+    return len(bad)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=4000)
+    ap.add_argument("--top-k", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate_corpus(root, n_files=args.files)
+        db = str(Path(tmp) / "rag.db")
+        journal = index_root(db, str(root), verbose=False)
+        index_root(db, str(Path(__file__).resolve().parent.parent / "sources"), verbose=False)
+        conn = connect_db(db)
+        failures = check_lines(conn)
+
+        rows = conn.execute(
+            "SELECT d.doc_type, c.chunk_index, c.start_line, c.end_line, c.text FROM chunks c JOIN documents d ON d.id = c.doc_id"
+        ).fetchall()
+        t0 = time.perf_counter()
+        for r in rows:
+            analyze_chunks(r["doc_type"], [Chunk(r["chunk_index"], r["start_line"], r["end_line"], r["text"], "", {})])
+        extract_s = time.perf_counter() - t0
+        n_sym = conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+        n_ref = conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        tm = journal["timings"]
+        print(
+            f"index : {len(rows)} chunks, {n_sym} symboles, {n_ref} références ; indexation {tm['total_s']:.1f}s "
+            f"dont extraction ~{extract_s:.2f}s ({extract_s / tm['total_s'] * 100:.0f}%)\n"
+        )
+
+        print(f"{'symbole':<12} {'réel':>6} {'xref':>16} {'fts+regex top-' + str(args.top_k):>26}")
+        for name, kind, motif in SYMBOLS:
+            pattern = re.compile(motif, re.IGNORECASE)
+            truth = _truth(conn, pattern)
+            refs = xref_lookup(conn, name, kind=kind, limit=100_000)["references"]
+            got_x = {(r["path"], r["line"]) for r in refs}
+            got_f = _fts_regex(conn, name, pattern, args.top_k)
+            ms_x = _median_ms(lambda: xref_lookup(conn, name, kind=kind, limit=100_000), args.repeat)
+            ms_f = _median_ms(lambda: _fts_regex(conn, name, pattern, args.top_k), args.repeat)
+            rec_x = len(got_x & truth) / len(truth) if truth else 1.0
+            rec_f = len(got_f & truth) / len(truth) if truth else 1.0
+            print(f"{name:<12} {len(truth):>6} rappel {rec_x:4.2f} {ms_x:6.2f}ms   rappel {rec_f:4.2f} {ms_f:8.2f}ms")
+
+        print("\nanswer_rules (top-k 8) : features précalculées vs extraction à la volée")
+        for q in RULES_QUESTIONS:
+            hits = search_fts(conn, q, top_k=8, hydrate=True)
+            ids = [h["chunk_id"] for h in hits]
+            ms_stored = _median_ms(lambda: chunk_features(conn, ids), args.repeat)
+            ms_extract = _median_ms(lambda: [extract_features(h["doc_type"], h["text"]) for h in hits], args.repeat)
+            ms_rules = _median_ms(lambda: answer_rules(db, q, conn=conn), args.repeat)
+            print(f"  {q:<36} features {ms_stored:6.3f}ms (extraction {ms_extract:6.3f}ms)  answer_rules {ms_rules:6.2f}ms")
+        conn.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
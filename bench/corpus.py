@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Dict, Optional
+
+_VERBS = ["COPY", "APPEND", "RENAME", "DELETE", "PURGE", "SUBMIT"]
+_WORDS = [
+    "client", "facture", "compte", "batch", "journal", "erreur", "fichier",
+    "traitement", "lot", "stock", "commande", "solde", "archive", "export",
+]
+
+
+def _dcl(rnd: random.Random, n: int) -> str:
+    lines = [
+        "$!======================================================================",
+        f"$!  JOB_{n:05d}.COM",
+        "$!======================================================================",
+        "$ SET NOON",
+        "$ ON ERROR THEN GOTO ERR_HANDLER",
+    ]
+    for s in range(rnd.randint(3, 8)):
+        lines.append(f"$ STEP_{s}:")
+        for _ in range(rnd.randint(4, 12)):
+            w = rnd.choice(_WORDS)
+            lines.append(f"$   {rnd.choice(_VERBS)} {w.upper()}_{rnd.randint(1, 99)}.DAT DISK$DATA:[{w.upper()}]")
+        lines.append(f"$   RUN SYS$SYSTEM:PROG_{rnd.randint(1, 500):03d}.EXE")
+        lines.append(f"$   @COM:SUB_{rnd.randint(1, 200):03d}.COM")
+        lines.append("$   IF .NOT. $STATUS THEN GOTO ERR_HANDLER")
+        lines.append("")
+    lines += ["$ ERR_HANDLER:", "$   WRITE SYS$OUTPUT \"Erreur \", $STATUS", "$   EXIT 44"]
+    return "\n".join(lines) + "\n"
+
+
+def _c(rnd: random.Random, n: int) -> str:
+    out = ["#include <stdio.h>", "#include <descrip.h>", ""]
+    for f in range(rnd.randint(3, 10)):
+        w = rnd.choice(_WORDS)
+        out.append(f"static int {w}_{n}_{f}(int arg)")
+        out.append("{")
+        for _ in range(rnd.randint(3, 15)):
+            out.append(f"    status = lib_{rnd.choice(_WORDS)}(arg, {rnd.randint(0, 9)});")
+            out.append("    if (!(status & 1)) LIB$SIGNAL(status);")
+        out.append("    return status;")
+        out.append("}")
+        out.append("")
+    return "\n".join(out)
+
+
+def _sql(rnd: random.Random, n: int) -> str:
+    out = [f"MODULE MOD_{n}", "LANGUAGE C", ""]
+    for _ in range(rnd.randint(3, 10)):
+        a, b = rnd.sample(_WORDS, 2)
+        out.append(f"PROCEDURE {a.upper()}_{rnd.randint(1, 99)} (SQLCODE);")
+        out.append(f"SELECT * FROM T_{a.upper()} A")
+        out.append(f"  JOIN T_{b.upper()} B ON A.ID = B.ID")
+        out.append(f"  WHERE A.{b.upper()} = :P1;")
+        out.append(f"UPDATE T_{b.upper()} SET ETAT = 'OK' WHERE ID = :P2;")
+        out.append("")
+    return "\n".join(out)
+
+
+def _log(rnd: random.Random, n: int) -> str:
+    out = []
+    for i in range(rnd.randint(50, 400)):
+        out.append(f"{i:06d} %{rnd.choice(['SYSTEM', 'RMS', 'LIB'])}-{rnd.choice('IWEF')}-{rnd.choice(_WORDS).upper()}, {rnd.choice(_WORDS)} {rnd.randint(0, 10**6)}")
+    return "\n".join(out) + "\n"
+
+
+_KINDS = (("dcl", ".com", _dcl), ("c", ".c", _c), ("sqlmod", ".sqlmod", _sql), ("log", ".log", _log))
+
+
+def generate_corpus(root: Path, n_files: int = 500, seed: int = 42, size_mb: Optional[float] = None) -> Dict[str, int]:
+    """Génère un corpus synthétique déterministe (DCL/C/SQLMOD/logs) sous root.
+
+    size_mb : fichiers générés jusqu'à atteindre cette taille (n_files ignoré).
+    Renvoie le nombre de fichiers par type.
+    """
+    rnd = random.Random(seed)
+    counts: Dict[str, int] = {}
+    total = 0
+    n = 0
+    while (total < size_mb * 1_000_000) if size_mb is not None else (n < n_files):
+        kind, ext, gen = _KINDS[n % len(_KINDS)]
+        folder = root / rnd.choice(["batch", "app", "db", "ops"]) / rnd.choice(["nightly", "daily", "adhoc"])
+        folder.mkdir(parents=True, exist_ok=True)
+        data = gen(rnd, n).encode("utf-8")
+        (folder / f"{kind}_{n:05d}{ext}").write_bytes(data)
+        counts[kind] = counts.get(kind, 0) + 1
+        total += len(data)
+        n += 1
+    return counts
@@ -0,0 +1,115 @@
+"""Faux serveur Ollama local (HTTP/1.1 keep-alive) pour les benchmarks du client LLM.
+
+- POST /api/generate : stream=false (JSON + compteurs de tokens) ou stream=true (NDJSON chunked) ;
+- POST /api/embed    : un vecteur déterministe par entrée (coût fixe + coût par entrée) ;
+- fail_rate          : fraction de requêtes refusées en 503 (exerce les retries du client).
+Compte connexions TCP et requêtes reçues (FakeOllama.stats).
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # comme Ollama (Go) : en-têtes et corps sans attendre d'ACK
+    server: "FakeOllama"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def _send_json(self, status: int, obj: Dict) -> None:
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+        srv.count("requests")
+        if srv.rnd_fail():
+            srv.count("failed")
+            self._send_json(503, {"error": "server busy"})
+            return
+        if self.path == "/api/embed":
+            inputs = body.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            time.sleep(srv.latency_s + srv.per_input_s * len(inputs))
+            vecs = [[((zlib.crc32(f"{t}:{i}".encode()) % 2001) - 1000) / 1000 for i in range(srv.dim)] for t in inputs]
+            self._send_json(200, {"model": body.get("model"), "embeddings": vecs, "prompt_eval_count": len(inputs) * 8})
+            return
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        time.sleep(srv.latency_s)
+        parts = [f"mot{i} " for i in range(srv.tokens)]
+        done = {"response": "", "done": True, "prompt_eval_count": len(body.get("prompt", "")) // 4,
+                "eval_count": srv.tokens, "eval_duration": int(srv.token_s * srv.tokens * 1e9)}
+        if not body.get("stream"):
+            time.sleep(srv.token_s * srv.tokens)
+            self._send_json(200, dict(done, response="".join(parts)))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for obj in [{"response": p, "done": False} for p in parts] + [done]:
+            line = (json.dumps(obj) + "\n").encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+            if not obj["done"]:
+                time.sleep(srv.token_s)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, fmt, *args):
+        return
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, *, latency_s: float = 0.05, token_s: float = 0.0, tokens: int = 20,
+                 per_input_s: float = 0.0005, dim: int = 64, fail_rate: float = 0.0, seed: int = 1):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency_s, self.token_s, self.tokens = latency_s, token_s, tokens
+        self.per_input_s, self.dim, self.fail_rate = per_input_s, dim, fail_rate
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + 1
+
+    def rnd_fail(self) -> bool:
+        with self._lock:
+            return self._rnd.random() < self.fail_rate
+
+    def stats(self, reset: bool = False) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            if reset:
+                self._stats.clear()
+            return out
+
+
+def start_fake_ollama(**kwargs) -> Tuple[str, FakeOllama]:
+    """Démarre un FakeOllama dans un thread ; renvoie (url, serveur)."""
+    server = FakeOllama(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.url, server
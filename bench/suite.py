@@ -0,0 +1,301 @@
+"""Suite de mesures reproductible (cli.py bench) : corpus synthétique déterministe,
+puis indexation, chunkers, recherche par forme de requête et taille de base.
+
+Le résultat est un dict JSON (SUITE_VERSION) à conserver par commit ; compare()
+met deux résultats en regard, métrique par métrique :
+- corpus   : fichiers par type, octets, durée de génération ;
+- index    : index_root complet puis relance sans changement (durées du journal,
+             fichiers/s, Mo/s, chunks) ;
+- chunkers : par type, débit du chunker seul sur les textes déjà lus (meilleur
+             de plusieurs passes) ;
+- queries  : par forme (identifiant, phrase, question, filtrée, absente,
+             re-classée, xref), latences p50/p95/p99/max et hits moyens ;
+- db       : taille (base + WAL), octets par octet source, taille par table (dbstat).
+Usage : python3 bench/suite.py [--files 2000 | --size-mb 50] [--out res.json] [--compare ancien.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.corpus import generate_corpus  # noqa: E402
+from chunkers.registry import default_registry  # noqa: E402
+from indexing import SourceFile, detect_doc_type, index_root  # noqa: E402
+from models import Document  # noqa: E402
+from rerank import search_reranked  # noqa: E402
+from store.sqlite import connect_db, search_fts, xref_lookup  # noqa: E402
+
+SUITE_VERSION = 1
+
+# forme -> requêtes ; chaque requête : (texte, doc_type, scope)
+QUERY_SHAPES: Dict[str, List[Tuple[str, Optional[str], Optional[str]]]] = {
+    "identifier": [("LIB$SIGNAL", None, None), ("SUB_042", None, None), ("T_CLIENT", None, None), ("PROG_144", None, None)],
+    "phrase": [('"ON ERROR THEN GOTO ERR_HANDLER"', None, None), ('"IF .NOT. $STATUS"', None, None), ('"UPDATE T_CLIENT SET ETAT"', None, None)],
+    "natural": [
+        ("que fait le batch en cas d'erreur ?", None, None),
+        ("where is LIB$SIGNAL called with status", None, None),
+        ("mise à jour de la table T_CLIENT", None, None),
+        ("archive facture erreur PROG_144", None, None),
+    ],
+    "filtered": [("ERR_HANDLER", "dcl", "batch"), ("lib_compte status", "c", "app"), ("T_FACTURE", "sqlmod", None)],
+    "miss": [("lib_inconnu", None, None), ("zzz_introuvable qqq", None, None)],
+    "rerank": [("que fait le batch en cas d'erreur ?", None, None), ("where is LIB$SIGNAL called with status", None, None)],
+    "xref": [("lib_compte", None, None), ("ERR_HANDLER", None, None), ("T_CLIENT", None, None)],
+}
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    s = sorted(samples_ms)
+
+    def pct(p: float) -> float:
+        return round(s[min(len(s) - 1, int(len(s) * p))], 3)
+
+    return {"p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(s[-1], 3), "n": len(s)}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment() -> Dict:
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def bench_corpus(root: Path, n_files: int, seed: int, size_mb: Optional[float]) -> Dict:
+    t0 = time.perf_counter()
+    counts = generate_corpus(root, n_files=n_files, seed=seed, size_mb=size_mb)
+    elapsed = time.perf_counter() - t0
+    files = [p for p in root.rglob("*") if p.is_file()]
+    return {
+        "files": len(files),
+        "bytes": sum(p.stat().st_size for p in files),
+        "by_type": counts,
+        "seed": seed,
+        "generate_s": round(elapsed, 3),
+    }
+
+
+def bench_index(db: str, root: Path, corpus_bytes: int, workers: int) -> Dict:
+    full = index_root(db, str(root), verbose=False, workers=workers)
+    again = index_root(db, str(root), verbose=False, workers=workers)
+    conn = connect_db(db)
+    try:
+        chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    finally:
+        conn.close()
+    total = full["timings"]["total_s"]
+    return {
+        "workers": workers,
+        "full": dict(full["timings"], added=full["added"]),
+        "files_per_s": round(full["added"] / total, 1) if total else None,
+        "mb_per_s": round(corpus_bytes / 1e6 / total, 2) if total else None,
+        "chunks": chunks,
+        "unchanged": dict(again["timings"], unchanged=again["unchanged"]),
+    }
+
+
+def bench_chunkers(root: Path, rounds: int = 3) -> Dict:
+    """Débit de chaque chunker seul : lecture et détection du type hors mesure."""
+    docs: Dict[str, List[Document]] = {}
+    for p in sorted(root.rglob("*")):
+        if not p.is_file():
+            continue
+        with SourceFile(p) as src:
+            doc_type = detect_doc_type(p, src.preview)
+            text = src.text()
+        docs.setdefault(doc_type, []).append(Document(str(p), str(p), "", doc_type, text, {}))
+    registry = default_registry()
+    out: Dict[str, Dict] = {}
+    for doc_type, items in sorted(docs.items()):
+        chunker = registry.resolve(doc_type)
+        chars = sum(len(d.text) for d in items)
+        best = float("inf")
+        chunks = 0
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            chunks = sum(len(chunker.chunk(d)) for d in items)
+            best = min(best, time.perf_counter() - t0)
+        out[doc_type] = {
+            "chunker": type(chunker).__name__,
+            "files": len(items),
+            "chars": chars,
+            "chunks": chunks,
+            "s": round(best, 4),
+            "mchars_per_s": round(chars / 1e6 / best, 2) if best else None,
+            "chunks_per_s": round(chunks / best, 1) if best else None,
+        }
+    return out
+
+
+def _query_fn(shape: str, conn: sqlite3.Connection) -> Callable[[str, Optional[str], Optional[str]], int]:
+    if shape == "rerank":
+        return lambda q, t, s: len(search_reranked(conn, q, top_k=10, doc_type=t, scope=s))
+    if shape == "xref":
+        return lambda q, t, s: sum(len(v) for v in xref_lookup(conn, q).values())
+    return lambda q, t, s: len(search_fts(conn, q, top_k=10, doc_type=t, scope=s, hydrate=True))
+
+
+def bench_queries(db: str, repeat: int) -> Dict:
+    conn = connect_db(db)
+    out: Dict[str, Dict] = {}
+    try:
+        for shape, queries in QUERY_SHAPES.items():
+            run = _query_fn(shape, conn)
+            samples: List[float] = []
+            hits: List[int] = []
+            for q, doc_type, scope in queries:
+                run(q, doc_type, scope)  # premier passage hors mesure (cache de pages, plan)
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    n = run(q, doc_type, scope)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                hits.append(n)
+            out[shape] = dict(_percentiles(samples), queries=len(queries), mean_hits=round(statistics.mean(hits), 1))
+    finally:
+        conn.close()
+    return out
+
+
+def bench_db(db: str, corpus_bytes: int) -> Dict:
+    conn = connect_db(db)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size = sum(os.path.getsize(db + ext) for ext in ("", "-wal") if os.path.exists(db + ext))
+        out = {
+            "bytes": size,
+            "bytes_per_source_byte": round(size / corpus_bytes, 3) if corpus_bytes else None,
+            "documents": conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            "chunks": conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+        }
+        try:
+            # dbstat : option de compilation de SQLite, pas toujours présente
+            rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC").fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        if rows:
+            out["tables"] = {name: int(n) for name, n in rows}
+        return out
+    finally:
+        conn.close()
+
+
+def run_suite(
+    *,
+    n_files: int = 2000,
+    size_mb: Optional[float] = None,
+    seed: int = 42,
+    workers: int = 1,
+    repeat: int = 20,
+    workdir: Optional[str] = None,
+    log: Callable[[str], None] = lambda msg: None,
+) -> Dict:
+    """Exécute toute la suite dans workdir (sinon un répertoire temporaire supprimé ensuite)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(workdir or tmp)
+        root = base / "corpus"
+        db = str(base / "bench.db")
+        if Path(db).exists() or root.exists():
+            raise ValueError(f"{base} contient déjà corpus/ ou bench.db : répertoire vide attendu")
+        result: Dict = {"suite": SUITE_VERSION, "env": environment()}
+        log("corpus")
+        result["corpus"] = corpus = bench_corpus(root, n_files, seed, size_mb)
+        log(f"index ({corpus['files']} fichiers, {corpus['bytes'] / 1e6:.1f} Mo)")
+        result["index"] = bench_index(db, root, corpus["bytes"], workers)
+        log("chunkers")
+        result["chunkers"] = bench_chunkers(root)
+        log("queries")
+        result["queries"] = bench_queries(db, repeat)
+        result["db"] = bench_db(db, corpus["bytes"])
+        result["params"] = {"files": n_files, "size_mb": size_mb, "seed": seed, "workers": workers, "repeat": repeat}
+    return result
+
+
+def _flatten(d: Dict, prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(old: Dict, new: Dict) -> List[str]:
+    """Lignes « métrique ancien -> nouveau (écart %) » des métriques communes (hors env)."""
+    a = _flatten({k: v for k, v in old.items() if k not in ("env", "params")})
+    b = _flatten({k: v for k, v in new.items() if k not in ("env", "params")})
+    lines = []
+    if old.get("params") != new.get("params"):
+        lines.append(f"paramètres différents : {old.get('params')} vs {new.get('params')}")
+    for key in sorted(a.keys() & b.keys()):
+        delta = f"{(b[key] - a[key]) / a[key] * 100:+.1f}%" if a[key] else "-"
+        lines.append(f"{key:<44} {a[key]:>12} -> {b[key]:<12} {delta}")
+    return lines
+
+
+def summary(result: Dict) -> List[str]:
+    ix, db = result["index"], result["db"]
+    lines = [
+        f"corpus   {result['corpus']['files']} fichiers, {result['corpus']['bytes'] / 1e6:.1f} Mo",
+        f"index    {ix['full']['total_s']:.2f}s ({ix['files_per_s']} fichiers/s, {ix['mb_per_s']} Mo/s, {ix['chunks']} chunks), "
+        f"relance sans changement {ix['unchanged']['total_s']:.2f}s",
+    ]
+    for doc_type, c in result["chunkers"].items():
+        lines.append(f"chunker  {doc_type:<7} {c['chunker']:<16} {c['mchars_per_s']} Mcar/s, {c['chunks_per_s']} chunks/s")
+    for shape, q in result["queries"].items():
+        lines.append(f"query    {shape:<11} p50 {q['p50_ms']:.2f}ms  p95 {q['p95_ms']:.2f}ms  p99 {q['p99_ms']:.2f}ms  hits {q['mean_hits']}")
+    lines.append(f"db       {db['bytes'] / 1e6:.1f} Mo ({db['bytes_per_source_byte']} octet par octet source)")
+    return lines
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--size-mb", type=float, default=None, help="Taille du corpus (remplace --files)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--out", default="-")
+    ap.add_argument("--compare", default=None, help="Résultat JSON d'un autre commit")
+    args = ap.parse_args()
+
+    result = run_suite(n_files=args.files, size_mb=args.size_mb, seed=args.seed, workers=args.workers, repeat=args.repeat)
+    print("\n".join(summary(result)), file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), result)), file=sys.stderr)
+    data = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out == "-":
+        print(data)
+    else:
+        Path(args.out).write_text(data + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+"""Cache LRU en mémoire des résultats de recherche (search_fts, build_context).
+
+Borné en entrées et en octets (taille JSON approximative). Chaque base a son
+cache, vidé dès que la génération de l'index (index_meta 'generation',
+incrémentée par BulkWriter à chaque commit modifiant les chunks) change.
+Les valeurs sont partagées entre appelants : ne pas les modifier.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from store.sqlite import get_generation
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _sizeof(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=lambda o: getattr(o, "__dict__", str(o))))
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation: Optional[int] = None
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def _sync(self, generation: int) -> None:
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.generation = generation
+
+    def get(self, generation: int, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            self._sync(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, generation: int, key: Hashable, value: Any) -> None:
+        size = _sizeof(value)
+        with self._lock:
+            # résultat calculé sur une génération déjà dépassée : pas mis en cache
+            if generation != self.generation or size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, generation: int, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return compute()
+        found, value = self.get(generation, key)
+        if found:
+            return value
+        value = compute()
+        self.put(generation, key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_caches: Dict[str, QueryCache] = {}
+_caches_lock = threading.Lock()
+_limits = {"max_entries": DEFAULT_MAX_ENTRIES, "max_bytes": DEFAULT_MAX_BYTES}
+
+
+def configure_query_cache(max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    """Limites des caches (0 désactive) ; s'applique aussi aux caches déjà créés."""
+    with _caches_lock:
+        _limits.update(max_entries=max_entries, max_bytes=max_bytes)
+        for cache in _caches.values():
+            cache.max_entries, cache.max_bytes = max_entries, max_bytes
+            cache.clear()
+
+
+def query_cache(db_path: str) -> QueryCache:
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = QueryCache(**_limits)
+        return cache
+
+
+def query_key(kind: str, q: str, top_k: int, doc_type: Optional[str], scope: Optional[str], *extra: Hashable) -> Tuple:
+    """Clé normalisée : espaces et casse de q sont sans effet sur la requête FTS (unicode61)."""
+    return (kind, " ".join(q.split()).lower(), int(top_k), doc_type or None, scope or None) + extra
+
+
+def cached_query(conn: sqlite3.Connection, db_path: str, key: Tuple, compute: Callable[[], Any]) -> Any:
+    cache = query_cache(db_path)
+    if not cache.enabled:
+        return compute()
+    return cache.get_or_compute(get_generation(conn), key, compute)
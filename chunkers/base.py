@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from models import Document, Chunk
 
@@ -10,3 +10,26 @@ class Chunker(ABC):
     @abstractmethod
     def chunk(self, doc: Document) -> List[Chunk]:
         raise NotImplementedError
+
+
+class StreamingChunker(Chunker):
+    """Chunker qui découpe aussi un flux de lignes (fichiers lus en flux, cf. indexing.TextStream)."""
+
+    @abstractmethod
+    def iter_chunks(self, lines: Iterable[str], doc_type: str, path: str) -> Iterator[Chunk]:
+        raise NotImplementedError
+
+
+def strip_blank_edges(lines: Sequence[str], start_line: int) -> Optional[Tuple[str, int, int]]:
+    """Lignes vides retirées aux bords -> (texte, première ligne, dernière ligne), None
+    si rien d'autre que du blanc. Le texte reste aligné sur la source : sa ligne i
+    est la ligne start_line + i (xref, citations et packing en dépendent)."""
+    lo, hi = 0, len(lines)
+    while lo < hi and lines[lo] == "":
+        lo += 1
+    while hi > lo and lines[hi - 1] == "":
+        hi -= 1
+    text = "\n".join(lines[lo:hi])
+    if not text.strip():
+        return None
+    return text, start_line + lo, start_line + hi - 1
@@ -44,15 +44,19 @@ class CLikeChunker(Chunker):
         for i, m in enumerate(matches):
             start = m.start()
             end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-            body = text[start:end].strip("\n")
+            raw = text[start:end]
+            body = raw.strip("\n")
             if not body.strip():
                 continue
+            # _FUNC_RE peut commencer sur les lignes vides qui précèdent la fonction ;
+            # plage = lignes de body (sans les lignes vides qui précèdent la suivante)
+            start += len(raw) - len(raw.lstrip("\n"))
             fn = m.group(1)
             chunks.append(
                 Chunk(
                     chunk_index=len(chunks),
                     start_line=char_to_line(start),
-                    end_line=char_to_line(end),
+                    end_line=char_to_line(start + len(body) - 1),
                     text=body,
                     kind="function",
                     meta={"doc_type": doc.doc_type, "path": doc.path, "function": fn},
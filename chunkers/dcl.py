@@ -3,7 +3,7 @@ from __future__ import annotations
 import re
 from typing import List, Optional, Tuple
 
-from chunkers.base import Chunker
+from chunkers.base import Chunker, strip_blank_edges
 from models import Document, Chunk
 
 _LABEL_RE = re.compile(r"^\s*\$[A-Za-z0-9_]+:\s*$")
@@ -60,13 +60,14 @@ class DclChunker(Chunker):
 
         chunks: List[Chunk] = []
         for (s, e, k) in segments:
-            txt = "\n".join(lines[s:e + 1]).strip("\n")
-            if txt.strip():
+            kept = strip_blank_edges(lines[s:e + 1], s + 1)
+            if kept:
+                txt, first, last = kept
                 chunks.append(
                     Chunk(
                         chunk_index=len(chunks),
-                        start_line=s + 1,
-                        end_line=e + 1,
+                        start_line=first,
+                        end_line=last,
                         text=txt,
                         kind=k,
                         meta={"doc_type": doc.doc_type, "path": doc.path},
@@ -87,7 +88,8 @@ class DclChunker(Chunker):
                     chunk_index=prev.chunk_index,
                     start_line=prev.start_line,
                     end_line=ch.end_line,
-                    text=prev.text + "\n" + ch.text,
+                    # lignes vides entre les deux remises : texte aligné sur la plage
+                    text=prev.text + "\n" * (ch.start_line - prev.end_line) + ch.text,
                     kind=prev.kind,
                     meta=prev.meta,
                 )
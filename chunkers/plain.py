@@ -1,51 +1,44 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Iterable, Iterator, List
 
-from chunkers.base import Chunker
+from chunkers.base import StreamingChunker, strip_blank_edges
 from models import Document, Chunk
 
 
-class PlainChunker(Chunker):
+class PlainChunker(StreamingChunker):
     """Chunker générique: découpe par paragraphes + taille max."""
 
     def __init__(self, max_chars: int = 4500):
         self.max_chars = max_chars
 
     def chunk(self, doc: Document) -> List[Chunk]:
-        lines = doc.text.splitlines()
-        chunks: List[Chunk] = []
+        return list(self.iter_chunks(doc.text.splitlines(), doc.doc_type, doc.path))
+
+    def iter_chunks(self, lines: Iterable[str], doc_type: str, path: str) -> Iterator[Chunk]:
+        """Découpe en flux : lines peut venir de indexing.TextStream.lines().
+
+        Taille du tampon ("\n".join(buf)) tenue à jour ligne par ligne :
+        linéaire en la taille du texte.
+        """
+        meta = {"doc_type": doc_type, "path": path}
         buf: List[str] = []
+        size = -1  # len("\n".join(buf))
         start_line = 1
         idx = 0
-
-        def flush(end_line: int) -> None:
-            nonlocal idx, start_line, buf
-            txt = "\n".join(buf).strip("\n")
-            if txt.strip():
-                chunks.append(
-                    Chunk(
-                        chunk_index=idx,
-                        start_line=start_line,
-                        end_line=end_line,
-                        text=txt,
-                        kind="block",
-                        meta={"doc_type": doc.doc_type, "path": doc.path},
-                    )
-                )
-                idx += 1
-            buf = []
-            start_line = end_line + 1
-
+        i = 0
         for i, ln in enumerate(lines, start=1):
             buf.append(ln)
-            if len("\n".join(buf)) >= self.max_chars:
-                flush(i)
-                continue
-            if ln.strip() == "" and len(buf) >= 10:
-                flush(i)
-
-        if buf:
-            flush(len(lines))
-
-        return chunks
+            size += len(ln) + 1
+            if size >= self.max_chars or (len(buf) >= 10 and ln.strip() == ""):
+                kept = strip_blank_edges(buf, start_line)
+                if kept:
+                    yield Chunk(idx, kept[1], kept[2], kept[0], "block", dict(meta))
+                    idx += 1
+                buf = []
+                size = -1
+                start_line = i + 1
+
+        kept = strip_blank_edges(buf, start_line)
+        if kept:
+            yield Chunk(idx, kept[1], kept[2], kept[0], "block", dict(meta))
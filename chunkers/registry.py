@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Dict
 
-from chunkers.base import Chunker
+from chunkers.base import Chunker, StreamingChunker
 from chunkers.plain import PlainChunker
 from chunkers.dcl import DclChunker
 from chunkers.c_like import CLikeChunker
@@ -19,6 +19,11 @@ class ChunkerRegistry:
     def resolve(self, doc_type: str) -> Chunker:
         return self._by_type.get(doc_type) or self._by_type["text"]
 
+    def resolve_stream(self, doc_type: str) -> StreamingChunker:
+        """Chunker capable de découper un flux de lignes : celui du type, sinon "text"."""
+        chunker = self.resolve(doc_type)
+        return chunker if isinstance(chunker, StreamingChunker) else self._by_type["text"]  # type: ignore[return-value]
+
 
 def default_registry() -> ChunkerRegistry:
     reg = ChunkerRegistry()
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 import re
-from typing import List
+from typing import Iterable, Iterator, List, Optional
 
-from chunkers.base import Chunker
+from chunkers.base import StreamingChunker, strip_blank_edges
 from chunkers.plain import PlainChunker
 from models import Document, Chunk
 
@@ -11,7 +11,7 @@ _STMT_END_RE = re.compile(r";\s*$", re.MULTILINE)
 _KEYWORD_RE = re.compile(r"^\s*(SELECT|UPDATE|INSERT|DELETE|CREATE|DROP|ALTER|DECLARE)\b", re.IGNORECASE)
 
 
-class SQLModChunker(Chunker):
+class SQLModChunker(StreamingChunker):
     """Chunker SQL/SQLMOD : découpe par statements (;) + mots-clés, fallback plain."""
 
     def __init__(self, max_lines: int = 120):
@@ -19,42 +19,79 @@ class SQLModChunker(Chunker):
         self.plain = PlainChunker(max_chars=6500)
 
     def chunk(self, doc: Document) -> List[Chunk]:
-        lines = doc.text.splitlines()
-        if not lines:
-            return []
+        chunks = list(self._statements(doc.text.splitlines(), doc.doc_type, doc.path))
+        if len(chunks) <= 1 and len(doc.text) > 6500:
+            return self.plain.chunk(doc)
+        return chunks
+
+    def iter_chunks(self, lines: Iterable[str], doc_type: str, path: str) -> Iterator[Chunk]:
+        """Découpe en flux, repli plain compris : les lignes sont gardées jusqu'au
+        deuxième statement (au plus 2 * max_lines lignes), le repli ne concernant
+        que les textes d'au plus un statement. Taille du texte : lignes + 1 fin de ligne."""
+        held: List[str] = []
+        size = 0
+        holding = True
+
+        def tap() -> Iterator[str]:
+            nonlocal size
+            for ln in lines:
+                if holding:
+                    held.append(ln)
+                    size += len(ln) + 1
+                yield ln
 
-        chunks: List[Chunk] = []
+        first: Optional[Chunk] = None
+        for ch in self._statements(tap(), doc_type, path):
+            if holding and first is None:
+                first = ch
+                continue
+            if holding:
+                holding = False
+                held.clear()
+                yield first
+            yield ch
+        if holding:
+            if size > 6500:
+                yield from self.plain.iter_chunks(held, doc_type, path)
+            elif first is not None:
+                yield first
+
+    def _statements(self, lines: Iterable[str], doc_type: str, path: str) -> Iterator[Chunk]:
         buf: List[str] = []
         start_line = 1
-        kind = "query"
-
-        def flush(end_line: int) -> None:
-            nonlocal buf, start_line
-            txt = "\n".join(buf).strip("\n")
-            if txt.strip():
-                chunks.append(
-                    Chunk(
-                        chunk_index=len(chunks),
-                        start_line=start_line,
-                        end_line=end_line,
-                        text=txt,
-                        kind=kind,
-                        meta={"doc_type": doc.doc_type, "path": doc.path},
-                    )
-                )
-            buf = []
-            start_line = end_line + 1
-
+        idx = 0
+        i = 0
         for i, ln in enumerate(lines, start=1):
             if _KEYWORD_RE.match(ln) and buf:
-                flush(i - 1)
+                ch = self._make(buf, idx, start_line, i - 1, doc_type, path)
+                if ch:
+                    idx += 1
+                    yield ch
+                buf, start_line = [], i
             buf.append(ln)
             if _STMT_END_RE.search(ln) or (i - start_line + 1) >= self.max_lines:
-                flush(i)
+                ch = self._make(buf, idx, start_line, i, doc_type, path)
+                if ch:
+                    idx += 1
+                    yield ch
+                buf, start_line = [], i + 1
 
         if buf:
-            flush(len(lines))
+            ch = self._make(buf, idx, start_line, i, doc_type, path)
+            if ch:
+                yield ch
 
-        if len(chunks) <= 1 and len(doc.text) > 6500:
-            return self.plain.chunk(doc)
-        return chunks
+    @staticmethod
+    def _make(buf: List[str], idx: int, start_line: int, end_line: int, doc_type: str, path: str) -> Optional[Chunk]:
+        kept = strip_blank_edges(buf, start_line)
+        if kept is None:
+            return None
+        txt, start_line, end_line = kept
+        return Chunk(
+            chunk_index=idx,
+            start_line=start_line,
+            end_line=end_line,
+            text=txt,
+            kind="query",
+            meta={"doc_type": doc_type, "path": path},
+        )
@@ -2,48 +2,204 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
+import sys
+import time
 from typing import List, Optional
 
-from indexing import index_root
-from store.sqlite import connect_db, init_db, search_fts, get_chunk
-from api_server import serve as serve_http
-from rag import build_context, answer_with_ollama, answer_rules
+# indexing, rag, les serveurs HTTP, api_server et bench sont importés par
+# les commandes qui s'en servent : une commande de lecture lancée en boucle ne paie
+# pas leur démarrage (bench/bench_startup.py)
+from batch import DEFAULT_WORKERS, OPS, encode_record, iter_items, run_batch, summarize
+from cache import configure_query_cache
+from rerank import FETCH_FACTOR, search_reranked
+from store.sqlite import ConnectionPool, FTS_LAYOUTS, FTS_TOKENIZERS, connect_db, drop_text, ensure_schema, fts_layout, fts_tokenizer, has_trigram, migrate_fts, search_fts, xref_lookup
+from symbols import DEF_KINDS, REF_KINDS
 
 
 def cmd_index(args: argparse.Namespace) -> None:
+    from indexing import index_root
+
     include = args.include_exts.split(",") if args.include_exts else None
-    index_root(args.db, args.root, include_exts=include, verbose=not args.quiet)
+    index_root(
+        args.db,
+        args.root,
+        include_exts=include,
+        verbose=not args.quiet,
+        workers=args.workers,
+        batch_docs=args.batch_docs,
+        batch_bytes=int(args.batch_mb * 1_000_000),
+        bulk_load=args.bulk,
+        rehash=args.rehash,
+        fts_layout=args.fts_layout,
+        embed=args.embed,
+        fts_tokenizer=args.tokenizer,
+        trigram=args.trigram or None,
+    )
+
+
+def cmd_migrate(args: argparse.Namespace) -> None:
+    conn = connect_db(args.db)
+    try:
+        before = _db_size(args.db)
+        t0 = time.perf_counter()
+        migrate_fts(
+            conn,
+            args.fts_layout,
+            vacuum=not args.no_vacuum,
+            tokenizer=args.tokenizer,
+            trigram=args.trigram,
+            rebuild=args.rebuild,
+        )
+        elapsed = time.perf_counter() - t0
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = _db_size(args.db)
+        layout, tokenizer, trigram = fts_layout(conn), fts_tokenizer(conn), has_trigram(conn)
+    finally:
+        conn.close()
+    print(
+        f"[migrate] fts_layout={layout} tokenizer={tokenizer} trigram={'on' if trigram else 'off'} "
+        f"size {before / 1e6:.1f} Mo -> {after / 1e6:.1f} Mo ({elapsed:.1f}s) db={args.db}"
+    )
+
+
+def _db_size(db_path: str) -> int:
+    return sum(os.path.getsize(db_path + ext) for ext in ("", "-wal") if os.path.exists(db_path + ext))
 
 
 def cmd_query(args: argparse.Namespace) -> None:
     conn = connect_db(args.db)
-    init_db(conn)
-    hits = search_fts(conn, q=args.q, top_k=args.top_k, doc_type=args.type, scope=args.scope)
+    ensure_schema(conn)
+    stages: List[dict] = []
+    timings: List[dict] = []
+    if args.rerank:
+        hits = search_reranked(
+            conn, args.q, top_k=args.top_k, doc_type=args.type, scope=args.scope, hydrate=True, hybrid=args.hybrid,
+            fetch=args.fetch, min_score=args.min_score, stages=stages, timings=timings,
+        )
+    else:
+        hits = search_fts(
+            conn, q=args.q, top_k=args.top_k, doc_type=args.type, scope=args.scope, hydrate=True, hybrid=args.hybrid, stages=stages
+        )
+        hits = [h for h in hits if h["score"] >= args.min_score]
 
     if args.format == "json":
-        out_hits = []
-        for h in hits:
-            ch = get_chunk(conn, int(h["chunk_id"]))
-            out_hits.append({**h, "start_line": ch["start_line"], "end_line": ch["end_line"], "kind": ch["kind"]})
-        print(json.dumps({"query": args.q, "top_k": args.top_k, "hits": out_hits}, ensure_ascii=False, indent=2))
+        out_hits = [drop_text(h) for h in hits]
+        print(json.dumps({"query": args.q, "top_k": args.top_k, "hits": out_hits, "stages": stages, "timings": timings}, ensure_ascii=False, indent=2))
         return
 
     print(f"Query: {args.q}")
+    print("Plan: " + " -> ".join(f"{s['stage']} {s['new']}/{s['hits']} ({s['ms']:.1f}ms)" for s in stages))
+    if timings:
+        print("Pipeline: " + " -> ".join(f"{t['stage']} {t['ms']:.1f}/{t['budget_ms']:.0f}ms" for t in timings))
     for i, h in enumerate(hits, start=1):
-        ch = get_chunk(conn, int(h["chunk_id"]))
-        print(f"\n#{i} score={h['score']:.4f} rank={h['rank']:.4f}")
-        print(f"  {h['path']}  ({h['doc_type']})  folder='{h['rel_folder']}'  lines {ch['start_line']}-{ch['end_line']}  kind={ch['kind']}")
+        print(f"\n#{i} score={h['score']:.4f} rank={h['rank']:.4f} stage={h['stage']}")
+        if "features" in h:
+            print("  " + " ".join(f"{k}={v:.2f}" for k, v in h["features"].items()))
+        print(f"  {h['path']}  ({h['doc_type']})  folder='{h['rel_folder']}'  lines {h['start_line']}-{h['end_line']}  kind={h['kind']}")
         print(f"  {h['snippet']}")
 
 
+def cmd_xref(args: argparse.Namespace) -> None:
+    conn = connect_db(args.db)
+    ensure_schema(conn)
+    result = xref_lookup(conn, args.name, kind=args.kind, prefix=args.prefix, limit=args.limit)
+    conn.close()
+    if args.format == "json":
+        print(json.dumps({"name": args.name, **result}, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Définitions de {args.name} : {len(result['definitions'])}")
+    for d in result["definitions"]:
+        print(f"  {d['path']}:{d['line']}  {d['kind']} {d['name']}")
+    print(f"Références à {args.name} : {len(result['references'])}")
+    for r in result["references"]:
+        caller = f"  (dans {r['caller']})" if r["caller"] else ""
+        print(f"  {r['path']}:{r['line']}  {r['kind']} {r['name']}{caller}")
+
+
+def cmd_batch(args: argparse.Namespace) -> None:
+    from api_server import prepare_db
+
+    # schéma créé/migré une fois, puis connexions en lecture partagées par les threads
+    prepare_db(args.db)
+    pool = ConnectionPool(args.db, size=args.workers)
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    ms: List[float] = []
+    errors = 0
+    t0 = time.perf_counter()
+    try:
+        for record in run_batch(pool, args.db, iter_items(src), workers=args.workers, ordered=not args.unordered, default_op=args.op):
+            out.write(encode_record(record))
+            if args.output == "-":
+                out.flush()
+            ms.append(record["ms"])
+            errors += record["status"] != 200
+    finally:
+        pool.close()
+        if src is not sys.stdin:
+            src.close()
+        if args.output != "-":
+            out.close()
+    if not args.quiet:
+        summary = summarize(ms, errors, time.perf_counter() - t0)
+        print(f"[batch] {json.dumps(summary)}", file=sys.stderr)
+
+
+def cmd_bench(args: argparse.Namespace) -> None:
+    from bench.suite import compare, run_suite, summary
+
+    log = (lambda msg: None) if args.quiet else (lambda msg: print(f"[bench] {msg}", file=sys.stderr))
+    result = run_suite(
+        n_files=args.files,
+        size_mb=args.size_mb,
+        seed=args.seed,
+        workers=args.workers,
+        repeat=args.repeat,
+        workdir=args.workdir,
+        log=log,
+    )
+    if not args.quiet:
+        print("\n".join(summary(result)), file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), result)), file=sys.stderr)
+    data = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out == "-":
+        print(data)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(data + "\n")
+
+
 def cmd_serve(args: argparse.Namespace) -> None:
-    serve_http(args.db, host=args.host, port=args.port)
+    configure_query_cache(max_entries=args.query_cache_entries, max_bytes=int(args.query_cache_mb * 1024 * 1024))
+    if args.use_async:
+        from api_async import serve_async
+
+        serve_async(
+            args.db,
+            host=args.host,
+            port=args.port,
+            pool_size=args.pool_size,
+            llm_concurrency=args.llm_concurrency,
+            max_pending=args.max_pending,
+        )
+        return
+    from api_server import serve
+
+    serve(args.db, host=args.host, port=args.port, pool_size=args.pool_size)
 
 
 def cmd_explain(args: argparse.Namespace) -> None:
+    from rag import answer_rules, answer_with_ollama, answer_with_ollama_stream, build_context
+
     # mode=context -> no llm call, just show retrieved evidence
     if args.mode == "context":
-        context, hits, citations = build_context(args.db, args.question, top_k=args.top_k, doc_type=args.type, scope=args.scope)
+        context, hits, citations = build_context(
+            args.db, args.question, top_k=args.top_k, doc_type=args.type, scope=args.scope, hybrid=args.hybrid
+        )
         payload = {
             "question": args.question,
             "hits": hits,
@@ -57,7 +213,7 @@ def cmd_explain(args: argparse.Namespace) -> None:
             print(context)
         return
     if args.mode == "rules":
-        result = answer_rules(args.db, args.question, top_k=args.top_k, doc_type=args.type, scope=args.scope)
+        result = answer_rules(args.db, args.question, top_k=args.top_k, doc_type=args.type, scope=args.scope, hybrid=args.hybrid)
         if args.format == "json":
             print(json.dumps(result, ensure_ascii=False, indent=2))
         else:
@@ -67,6 +223,31 @@ def cmd_explain(args: argparse.Namespace) -> None:
                 print(f"  [{i}] {c['path']} lines {c['start_line']}-{c['end_line']} ({c['doc_type']})")
         return
 
+    if args.format == "text" and not args.no_stream:
+        # tokens affichés dès leur arrivée ; citations à la fin
+        events = answer_with_ollama_stream(
+            args.db,
+            args.question,
+            top_k=args.top_k,
+            doc_type=args.type,
+            scope=args.scope,
+            model=args.model,
+            base_url=args.base_url,
+            timeout_s=args.timeout_s,
+            use_cache=not args.no_cache,
+            hybrid=args.hybrid,
+        )
+        citations = []
+        for event, data in events:
+            if event == "meta":
+                citations = data["citations"]
+            elif event == "token":
+                print(data["text"], end="", flush=True)
+        print("\n\nCitations:")
+        for i, c in enumerate(citations, start=1):
+            print(f"  [{i}] {c['path']} lines {c['start_line']}-{c['end_line']} ({c['doc_type']})")
+        return
+
     result = answer_with_ollama(
         args.db,
         args.question,
@@ -76,6 +257,8 @@ def cmd_explain(args: argparse.Namespace) -> None:
         model=args.model,
         base_url=args.base_url,
         timeout_s=args.timeout_s,
+        use_cache=not args.no_cache,
+        hybrid=args.hybrid,
     )
     if args.format == "json":
         print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -100,8 +283,26 @@ def build_parser() -> argparse.ArgumentParser:
     p_index.add_argument("--db", required=True)
     p_index.add_argument("--include-exts", default="")
     p_index.add_argument("--quiet", action="store_true")
+    p_index.add_argument("--workers", type=int, default=1, help="Processus de préparation (hash/lecture/chunking) en parallèle")
+    p_index.add_argument("--batch-docs", type=int, default=200, help="Documents par transaction")
+    p_index.add_argument("--batch-mb", type=float, default=32.0, help="Mo de texte par transaction")
+    p_index.add_argument("--bulk", action="store_true", help="Pragmas de chargement massif (reconstruction complète)")
+    p_index.add_argument("--rehash", action="store_true", help="Hacher tous les fichiers (ignore la comparaison size/mtime/inode)")
+    p_index.add_argument("--fts-layout", default=None, choices=FTS_LAYOUTS, help="Disposition FTS d'une nouvelle base (défaut: inline)")
+    p_index.add_argument("--tokenizer", default=None, choices=tuple(FTS_TOKENIZERS), help="Tokenizer FTS d'une nouvelle base (code : F$SEARCH, my_func d'un seul tenant)")
+    p_index.add_argument("--trigram", action="store_true", help="Index trigramme des sous-chaînes pour une nouvelle base")
+    p_index.add_argument("--embed", default=None, help="Embeddings des chunks : hash[:dim] ou ollama:<modèle> (ensuite automatique)")
     p_index.set_defaults(func=cmd_index)
 
+    p_migrate = sub.add_parser("migrate", help="Migrer/reconstruire en place l'index FTS d'une base existante")
+    p_migrate.add_argument("--db", required=True)
+    p_migrate.add_argument("--fts-layout", default=None, choices=FTS_LAYOUTS, help="external: texte stocké une seule fois (content='chunks')")
+    p_migrate.add_argument("--tokenizer", default=None, choices=tuple(FTS_TOKENIZERS), help="Tokenizer FTS (code : tokenchars '$_')")
+    p_migrate.add_argument("--trigram", default=None, action=argparse.BooleanOptionalAction, help="Créer (--trigram) ou supprimer (--no-trigram) l'index trigramme")
+    p_migrate.add_argument("--rebuild", action="store_true", help="Reconstruire chunks_fts même sans changement")
+    p_migrate.add_argument("--no-vacuum", action="store_true", help="Ne pas compacter la base après migration")
+    p_migrate.set_defaults(func=cmd_migrate)
+
     p_query = sub.add_parser("query", help="Interroger l'index (FTS)")
     p_query.add_argument("--db", required=True)
     p_query.add_argument("--q", required=True)
@@ -109,8 +310,21 @@ def build_parser() -> argparse.ArgumentParser:
     p_query.add_argument("--type", default=None)
     p_query.add_argument("--scope", default=None)
     p_query.add_argument("--format", default="text", choices=("text", "json"))
+    p_query.add_argument("--hybrid", action="store_true", help="Fusion bm25 + embeddings (index construit avec --embed)")
+    p_query.add_argument("--rerank", action="store_true", help="Re-classement de --fetch x top-k candidats (scores dans [0, 1])")
+    p_query.add_argument("--fetch", type=int, default=FETCH_FACTOR, help="Candidats de la première étape : fetch x top-k")
+    p_query.add_argument("--min-score", type=float, default=0.0, help="Score minimal des hits rendus")
     p_query.set_defaults(func=cmd_query)
 
+    p_xref = sub.add_parser("xref", help="Définitions et références d'un symbole (fonction C, procédure/label DCL, table SQL)")
+    p_xref.add_argument("--db", required=True)
+    p_xref.add_argument("--name", required=True, help="Nom du symbole (sans casse)")
+    p_xref.add_argument("--kind", default=None, choices=DEF_KINDS + REF_KINDS)
+    p_xref.add_argument("--prefix", action="store_true", help="Tous les symboles commençant par --name")
+    p_xref.add_argument("--limit", type=int, default=200, help="Lignes max par liste")
+    p_xref.add_argument("--format", default="text", choices=("text", "json"))
+    p_xref.set_defaults(func=cmd_xref)
+
     p_explain = sub.add_parser("explain", help="RAG 'answer' : récupère des extraits puis (optionnel) appelle un LLM")
     p_explain.add_argument("--db", required=True)
     p_explain.add_argument("--question", required=True)
@@ -122,12 +336,43 @@ def build_parser() -> argparse.ArgumentParser:
     p_explain.add_argument("--base-url", default=None, help="Ollama base url (sinon env RAGLITE_OLLAMA_URL ou http://localhost:11434)")
     p_explain.add_argument("--timeout-s", type=int, default=120)
     p_explain.add_argument("--format", default="text", choices=("text", "json"))
+    p_explain.add_argument("--hybrid", action="store_true", help="Fusion bm25 + embeddings (index construit avec --embed)")
+    p_explain.add_argument("--no-cache", action="store_true", help="Ignorer le cache des réponses LLM (ni lecture ni écriture)")
+    p_explain.add_argument("--no-stream", action="store_true", help="Attendre la réponse complète du LLM (format text)")
     p_explain.set_defaults(func=cmd_explain)
 
+    p_batch = sub.add_parser("batch", help="Exécuter un lot de requêtes (JSONL ou tableau JSON) dans un seul processus")
+    p_batch.add_argument("--db", required=True)
+    p_batch.add_argument("--input", default="-", help="Fichier JSONL ou tableau JSON (défaut : entrée standard)")
+    p_batch.add_argument("--output", default="-", help="Résultats JSONL (défaut : sortie standard)")
+    p_batch.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Threads et connexions SQLite (défaut {DEFAULT_WORKERS})")
+    p_batch.add_argument("--op", default="query", choices=OPS, help="Opération des lignes de texte brut (question seule)")
+    p_batch.add_argument("--unordered", action="store_true", help="Résultats dans l'ordre de fin (repérés par index et id)")
+    p_batch.add_argument("--quiet", action="store_true", help="Pas de bilan sur la sortie d'erreur")
+    p_batch.set_defaults(func=cmd_batch)
+
+    p_bench = sub.add_parser("bench", help="Suite de mesures sur un corpus synthétique (résultat JSON comparable entre commits)")
+    p_bench.add_argument("--files", type=int, default=2000, help="Fichiers du corpus (DCL, C, SQLMOD, logs)")
+    p_bench.add_argument("--size-mb", type=float, default=None, help="Taille du corpus en Mo (remplace --files)")
+    p_bench.add_argument("--seed", type=int, default=42, help="Graine : même graine, même corpus")
+    p_bench.add_argument("--workers", type=int, default=1, help="Processus de préparation de l'indexation")
+    p_bench.add_argument("--repeat", type=int, default=20, help="Exécutions de chaque requête mesurée")
+    p_bench.add_argument("--out", default="-", help="Résultat JSON (défaut : sortie standard)")
+    p_bench.add_argument("--compare", default=None, help="Résultat JSON d'un autre commit à mettre en regard")
+    p_bench.add_argument("--workdir", default=None, help="Répertoire vide où garder corpus/ et bench.db (sinon temporaire)")
+    p_bench.add_argument("--quiet", action="store_true", help="Pas de résumé sur la sortie d'erreur")
+    p_bench.set_defaults(func=cmd_bench)
+
     p_serve = sub.add_parser("serve", help="Lancer un serveur HTTP JSON (pour UI legacy)")
     p_serve.add_argument("--db", required=True)
     p_serve.add_argument("--host", default="127.0.0.1")
     p_serve.add_argument("--port", type=int, default=8787)
+    p_serve.add_argument("--pool-size", type=int, default=8, help="Connexions SQLite en lecture partagées (défaut 8)")
+    p_serve.add_argument("--query-cache-entries", type=int, default=1024, help="Cache LRU des recherches : entrées max (0 = désactivé)")
+    p_serve.add_argument("--query-cache-mb", type=float, default=64, help="Cache LRU des recherches : taille max en Mo")
+    p_serve.add_argument("--async", dest="use_async", action="store_true", help="Serveur asyncio à ressources bornées (429/503 à saturation)")
+    p_serve.add_argument("--llm-concurrency", type=int, default=2, help="--async : appels LLM simultanés (défaut 2)")
+    p_serve.add_argument("--max-pending", type=int, default=64, help="--async : requêtes en attente par voie avant refus (défaut 64)")
     p_serve.set_defaults(func=cmd_serve)
 
     return p
@@ -160,5 +405,4 @@ def main(argv: Optional[List[str]] = None) -> int:
 
 
 if __name__ == "__main__":
-    import sys
     sys.exit(main())
@@ -0,0 +1,282 @@
+"""Embeddings des chunks et recherche dense (optionnelle), fusionnée à bm25 par search_fts(hybrid=True).
+
+- embedders : "hash[:dim]" (CPU, sans dépendance : hashing de mots et trigrammes)
+  ou "ollama:<modèle>" (endpoint /api/embed) ;
+- stockage : table chunk_vectors, int8 + échelle par vecteur (dim octets + 8) ;
+- recherche : force brute, vectorisée avec NumPy s'il est installé, sinon en
+  Python pur (adapté à quelques dizaines de milliers de chunks).
+"""
+from __future__ import annotations
+
+import math
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from heapq import nlargest
+from operator import mul
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from store.sqlite import (
+    bump_generation,
+    chunk_ids_without_vector,
+    chunk_texts,
+    chunk_vectors,
+    clear_vectors,
+    filter_subquery,
+    get_generation,
+    get_meta,
+    iter_vectors,
+    set_meta,
+    write_vectors,
+)
+
+try:  # dépendance optionnelle
+    import numpy as np
+except ImportError:  # pragma: no cover - dépend de l'environnement
+    np = None
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_$]+|[^\W\d_]+")
+_CAMEL_RE = re.compile(r"[a-z]+|[A-Z][a-z]*|\d+")
+
+
+class HashingEmbedder:
+    """Stand-in local : sac de mots + trigrammes de caractères hachés (crc32) sur dim composantes.
+
+    Les trigrammes rapprochent les variantes ("errors" / ERR_HANDLER / erreur),
+    les identifiants sont aussi découpés sur _ et la casse.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.spec = f"hash:{dim}"
+
+    def _features(self, text: str) -> Dict[int, float]:
+        dim = self.dim
+        counts: Dict[int, float] = {}
+        for tok in _TOKEN_RE.findall(text):
+            parts = [tok] + [p for piece in tok.split("_") for p in _CAMEL_RE.findall(piece)]
+            for word in {p.lower() for p in parts if len(p) > 1}:
+                h = zlib.crc32(word.encode("utf-8"))
+                counts[h % dim] = counts.get(h % dim, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+                padded = f"^{word}$"
+                for i in range(len(padded) - 2):
+                    h = zlib.crc32(padded[i:i + 3].encode("utf-8"))
+                    counts[h % dim] = counts.get(h % dim, 0.0) + (0.5 if h & 0x80000000 else -0.5)
+        return counts
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        out = []
+        for text in texts:
+            vec = [0.0] * self.dim
+            for i, v in self._features(text).items():
+                # atténuation des termes très fréquents dans le chunk
+                vec[i] = math.copysign(math.log1p(abs(v)), v)
+            out.append(_normalize(vec))
+        return out
+
+
+class OllamaEmbedder:
+    """Ollama /api/embed, par lots parallèles sur le client partagé (keep-alive, retries)."""
+
+    def __init__(self, model: str, base_url: Optional[str] = None, timeout_s: int = 120):
+        self.model = model
+        self.base_url = base_url
+        self.timeout_s = timeout_s
+        self.spec = f"ollama:{model}"
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        from llm import get_client
+
+        vecs = get_client(self.base_url).embed(texts, model=self.model, batch_size=16, timeout_s=self.timeout_s)
+        return [_normalize([float(x) for x in v]) for v in vecs]
+
+
+def _normalize(vec: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec))
+    return [x / norm for x in vec] if norm else vec
+
+
+def get_embedder(spec: str):
+    """'hash', 'hash:384', 'ollama:nomic-embed-text'."""
+    kind, _, arg = spec.partition(":")
+    if kind == "hash":
+        return HashingEmbedder(int(arg) if arg else 256)
+    if kind == "ollama" and arg:
+        return OllamaEmbedder(arg)
+    raise ValueError(f"embedder inconnu: {spec} (attendu: hash[:dim] ou ollama:<modèle>)")
+
+
+def quantize(vec: Sequence[float]) -> Tuple[float, bytes]:
+    """int8 symétrique, une échelle par vecteur."""
+    peak = max((abs(x) for x in vec), default=0.0)
+    scale = peak / 127.0 if peak else 1.0
+    return scale, array("b", [int(round(x / scale)) for x in vec]).tobytes()
+
+
+# -------------------------
+# Indexation
+# -------------------------
+
+def prepare_embeddings(conn: sqlite3.Connection, spec: Optional[str]) -> Optional[str]:
+    """Embedder effectif : spec demandé (un changement efface les vecteurs existants)
+    ou celui déjà enregistré dans index_meta ; None si l'index n'a pas d'embeddings."""
+    stored = get_meta(conn, "embedder")
+    if spec is None:
+        return stored
+    spec = get_embedder(spec).spec
+    if stored != spec:
+        clear_vectors(conn)
+        set_meta(conn, "embedder", spec)
+        conn.commit()
+    return spec
+
+
+def embed_missing(conn: sqlite3.Connection, spec: str, *, batch_size: int = 64, verbose: bool = False) -> int:
+    """Calcule les embeddings des chunks qui n'en ont pas (nouveaux ou réindexés)."""
+    embedder = get_embedder(spec)
+    ids = chunk_ids_without_vector(conn)
+    for i in range(0, len(ids), batch_size):
+        rows = chunk_texts(conn, ids[i:i + batch_size])
+        vecs = embedder.embed([text for _, text in rows])
+        write_vectors(conn, [(cid, *quantize(v)) for (cid, _), v in zip(rows, vecs)])
+        if (i // batch_size) % 50 == 49:
+            conn.commit()
+            if verbose:
+                print(f"[embed] {i + batch_size}/{len(ids)}")
+    if ids:
+        bump_generation(conn)
+    conn.commit()
+    return len(ids)
+
+
+# -------------------------
+# Recherche
+# -------------------------
+
+class VectorIndex:
+    """Vecteurs int8 en mémoire, produit scalaire par force brute."""
+
+    def __init__(self, ids: List[int], scales: List[float], blobs: List[bytes], dim: int):
+        self.dim = dim
+        self.size = len(ids)
+        if np is not None:
+            self.ids = np.asarray(ids, dtype=np.int64)
+            self.scales = np.asarray(scales, dtype=np.float32)
+            self.data = np.frombuffer(b"".join(blobs), dtype=np.int8).reshape(len(ids), dim) if ids else np.zeros((0, dim), np.int8)
+        else:
+            self.ids = ids
+            self.scales = scales
+            self.data = [array("b", b) for b in blobs]
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "VectorIndex":
+        ids: List[int] = []
+        scales: List[float] = []
+        blobs: List[bytes] = []
+        for cid, scale, blob in iter_vectors(conn):
+            ids.append(cid)
+            scales.append(scale)
+            blobs.append(blob)
+        return cls(ids, scales, blobs, len(blobs[0]) if blobs else 0)
+
+    @classmethod
+    def from_arrays(cls, ids, scales, data) -> "VectorIndex":
+        """Construction directe (NumPy requis), pour les benchmarks."""
+        index = cls([], [], [], data.shape[1])
+        index.ids, index.scales, index.data, index.size = ids, scales, data, len(ids)
+        return index
+
+    def search(self, query: Sequence[float], k: int, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        if not self.size or k <= 0:
+            return []
+        if np is not None:
+            return self._search_numpy(np.asarray(query, dtype=np.float32), k, allowed)
+        scored = (
+            (cid, scale * sum(map(mul, query, vec)))
+            for cid, scale, vec in zip(self.ids, self.scales, self.data)
+            if allowed is None or cid in allowed
+        )
+        return nlargest(k, scored, key=lambda t: t[1])
+
+    def _search_numpy(self, query, k: int, allowed: Optional[Set[int]]) -> List[Tuple[int, float]]:
+        block = 65_536  # conversion int8 -> float32 par blocs : mémoire bornée
+        sims = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, block):
+            sims[start:start + block] = self.data[start:start + block].astype(np.float32) @ query
+        sims *= self.scales
+        if allowed is not None:
+            mask = np.isin(self.ids, np.fromiter(allowed, dtype=np.int64, count=len(allowed)))
+            sims[~mask] = -np.inf
+        k = min(k, self.size)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(self.ids[i]), float(sims[i])) for i in top if np.isfinite(sims[i])]
+
+
+_indexes: Dict[str, Tuple[int, VectorIndex]] = {}
+_embedders: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def _db_file(conn: sqlite3.Connection) -> str:
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def load_index(conn: sqlite3.Connection) -> VectorIndex:
+    """VectorIndex de la base, rechargé quand la génération de l'index change."""
+    key, generation = _db_file(conn), get_generation(conn)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+    index = VectorIndex.load(conn)
+    with _lock:
+        _indexes[key] = (generation, index)
+    return index
+
+
+def _query_embedder(conn: sqlite3.Connection):
+    """Embedder enregistré dans index_meta (instance partagée), None si l'index n'en a pas."""
+    spec = get_meta(conn, "embedder")
+    if not spec:
+        return None
+    with _lock:
+        embedder = _embedders.get(spec)
+        if embedder is None:
+            embedder = _embedders[spec] = get_embedder(spec)
+    return embedder
+
+
+def vector_scores(conn: sqlite3.Connection, q: str, chunk_ids: List[int]) -> Optional[Dict[int, float]]:
+    """{chunk_id: similarité cosinus} pour ces seuls chunks (vecteurs lus en base,
+    sans charger l'index) ; None si l'index n'a pas d'embeddings."""
+    embedder = _query_embedder(conn)
+    if embedder is None:
+        return None
+    query = embedder.embed([q])[0]
+    return {
+        cid: scale * sum(map(mul, query, array("b", blob)))
+        for cid, scale, blob in chunk_vectors(conn, chunk_ids)
+    }
+
+
+def vector_search(
+    conn: sqlite3.Connection,
+    q: str,
+    k: int,
+    doc_type: Optional[str] = None,
+    scope: Optional[str] = None,
+) -> List[Tuple[int, float]]:
+    """[(chunk_id, similarité)] par similarité décroissante ; [] si l'index n'a pas d'embeddings."""
+    embedder = _query_embedder(conn)
+    if embedder is None:
+        return []
+    index = load_index(conn)
+    allowed = None
+    sub, params = filter_subquery(doc_type, scope)
+    if sub:
+        allowed = {int(r[0]) for r in conn.execute(sub, params)}
+    return index.search(embedder.embed([q])[0], k, allowed)
+
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import codecs
+import dataclasses
 import hashlib
+import mmap
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from models import Document
-from chunkers.registry import default_registry
-from store.sqlite import connect_db, init_db, upsert_document, replace_chunks, should_reindex
+from models import Document, FileStat
+from chunkers.registry import ChunkerRegistry, default_registry
+from embeddings import embed_missing, prepare_embeddings
+from store.sqlite import BulkWriter, backfill_xref, connect_db, get_meta, init_db, load_document_states, record_index_run, set_meta
+from symbols import analyze_chunks
 
 
 def sha256_text(s: str) -> str:
@@ -23,17 +32,159 @@ def sha256_file(path: Path) -> str:
     return h.hexdigest()
 
 
-def safe_read_text(path: Path, max_bytes: int = 20_000_000) -> str:
-    st = path.stat()
-    if st.st_size > max_bytes:
-        raise ValueError(f"File too large for MVP ({st.st_size} bytes): {path}")
-    data = path.read_bytes()
-    for enc in ("utf-8", "cp1252", "latin1"):
+# Au-delà, un fichier n'est pas chargé en mémoire : l'écrivain le lit en flux (TextStream)
+STREAM_BYTES = 20_000_000
+# Préfixe lu pour choisir l'encodage et détecter le type d'un fichier lu en flux
+SNIFF_BYTES = 64 * 1024
+# En dessous, un seul read() coûte moins que la mise en place d'un mmap
+MMAP_MIN_BYTES = 256 * 1024
+ENCODINGS = ("utf-8", "cp1252", "latin1")
+# Version du découpage enregistrée par racine (index_meta "chunk_lines:<racine>") :
+# 1 = texte des chunks aligné sur start_line (lignes xref exactes). Une racine
+# indexée avant est re-découpée en entier une fois.
+CHUNK_LINES = "1"
+# Fins de ligne de str.splitlines()
+_EOL = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+def decode_bytes(data) -> str:
+    """Premier encodage de ENCODINGS qui décode data (bytes, mmap ou memoryview)."""
+    for enc in ENCODINGS:
+        try:
+            return str(data, enc)
+        except UnicodeDecodeError:
+            continue
+    return str(data, "latin1", errors="replace")
+
+
+def head_lines(text: str, n: int = 120) -> str:
+    """Les n premières lignes de text (comme splitlines()[:n]) sans découper tout le texte."""
+    pos = -1
+    for _ in range(n):
+        pos = text.find("\n", pos + 1)
+        if pos < 0:
+            break
+    head = text if pos < 0 else text[:pos + 1]
+    return "\n".join(head.splitlines()[:n])
+
+
+class SourceFile:
+    """Fichier lu une seule fois : état (fstat), sha256 et texte décodé viennent des
+    mêmes octets (mmap au-delà de MMAP_MIN_BYTES, un read() en dessous).
+
+    Le texte n'est décodé qu'à la demande (text()), après comparaison du hash :
+    un fichier au contenu inchangé n'est jamais décodé.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = STREAM_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stat: Optional[FileStat] = None
+        self.sha256 = ""
+        self._f = None
+        self._data = None
+        self._text: Optional[str] = None
+
+    def __enter__(self) -> "SourceFile":
+        self._f = self.path.open("rb")
+        try:
+            st = os.fstat(self._f.fileno())
+            if st.st_size > self.max_bytes:
+                raise ValueError(f"File too large to load ({st.st_size} bytes), use TextStream: {self.path}")
+            self.stat = FileStat(size=st.st_size, mtime_ns=st.st_mtime_ns, inode=st.st_ino)
+            if st.st_size >= MMAP_MIN_BYTES:
+                self._data = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = self._f.read()
+            self.sha256 = hashlib.sha256(self._data).hexdigest()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+        self._f.close()
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = decode_bytes(self._data)
+        return self._text
+
+    def preview(self) -> str:
+        return head_lines(self.text())
+
+
+def safe_read_text(path: Path, max_bytes: int = STREAM_BYTES) -> str:
+    with SourceFile(path, max_bytes) as f:
+        return f.text()
+
+
+def sniff_encoding(prefix: bytes) -> str:
+    """Premier encodage de ENCODINGS qui décode prefix (caractère multi-octets coupé en fin toléré)."""
+    for enc in ENCODINGS[:-1]:
         try:
-            return data.decode(enc)
+            codecs.getincrementaldecoder(enc)().decode(prefix, False)
+            return enc
         except UnicodeDecodeError:
             continue
-    return data.decode("latin1", errors="replace")
+    return ENCODINGS[-1]
+
+
+class TextStream:
+    """Lecture en flux d'un fichier : blocs mmap, sha256 et décodage incrémental en un
+    seul passage, mémoire bornée quelle que soit la taille.
+
+    lines() rend les mêmes lignes que str.splitlines() sur le texte décodé ; une
+    erreur de décodage (UnicodeDecodeError) peut survenir en cours de flux, l'appelant
+    reprend alors avec l'encodage suivant de ENCODINGS. sha256 est disponible
+    (digest()) une fois lines() épuisé.
+    """
+
+    def __init__(self, path: Path, encoding: str, block_size: int = 1 << 20):
+        self.path = path
+        self.encoding = encoding
+        self.block_size = block_size
+        self.sha256: Optional[str] = None
+        self._f = None
+        self._mm: Optional[mmap.mmap] = None
+
+    def __enter__(self) -> "TextStream":
+        self._f = self.path.open("rb")
+        if os.fstat(self._f.fileno()).st_size:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._f.close()
+
+    def lines(self) -> Iterator[str]:
+        hasher = hashlib.sha256()
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        carry = ""
+        mm = self._mm
+        for off in range(0, len(mm) if mm is not None else 0, self.block_size):
+            blk = mm[off:off + self.block_size]
+            hasher.update(blk)
+            text = carry + decoder.decode(blk)
+            parts = text.splitlines()
+            carry = ""
+            if text and text[-1] not in _EOL:
+                carry = parts.pop()  # ligne incomplète
+            elif text.endswith("\r"):
+                carry = parts.pop() + "\r"  # \r\n peut-être coupé entre deux blocs
+            yield from parts
+        yield from (carry + decoder.decode(b"", True)).splitlines()
+        self.sha256 = hasher.hexdigest()
+
+    def digest(self) -> str:
+        if self.sha256 is None:
+            raise RuntimeError("TextStream.digest() avant la fin de lines()")
+        return self.sha256
 
 
 def normalize_rel_folder(root: Path, p: Path) -> str:
@@ -45,7 +196,8 @@ def normalize_rel_folder(root: Path, p: Path) -> str:
         return ""
 
 
-def detect_doc_type(p: Path, text_preview: str = "") -> str:
+def detect_doc_type(p: Path, text_preview: Union[str, Callable[[], str]] = "") -> str:
+    """Type d'après l'extension, sinon d'après l'aperçu (callable : calculé seulement s'il sert)."""
     ext = p.suffix.lower()
     if ext in (".com", ".dcl"):
         return "dcl"
@@ -53,6 +205,8 @@ def detect_doc_type(p: Path, text_preview: str = "") -> str:
         return "c"
     if ext in (".sql", ".sqlmod", ".sc", ".ddl"):
         return "sqlmod"
+    if callable(text_preview):
+        text_preview = text_preview()
     if text_preview:
         lines = text_preview.splitlines()[:80]
         if lines:
@@ -62,64 +216,399 @@ def detect_doc_type(p: Path, text_preview: str = "") -> str:
     return "text"
 
 
+DEFAULT_EXTS = {
+    ".com", ".dcl", ".c", ".h", ".sql", ".sqlmod", ".sc", ".ddl",
+    ".txt", ".md", ".rst", ".log", ".ini", ".cfg", ".conf",
+    ".json", ".yaml", ".yml", ".csv"
+}
+
+
+def resolve_exts(include_exts: Optional[List[str]] = None) -> set:
+    return set(e.lower() for e in (include_exts or [])) or DEFAULT_EXTS
+
+
 def iter_source_files(root: Path, include_exts: Optional[List[str]] = None) -> Iterable[Path]:
-    default_exts = {
-        ".com", ".dcl", ".c", ".h", ".sql", ".sqlmod", ".sc", ".ddl",
-        ".txt", ".md", ".rst", ".log", ".ini", ".cfg", ".conf",
-        ".json", ".yaml", ".yml", ".csv"
-    }
-    exts = set(e.lower() for e in (include_exts or [])) or default_exts
+    exts = resolve_exts(include_exts)
     for p in root.rglob("*"):
         if p.is_file() and p.suffix.lower() in exts:
             yield p
 
 
-def index_root(db_path: str, root: str, include_exts: Optional[List[str]] = None, verbose: bool = True) -> None:
+_REGISTRY: Optional[ChunkerRegistry] = None
+
+# Tâche de préparation :
+#   (racine, chemin, doc_id, sha256 connu, état fichier, candidats au renommage)
+# candidats : {sha256: (doc_id disparu, doc_type)} de même taille et extension
+RenameCandidates = Optional[Dict[str, Tuple[str, str]]]
+Task = Tuple[Path, Path, str, Optional[str], FileStat, RenameCandidates]
+
+# Résultat de préparation d'un fichier : (statut, chemin, payload)
+#   "updated"   -> (Document sans texte, mtime, sha256, chunks, xrefs)
+#   "renamed"   -> (Document avec texte (sans au-delà de STREAM_BYTES), mtime, sha256, doc_id disparu)
+#   "stream"    -> (Document sans texte, mtime, encodage présumé) : fichier de
+#                  plus de STREAM_BYTES, haché et découpé par l'écrivain (TextStream)
+#   "unchanged" -> sha256
+#   "error"     -> message
+Prepared = Tuple[str, Path, object]
+
+
+def _registry() -> ChunkerRegistry:
+    # Un registre par processus (les workers du pool le construisent à la demande)
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = default_registry()
+    return _REGISTRY
+
+
+def file_stat(p: Path) -> FileStat:
+    st = p.stat()
+    return FileStat(size=st.st_size, mtime_ns=st.st_mtime_ns, inode=st.st_ino)
+
+
+def prepare_file(
+    rootp: Path,
+    p: Path,
+    doc_id: str,
+    stored_hash: Optional[str],
+    stat: FileStat,
+    rename_from: RenameCandidates = None,
+) -> Prepared:
+    """Hash + lecture + détection de type + chunking + extraction des symboles
+    (symbols.analyze_chunks) d'un fichier (sans accès DB).
+
+    Exécutable dans un processus worker : ne touche pas à SQLite et renvoie
+    un tuple picklable que le processus écrivain applique ensuite. Si le
+    contenu correspond à un document disparu (rename_from), le chunking est
+    évité : l'écrivain rattachera les chunks existants. Au-delà de
+    STREAM_BYTES, seul un préfixe est lu (encodage, type) : le hash et le
+    chunking se font en flux dans l'écrivain (statut "stream").
+    """
+    try:
+        mtime = stat.mtime_ns // 1_000_000_000
+        doc = Document(
+            doc_id=doc_id,
+            path=str(p),
+            rel_folder=normalize_rel_folder(rootp, p),
+            doc_type="",
+            text="",
+            meta={"source_root": str(rootp), "filename": p.name},
+        )
+        if stat.size > STREAM_BYTES:
+            with p.open("rb") as f:
+                prefix = f.read(SNIFF_BYTES)
+            encoding = sniff_encoding(prefix)
+            preview = "\n".join(prefix.decode(encoding, errors="replace").splitlines()[:120])
+            doc = dataclasses.replace(doc, doc_type=detect_doc_type(p, preview))
+            if stored_hash is not None or rename_from:
+                # Déjà indexé ou candidat au renommage : un hash seul évite de
+                # découper tout le fichier pour annuler l'écriture ensuite
+                file_hash = sha256_file(p)
+                if stored_hash == file_hash:
+                    return ("unchanged", p, file_hash)
+                old = (rename_from or {}).get(file_hash)
+                if old is not None and old[1] == doc.doc_type:
+                    return ("renamed", p, (doc, mtime, file_hash, old[0]))
+            return ("stream", p, (doc, mtime, encoding))
+
+        # Un seul passage : hash, puis décodage et aperçu si le contenu a changé
+        with SourceFile(p, STREAM_BYTES) as src:
+            file_hash = src.sha256
+            if stored_hash == file_hash:
+                return ("unchanged", p, file_hash)
+            doc = dataclasses.replace(doc, doc_type=detect_doc_type(p, src.preview), text=src.text())
+        old = (rename_from or {}).get(file_hash)
+        if old is not None and old[1] == doc.doc_type:
+            return ("renamed", p, (doc, mtime, file_hash, old[0]))
+        chunks = _registry().resolve(doc.doc_type).chunk(doc)
+        xrefs = analyze_chunks(doc.doc_type, chunks)
+        # Le texte n'est plus utile à l'écrivain : inutile de le renvoyer via IPC
+        return ("updated", p, (dataclasses.replace(doc, text=""), mtime, file_hash, chunks, xrefs))
+    except Exception as e:
+        return ("error", p, str(e))
+
+
+def write_streamed(
+    writer: BulkWriter,
+    p: Path,
+    doc: Document,
+    mtime: int,
+    encoding: Optional[str],
+    stat: FileStat,
+    stored_hash: Optional[str],
+    rename_from: RenameCandidates,
+    missing: Dict,
+) -> Tuple[str, bool]:
+    """Écrit un fichier "stream" : lecture mmap, sha256, décodage et chunking en un
+    passage, chunks insérés par lots (mémoire bornée). Renvoie (sha256, écrit) ;
+    non écrit si le contenu est inchangé ou celui d'un document disparu.
+
+    Les chunkers sans découpage en flux (DCL, C) sont remplacés par celui du
+    texte brut. Une erreur de décodage en cours de flux annule l'écriture et la
+    reprend avec l'encodage suivant de ENCODINGS (latin1 décode tout) ;
+    encoding None : déduit du début du fichier.
+    """
+    if encoding is None:
+        with p.open("rb") as f:
+            encoding = sniff_encoding(f.read(SNIFF_BYTES))
+    chunker = _registry().resolve_stream(doc.doc_type)
+
+    def keep(file_hash: str) -> bool:
+        old = (rename_from or {}).get(file_hash)
+        renamed = old is not None and old[1] == doc.doc_type and old[0] in missing
+        return file_hash != stored_hash and not renamed
+
+    for enc in ENCODINGS[ENCODINGS.index(encoding):]:
+        try:
+            with TextStream(p, enc) as ts:
+                chunks = chunker.iter_chunks(ts.lines(), doc.doc_type, doc.path)
+                return writer.write_stream(doc, mtime, chunks, ts.digest, stat, keep)
+        except UnicodeDecodeError:
+            continue
+    raise AssertionError("latin1 decodes any byte sequence")
+
+
+def _prepare_task(task: Task) -> Prepared:
+    return prepare_file(*task)
+
+
+def _iter_prepared(tasks: Iterable[Task], workers: int) -> Iterator[Prepared]:
+    """Prépare les fichiers en série ou dans un pool de processus.
+
+    Les résultats sont rendus dans l'ordre des tâches (fenêtre bornée de
+    futures en attente) : l'écrivain applique donc exactement la même
+    séquence d'écritures qu'en série et la mémoire reste bornée.
+    """
+    if workers <= 1:
+        for t in tasks:
+            yield _prepare_task(t)
+        return
+
+    max_pending = workers * 4
+    ex = ProcessPoolExecutor(max_workers=workers)
+    pending: deque = deque()
+    try:
+        for t in tasks:
+            pending.append(ex.submit(_prepare_task, t))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
+def index_root(
+    db_path: str,
+    root: str,
+    include_exts: Optional[List[str]] = None,
+    verbose: bool = True,
+    workers: int = 1,
+    batch_docs: int = 200,
+    batch_bytes: int = 32_000_000,
+    bulk_load: bool = False,
+    rehash: bool = False,
+    fts_layout: Optional[str] = None,
+    embed: Optional[str] = None,
+    fts_tokenizer: Optional[str] = None,
+    trigram: Optional[bool] = None,
+) -> Dict:
+    """Indexe root dans db_path et renvoie le journal du passage.
+
+    Incrémental : l'état (size, mtime_ns, inode) de chaque fichier est comparé
+    à celui stocké dans documents (chargé en une requête) ; seuls les fichiers
+    différents sont hachés. rehash=True hache tous les fichiers. Racine
+    découpée avant CHUNK_LINES : tous ses fichiers sont re-découpés, une fois.
+    Réconciliation : les documents de la racine dont le fichier a disparu sont
+    purgés ; un nouveau fichier au contenu identique (sha256) à un document
+    disparu est traité comme un renommage et reprend ses chunks.
+    workers > 1 : hash/lecture/détection/chunking dans un pool de processus,
+    le processus courant reste l'unique écrivain SQLite (index identique au
+    mode série).
+    batch_docs/batch_bytes : taille des transactions (voir BulkWriter).
+    bulk_load : pragmas de chargement massif, pour une reconstruction complète.
+    fts_layout : disposition FTS d'une base neuve ("inline" ou "external").
+    fts_tokenizer / trigram : tokenizer FTS ("unicode61", "code") et index
+    trigramme d'une base neuve (voir init_db).
+    embed : embedder des chunks ("hash[:dim]", "ollama:<modèle>") ; une fois
+    enregistré dans index_meta, les passages suivants l'appliquent d'office.
+    """
     rootp = Path(root).resolve()
     if not rootp.exists():
         raise FileNotFoundError(root)
 
-    reg = default_registry()
     conn = connect_db(db_path)
-    init_db(conn)
+    init_db(conn, fts_layout=fts_layout, fts_tokenizer=fts_tokenizer, trigram=trigram)
+    if get_meta(conn, "xref") != "1":
+        n = backfill_xref(conn)
+        if verbose:
+            print(f"[index] xref : symboles extraits de {n} chunks existants")
 
-    total = updated = ignored = 0
+    started_at = time.time()
+    t0 = time.perf_counter()
 
+    # 1) Parcours + stat, comparés à l'état connu : aucune lecture de contenu
+    states = load_document_states(conn, str(rootp))
+    chunk_lines_key = f"chunk_lines:{rootp}"
+    rechunk = bool(states) and get_meta(conn, chunk_lines_key) != CHUNK_LINES
+    rehash = rehash or rechunk
+    exts = resolve_exts(include_exts)
+    seen = set()
+    found: List[Tuple[Path, str, FileStat]] = []
+    scanned = unchanged = ignored = 0
     for p in iter_source_files(rootp, include_exts=include_exts):
-        total += 1
+        scanned += 1
+        doc_id = sha256_text(str(p.resolve()))
+        seen.add(doc_id)
         try:
-            file_hash = sha256_file(p)
-            doc_id = sha256_text(str(p.resolve()))
-            if not should_reindex(conn, doc_id, file_hash):
-                continue
-
-            text = safe_read_text(p)
-            preview = "\n".join(text.splitlines()[:120])
-            doc_type = detect_doc_type(p, preview)
-            rel_folder = normalize_rel_folder(rootp, p)
-            mtime = int(p.stat().st_mtime)
-
-            doc = Document(
-                doc_id=doc_id,
-                path=str(p),
-                rel_folder=rel_folder,
-                doc_type=doc_type,
-                text=text,
-                meta={"source_root": str(rootp), "filename": p.name},
-            )
-
-            chunker = reg.resolve(doc.doc_type)
-            chunks = chunker.chunk(doc)
-
-            upsert_document(conn, doc, mtime, file_hash)
-            replace_chunks(conn, doc, chunks)
-            conn.commit()
-            updated += 1
-            if verbose and updated % 50 == 0:
-                print(f"[index] updated={updated} scanned={total}")
-        except Exception as e:
+            stat = file_stat(p)
+        except OSError as e:
             ignored += 1
             if verbose:
                 print(f"[index][skip] {p} -> {e}")
+            continue
+        row = states.get(doc_id)
+        if row is not None and not rehash and (row["size"], row["mtime_ns"], row["inode"]) == (stat.size, stat.mtime_ns, stat.inode):
+            unchanged += 1
+            continue
+        found.append((p, doc_id, stat))
+
+    # Documents disparus (limités aux extensions parcourues) : candidats au
+    # renommage pour les nouveaux fichiers de même taille et extension.
+    missing = {
+        doc_id: row for doc_id, row in states.items()
+        if doc_id not in seen and Path(row["path"]).suffix.lower() in exts
+    }
+    by_size: Dict[int, List] = {}
+    for row in missing.values():
+        if row["size"] is not None:
+            by_size.setdefault(int(row["size"]), []).append(row)
+
+    tasks: List[Task] = []
+    for p, doc_id, stat in found:
+        row = states.get(doc_id)
+        rename_from = None
+        if row is None and stat.size in by_size:
+            suffix = p.suffix.lower()
+            rename_from = {
+                r["sha256"]: (r["id"], r["doc_type"])
+                for r in by_size[stat.size]
+                if Path(r["path"]).suffix.lower() == suffix
+            } or None
+        # rechunk : pas de hash connu, le fichier est re-découpé même inchangé
+        stored_hash = row["sha256"] if row is not None and not rechunk else None
+        tasks.append((rootp, p, doc_id, stored_hash, stat, rename_from))
+    t_scan = time.perf_counter()
+
+    # 2) Préparation (hash/lecture/chunking) des seuls fichiers suspects + écriture
+    added = modified = renamed = deleted = 0
+    write_s = 0.0
+    with BulkWriter(conn, batch_docs=batch_docs, batch_bytes=batch_bytes, bulk_load=bulk_load) as writer:
+        for task, (status, p, payload) in zip(tasks, _iter_prepared(tasks, workers)):
+            doc_id, stat = task[2], task[4]
+            try:
+                if status == "error":
+                    raise RuntimeError(payload)
+                tw = time.perf_counter()
+                if status == "unchanged":
+                    # contenu identique : seul l'état fichier est rafraîchi
+                    row = states.get(doc_id)
+                    if row is None or (row["size"], row["mtime_ns"], row["inode"]) != (stat.size, stat.mtime_ns, stat.inode):
+                        writer.touch(doc_id, stat)
+                    unchanged += 1
+                elif status == "stream":
+                    doc, mtime, encoding = payload  # type: ignore[misc]
+                    file_hash, written = write_streamed(writer, p, doc, mtime, encoding, stat, task[3], task[5], missing)
+                    if written:
+                        if doc_id in states:
+                            modified += 1
+                        else:
+                            added += 1
+                    elif file_hash == task[3]:
+                        writer.touch(doc_id, stat)
+                        unchanged += 1
+                    else:
+                        old_doc_id = task[5][file_hash][0]  # type: ignore[index]
+                        writer.relink(old_doc_id, doc, mtime, file_hash, stat)
+                        del missing[old_doc_id]
+                        renamed += 1
+                elif status == "renamed" and payload[3] in missing:  # type: ignore[index]
+                    doc, mtime, file_hash, old_doc_id = payload  # type: ignore[misc]
+                    writer.relink(old_doc_id, dataclasses.replace(doc, text=""), mtime, file_hash, stat)
+                    del missing[old_doc_id]
+                    renamed += 1
+                else:
+                    if status == "renamed" and stat.size > STREAM_BYTES:
+                        # idem, fichier lu en flux
+                        doc, mtime, _, _ = payload  # type: ignore[misc]
+                        write_streamed(writer, p, doc, mtime, None, stat, None, None, missing)
+                        chunks = None
+                    elif status == "renamed":
+                        # document disparu déjà rattaché à une autre copie : chunking ici
+                        doc, mtime, file_hash, _ = payload  # type: ignore[misc]
+                        chunks = _registry().resolve(doc.doc_type).chunk(doc)
+                        doc = dataclasses.replace(doc, text="")
+                        xrefs = None
+                    else:
+                        doc, mtime, file_hash, chunks, xrefs = payload  # type: ignore[misc]
+                    if chunks is not None:
+                        writer.write(doc, mtime, file_hash, chunks, stat, xrefs)
+                    if doc_id in states:
+                        modified += 1
+                    else:
+                        added += 1
+                    if verbose and (added + modified) % 50 == 0:
+                        print(f"[index] updated={added + modified} pending={len(tasks)} scanned={scanned}")
+                write_s += time.perf_counter() - tw
+            except Exception as e:
+                ignored += 1
+                if verbose:
+                    print(f"[index][skip] {p} -> {e}")
+
+        # 3) Purge des documents disparus (cascade chunks_fts -> chunks -> documents)
+        tw = time.perf_counter()
+        deleted = writer.delete(sorted(missing))
+        write_s += time.perf_counter() - tw
+    if get_meta(conn, chunk_lines_key) != CHUNK_LINES:
+        set_meta(conn, chunk_lines_key, CHUNK_LINES)
+        conn.commit()
+
+    # 4) Embeddings des chunks nouveaux/réindexés, si l'index en a (ou --embed)
+    t_embed = time.perf_counter()
+    embedded = 0
+    embedder = prepare_embeddings(conn, embed)
+    if embedder:
+        embedded = embed_missing(conn, embedder, verbose=verbose)
+    t_end = time.perf_counter()
+
+    journal = {
+        "source_root": str(rootp),
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "scanned": scanned,
+        "added": added,
+        "modified": modified,
+        "deleted": deleted,
+        "renamed": renamed,
+        "unchanged": unchanged,
+        "ignored": ignored,
+        "timings": {
+            "scan_s": round(t_scan - t0, 4),
+            "prepare_s": round(t_embed - t_scan - write_s, 4),
+            "write_s": round(write_s, 4),
+            "total_s": round(t_end - t0, 4),
+            "hashed": len(tasks),
+            "embed_s": round(t_end - t_embed, 4),
+            "embedded": embedded,
+        },
+    }
+    record_index_run(conn, journal)
+    conn.close()
     if verbose:
-        print(f"[index] done. scanned={total} updated={updated} ignored={ignored} db={db_path}")
+        tm = journal["timings"]
+        print(
+            f"[index] done. scanned={scanned} added={added} modified={modified} deleted={deleted} renamed={renamed} "
+            f"unchanged={unchanged} ignored={ignored} hashed={tm['hashed']} "
+            f"(scan {tm['scan_s']:.2f}s, prepare {tm['prepare_s']:.2f}s, write {tm['write_s']:.2f}s) db={db_path}"
+            + (f" embedded={embedded} ({tm['embed_s']:.2f}s)" if embedder else "")
+        )
+    return journal
@@ -1,16 +1,342 @@
 from __future__ import annotations
 
+import http.client
 import json
 import os
+import random
 import socket
-import urllib.request
-from typing import Optional
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# Réponses Ollama qui valent une nouvelle tentative (surcharge, redémarrage)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Clients gardés en mémoire (base_url vient aussi des requêtes /answer : LRU borné)
+MAX_CLIENTS = 8
 
 
 class LlmError(RuntimeError):
     pass
 
 
+def resolve_model(model: Optional[str] = None) -> str:
+    return model or os.getenv("RAGLITE_OLLAMA_MODEL", "llama3.1")
+
+
+def resolve_base_url(base_url: Optional[str] = None) -> str:
+    return (base_url or os.getenv("RAGLITE_OLLAMA_URL", "http://localhost:11434")).rstrip("/")
+
+
+def _http_error(status: int, model: str, detail: bytes) -> str:
+    if status == 404:
+        error_msg = f"Modèle Ollama '{model}' non trouvé (404).\n"
+        error_msg += f"Vérifiez que le modèle existe avec: ollama list\n"
+        error_msg += f"Ou téléchargez-le avec: ollama pull {model}\n"
+        error_msg += f"Astuce: Utilisez --mode context pour éviter l'appel LLM"
+        return error_msg
+    return f"Erreur HTTP {status} depuis Ollama: {detail.decode('utf-8', errors='replace')[:200]}"
+
+
+def _unreachable(e: BaseException) -> str:
+    error_msg = f"Ollama unreachable or timed out: {e}"
+    if isinstance(e, ConnectionRefusedError):
+        error_msg += "\n\nAstuce: Utilisez --mode context pour éviter l'appel LLM, ou démarrez Ollama avec: ollama serve"
+    return error_msg
+
+
+def _parse_line(line: bytes) -> dict:
+    try:
+        obj = json.loads(line.decode("utf-8", errors="replace"))
+    except json.JSONDecodeError as e:
+        raise LlmError(f"Invalid JSON from Ollama: {e}") from e
+    if "error" in obj and obj["error"]:
+        raise LlmError(str(obj["error"]))
+    return obj
+
+
+class OllamaClient:
+    """Client Ollama thread-safe à connexions persistantes (http.client, keep-alive).
+
+    - au plus max_concurrency requêtes simultanées (les appelants suivants attendent) ;
+      les connexions libres sont réutilisées, une connexion fermée par le serveur
+      entre deux requêtes est rouverte sans pénalité ;
+    - erreurs de connexion et statuts RETRY_STATUSES : jusqu'à retries nouvelles
+      tentatives, backoff exponentiel avec jitter complet (pas de retry sur timeout) ;
+    - /api/embed par lots (embed), /api/generate en parallèle (generate_many) ;
+    - métriques par appel (latence, tentatives, tokens) : recent_calls(), stats().
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        max_concurrency: int = 4,
+        timeout_s: float = 120,
+        retries: int = 3,
+        backoff_s: float = 0.25,
+        max_backoff_s: float = 8.0,
+    ):
+        self.base_url = resolve_base_url(base_url)
+        parts = urlsplit(self.base_url)
+        self._conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._host, self._port, self._prefix = parts.hostname or "localhost", parts.port, parts.path
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._calls: deque = deque(maxlen=1024)
+        self._counters: Counter = Counter()
+
+    # --- connexions ---
+
+    def _checkout(self, timeout_s: float) -> http.client.HTTPConnection:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._conn_cls(self._host, self._port, timeout=timeout_s)
+        conn.timeout = timeout_s
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout_s)
+        return conn
+
+    def _release(self, conn: http.client.HTTPConnection, resp: Optional[http.client.HTTPResponse]) -> None:
+        # réponse non lue jusqu'au bout ou connexion non persistante : pas réutilisable
+        if resp is None or not resp.isclosed() or resp.will_close:
+            conn.close()
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _post(self, path: str, payload: Dict, timeout_s: float) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse, int]:
+        """POST JSON -> (connexion, réponse 200 à lire, tentatives). L'appelant tient un slot
+        et rend la connexion via _release."""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        attempt = 0
+        while True:
+            conn = self._checkout(timeout_s)
+            reused = conn.sock is not None
+            if not reused:
+                self._count("connections")
+            try:
+                conn.request("POST", self._prefix + path, body, headers)
+                resp = conn.getresponse()
+            except socket.timeout as e:
+                conn.close()
+                raise LlmError(_unreachable(e)) from e
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)):
+                    continue  # keep-alive expiré côté serveur
+                error: BaseException = e
+            else:
+                if resp.status == 200:
+                    return conn, resp, attempt + 1
+                detail = resp.read()
+                self._release(conn, resp)
+                if resp.status not in RETRY_STATUSES:
+                    raise LlmError(_http_error(resp.status, payload.get("model", ""), detail))
+                error = LlmError(_http_error(resp.status, payload.get("model", ""), detail))
+            attempt += 1
+            if attempt > self.retries:
+                raise LlmError(_unreachable(error) if isinstance(error, OSError) else str(error)) from error
+            self._count("retries")
+            time.sleep(random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt)))
+
+    def _call(self, path: str, payload: Dict, timeout_s: Optional[float]) -> Dict:
+        t0 = time.perf_counter()
+        with self._slots:
+            try:
+                conn, resp, attempts = self._post(path, payload, timeout_s or self.timeout_s)
+                try:
+                    body = resp.read()
+                except socket.timeout as e:
+                    raise LlmError(_unreachable(e)) from e
+                finally:
+                    self._release(conn, resp)
+            except LlmError:
+                self._count("errors")
+                raise
+        obj = _parse_line(body)
+        self._record(path, payload, obj, attempts, time.perf_counter() - t0)
+        return obj
+
+    # --- métriques ---
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _record(self, path: str, payload: Dict, obj: Dict, attempts: int, latency_s: float, first_token_s: Optional[float] = None) -> None:
+        metrics = {
+            "endpoint": path,
+            "model": payload.get("model"),
+            "latency_s": round(latency_s, 4),
+            "attempts": attempts,
+            "prompt_tokens": obj.get("prompt_eval_count", 0),
+            "output_tokens": obj.get("eval_count", 0),
+            "eval_s": round(obj.get("eval_duration", 0) / 1e9, 4),
+        }
+        if first_token_s is not None:
+            metrics["first_token_s"] = round(first_token_s, 4)
+        if isinstance(payload.get("input"), list):
+            metrics["inputs"] = len(payload["input"])
+        with self._lock:
+            self._calls.append(metrics)
+            self._counters["calls"] += 1
+            self._counters["prompt_tokens"] += metrics["prompt_tokens"]
+            self._counters["output_tokens"] += metrics["output_tokens"]
+
+    def recent_calls(self) -> List[Dict]:
+        """Métriques des derniers appels réussis (1024 au plus), du plus ancien au plus récent."""
+        with self._lock:
+            return list(self._calls)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = list(self._calls)
+            counters = dict(self._counters)
+            idle = len(self._idle)
+        latencies = sorted(c["latency_s"] for c in calls)
+        eval_s = sum(c["eval_s"] for c in calls)
+        out = {
+            "base_url": self.base_url,
+            "max_concurrency": self.max_concurrency,
+            "idle_connections": idle,
+            **{k: counters.get(k, 0) for k in ("calls", "errors", "retries", "connections", "prompt_tokens", "output_tokens")},
+        }
+        if latencies:
+            out["latency_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+            out["latency_p95_ms"] = round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000, 1)
+        if eval_s:
+            out["output_tokens_per_s"] = round(sum(c["output_tokens"] for c in calls) / eval_s, 1)
+        return out
+
+    # --- API ---
+
+    def generate(self, prompt: str, *, model: Optional[str] = None, timeout_s: Optional[float] = None) -> str:
+        obj = self._call("/api/generate", {"model": resolve_model(model), "prompt": prompt, "stream": False}, timeout_s)
+        return obj.get("response", "").strip()
+
+    def generate_many(self, prompts: Sequence[str], *, model: Optional[str] = None, timeout_s: Optional[float] = None) -> List[str]:
+        """Plusieurs /api/generate (l'API ne regroupe pas les prompts) en parallèle, dans l'ordre des prompts."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as ex:
+            return list(ex.map(lambda p: self.generate(p, model=model, timeout_s=timeout_s), prompts))
+
+    def generate_stream(self, prompt: str, *, model: Optional[str] = None, timeout_s: Optional[float] = None) -> Iterator[str]:
+        """/api/generate en stream=true : fragments de texte au fil de l'eau.
+
+        La réponse est du NDJSON (un objet par ligne, le dernier avec done=true) ;
+        chaque ligne est décodée dès réception. timeout_s borne l'attente entre
+        deux lignes, pas la génération complète. Le slot et la connexion sont
+        tenus jusqu'à la fin (ou l'abandon) du générateur.
+        """
+        payload = {"model": resolve_model(model), "prompt": prompt, "stream": True}
+        t0 = time.perf_counter()
+        first_token_s = None
+        last: Dict = {}
+        with self._slots:
+            try:
+                conn, resp, attempts = self._post("/api/generate", payload, timeout_s or self.timeout_s)
+            except LlmError:
+                self._count("errors")
+                raise
+            try:
+                while True:
+                    try:
+                        line = resp.readline()
+                    except socket.timeout as e:
+                        self._count("errors")
+                        raise LlmError(f"Ollama timed out while streaming: {e}") from e
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                    last = _parse_line(line)
+                    text = last.get("response", "")
+                    if text:
+                        if first_token_s is None:
+                            first_token_s = time.perf_counter() - t0
+                        yield text
+                    if last.get("done"):
+                        resp.read()  # fin du corps (chunk terminal) : connexion réutilisable
+                        break
+            finally:
+                self._release(conn, resp)
+        self._record("/api/generate", payload, last, attempts, time.perf_counter() - t0, first_token_s)
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        *,
+        model: str,
+        batch_size: int = 32,
+        timeout_s: Optional[float] = None,
+    ) -> List[List[float]]:
+        """Embeddings via /api/embed : lots de batch_size entrées, envoyés en parallèle."""
+        batches = [list(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+
+        def one(batch: List[str]) -> List[List[float]]:
+            vecs = self._call("/api/embed", {"model": model, "input": batch}, timeout_s).get("embeddings") or []
+            if len(vecs) != len(batch):
+                raise LlmError(f"Ollama returned {len(vecs)} embeddings for {len(batch)} inputs")
+            return vecs
+
+        if len(batches) <= 1:
+            return one(batches[0]) if batches else []
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as ex:
+            return [vec for vecs in ex.map(one, batches) for vec in vecs]
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_clients: "OrderedDict[str, OllamaClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url: Optional[str] = None) -> OllamaClient:
+    """Client partagé par base_url (concurrence : env RAGLITE_OLLAMA_CONCURRENCY, défaut 4).
+
+    Au plus MAX_CLIENTS clients : le moins récemment utilisé est évincé et ses
+    connexions au repos fermées (celles en cours se ferment à leur libération).
+    """
+    key = resolve_base_url(base_url)
+    evicted: List[OllamaClient] = []
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = OllamaClient(key, max_concurrency=int(os.getenv("RAGLITE_OLLAMA_CONCURRENCY", "4")))
+            while len(_clients) > MAX_CLIENTS:
+                evicted.append(_clients.popitem(last=False)[1])
+        else:
+            _clients.move_to_end(key)
+    for old in evicted:
+        old.close()
+    return client
+
+
+def client_stats() -> List[Dict]:
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [c.stats() for c in clients]
+
+
 def ollama_generate(
     prompt: str,
     *,
@@ -18,38 +344,16 @@ def ollama_generate(
     base_url: Optional[str] = None,
     timeout_s: int = 120,
 ) -> str:
-    """Appel minimal à Ollama /api/generate (stream=false), via urllib (stdlib only)."""
-    model = model or os.getenv("RAGLITE_OLLAMA_MODEL", "llama3.1")
-    base_url = base_url or os.getenv("RAGLITE_OLLAMA_URL", "http://localhost:11434")
-    url = base_url.rstrip("/") + "/api/generate"
-
-    payload = {"model": model, "prompt": prompt, "stream": False}
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
-    try:
-        with urllib.request.urlopen(req, timeout=timeout_s) as resp:
-            body = resp.read()
-    except urllib.error.HTTPError as e:
-        if e.code == 404:
-            error_msg = f"Modèle Ollama '{model}' non trouvé (404).\n"
-            error_msg += f"Vérifiez que le modèle existe avec: ollama list\n"
-            error_msg += f"Ou téléchargez-le avec: ollama pull {model}\n"
-            error_msg += f"Astuce: Utilisez --mode context pour éviter l'appel LLM"
-        else:
-            error_msg = f"Erreur HTTP {e.code} depuis Ollama: {e}"
-        raise LlmError(error_msg) from e
-    except (urllib.error.URLError, socket.timeout) as e:
-        error_msg = f"Ollama unreachable or timed out: {e}"
-        if isinstance(e, urllib.error.URLError) and "Connection refused" in str(e):
-            error_msg += "\n\nAstuce: Utilisez --mode context pour éviter l'appel LLM, ou démarrez Ollama avec: ollama serve"
-        raise LlmError(error_msg) from e
+    """Appel à Ollama /api/generate (stream=false) via le client partagé (stdlib only)."""
+    return get_client(base_url).generate(prompt, model=model, timeout_s=timeout_s)
 
-    try:
-        obj = json.loads(body.decode("utf-8", errors="replace"))
-    except json.JSONDecodeError as e:
-        raise LlmError(f"Invalid JSON from Ollama: {e}") from e
 
-    if "error" in obj and obj["error"]:
-        raise LlmError(str(obj["error"]))
-
-    return obj.get("response", "").strip()
+def ollama_generate_stream(
+    prompt: str,
+    *,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout_s: int = 120,
+) -> Iterator[str]:
+    """Ollama /api/generate en stream=true via le client partagé (voir OllamaClient.generate_stream)."""
+    return get_client(base_url).generate_stream(prompt, model=model, timeout_s=timeout_s)
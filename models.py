@@ -22,3 +22,10 @@ class Chunk:
     text: str
     kind: str
     meta: Dict[str, str]
+
+
+@dataclass(frozen=True)
+class FileStat:
+    size: int
+    mtime_ns: int
+    inode: int
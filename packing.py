@@ -0,0 +1,204 @@
+"""Assemblage du contexte envoyé au LLM sous un budget de tokens (rag.build_context).
+
+1. fusion : les hits d'un même fichier dont les plages de lignes se touchent ou
+   se chevauchent deviennent un seul extrait (un seul en-tête, lignes communes
+   envoyées une fois) ;
+2. réduction : un extrait de plus de TRIM_MIN_TOKENS est limité aux lignes
+   qui contiennent un terme de la question (store.fts_query.query_terms), à
+   ±TRIM_RADIUS lignes près (envoyé entier si aucune ligne ne matche, ex. hit
+   de la voie vectorielle) ;
+3. sac à dos : si les extraits dépassent le budget, choix de ceux qui
+   maximisent la pertinence (somme des poids de rang des hits couverts), au
+   lieu de s'arrêter au premier extrait qui ne rentre pas.
+
+Fusion et réduction supposent que la ligne i du texte d'un chunk est la ligne
+start_line + i de la source (chunkers.base.strip_blank_edges). Un chunk d'un
+index pas encore re-découpé (indexing.CHUNK_LINES) peut avoir moins de lignes
+de texte que sa plage : il est alors envoyé entier, seul, avec sa plage stockée.
+
+Les tokens sont estimés (estimate_tokens) : pas de tokenizer du modèle ici.
+"""
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from store.fts_query import query_terms
+
+# Budget par défaut : l'ancienne limite de 18 000 caractères, à ~3 caractères par
+# token de code DCL/C
+CONTEXT_TOKENS = 6000
+# Taille au-delà de laquelle un extrait est réduit aux lignes qui matchent
+TRIM_MIN_TOKENS = 400
+# Lignes gardées autour de chaque ligne qui contient un terme de la question
+TRIM_RADIUS = 4
+# Poids du hit de rang r (0 = meilleur) : 1 / (RANK_K + r)
+RANK_K = 5
+# Granularité du sac à dos, en tokens
+GRAIN = 8
+SEPARATOR = "\n\n"
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_PUNCT_RE = re.compile(r"[^\w\s]|_")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens d'un tokenizer BPE sur du code : un token par
+    mot (plus un par tranche de 6 caractères au-delà), un par signe de ponctuation."""
+    n = sum(1 + (len(w) - 1) // 6 for w in _WORD_RE.findall(text))
+    return n + len(_PUNCT_RE.findall(text))
+
+
+@dataclass
+class Block:
+    """Lignes consécutives d'un fichier couvertes par un ou plusieurs hits
+    (start_line, end_line : plage stockée des chunks)."""
+
+    path: str
+    doc_type: str
+    start_line: int
+    end_line: int
+    lines: List[str]
+    value: float
+    best: int  # meilleur rang parmi les hits couverts
+    chunk_ids: List[int] = field(default_factory=list)
+
+    @property
+    def aligned(self) -> bool:
+        """lines[i] est la ligne start_line + i de la source."""
+        return len(self.lines) == self.end_line - self.start_line + 1
+
+
+@dataclass(frozen=True)
+class Piece:
+    """Extrait prêt à envoyer : texte, plages de lignes, tokens estimés, pertinence."""
+
+    block: int
+    spans: Tuple[Tuple[int, int], ...]  # indices dans block.lines
+    ranges: Tuple[Tuple[int, int], ...]
+    text: str
+    tokens: int
+    value: float
+
+
+def merge_hits(hits: Sequence[Dict]) -> List[Block]:
+    """Regroupe les hits (hydratés, dans l'ordre du classement) par fichier et plages
+    contiguës. Seuls les hits alignés (autant de lignes de texte que de lignes dans
+    la plage) sont fusionnés : les autres restent des extraits à part."""
+    by_path: Dict[str, List[Tuple[int, Dict]]] = {}
+    for rank, h in enumerate(hits):
+        by_path.setdefault(h["path"], []).append((rank, h))
+    blocks: List[Block] = []
+    for items in by_path.values():
+        items.sort(key=lambda it: (int(it[1]["start_line"]), it[0]))
+        cur: Optional[Block] = None
+        for rank, h in items:
+            start, end = int(h["start_line"]), int(h["end_line"])
+            lines = h["text"].split("\n")
+            weight = 1.0 / (RANK_K + rank)
+            if cur is not None and cur.aligned and len(lines) == end - start + 1 and start <= cur.end_line + 1:
+                cur.lines += lines[cur.end_line + 1 - start:]
+                cur.end_line = max(cur.end_line, end)
+                cur.value += weight
+                cur.best = min(cur.best, rank)
+                cur.chunk_ids.append(int(h["chunk_id"]))
+                continue
+            cur = Block(h["path"], h["doc_type"], start, end, lines, weight, rank, [int(h["chunk_id"])])
+            blocks.append(cur)
+    blocks.sort(key=lambda b: b.best)
+    return blocks
+
+
+def _windows(block: Block, terms: List[str], radius: int) -> List[Tuple[int, int]]:
+    """Plages [début, fin] (indices dans block.lines) autour des lignes qui matchent."""
+    out: List[Tuple[int, int]] = []
+    for i, ln in enumerate(block.lines):
+        low = ln.lower()
+        if not any(t in low for t in terms):
+            continue
+        lo, hi = max(0, i - radius), min(len(block.lines) - 1, i + radius)
+        if out and lo <= out[-1][1] + 1:
+            out[-1] = (out[-1][0], hi)
+        else:
+            out.append((lo, hi))
+    return out
+
+
+def _render(n: int, block: Block, spans: Sequence[Tuple[int, int]]) -> Tuple[str, Tuple[Tuple[int, int], ...]]:
+    if block.aligned:
+        ranges = tuple((block.start_line + lo, block.start_line + hi) for lo, hi in spans)
+    else:
+        # lignes non rapportables à la source : bloc entier, plage stockée
+        ranges = ((block.start_line, block.end_line),)
+    header = f"[{n}] {block.path} ({block.doc_type}) lines " + ", ".join(f"{a}-{b}" for a, b in ranges)
+    body = "\n...\n".join("\n".join(block.lines[lo:hi + 1]) for lo, hi in spans)
+    return header + "\n" + body, ranges
+
+
+def pieces(blocks: Sequence[Block], question: str) -> List[Piece]:
+    """Extrait à envoyer pour chaque bloc : entier, ou réduit s'il est gros, aligné et
+    que des lignes matchent. Numérotation provisoire : le texte définitif est rendu par pack()."""
+    terms = [t.lower() for t in query_terms(question)]
+    out: List[Piece] = []
+    for i, b in enumerate(blocks):
+        spans = [(0, len(b.lines) - 1)]
+        text, ranges = _render(0, b, spans)
+        tokens = estimate_tokens(text)
+        if tokens > TRIM_MIN_TOKENS and terms and b.aligned:
+            windows = _windows(b, terms, TRIM_RADIUS)
+            if windows and sum(hi - lo + 1 for lo, hi in windows) < len(b.lines):
+                spans = windows
+                text, ranges = _render(0, b, spans)
+                tokens = estimate_tokens(text)
+        # +1 : séparateur entre extraits
+        out.append(Piece(i, tuple(spans), ranges, text, tokens + 1, b.value))
+    return out
+
+
+def _knapsack(items: List[Piece], budget: int) -> List[Piece]:
+    """Sac à dos 0/1, poids en tranches de GRAIN tokens (arrondies au-dessus : le
+    budget est respecté). À valeur égale, le moins de tokens."""
+    cap = budget // GRAIN
+    best = [0.0] * (cap + 1)
+    taken: List[List[bool]] = []
+    for piece in items:
+        wt = math.ceil(piece.tokens / GRAIN)
+        take = [False] * (cap + 1)
+        for w in range(cap, wt - 1, -1):
+            cand = best[w - wt] + piece.value
+            if cand > best[w] + 1e-12:
+                best[w] = cand
+                take[w] = True
+        taken.append(take)
+    w = min(range(cap + 1), key=lambda c: (-round(best[c], 12), c))
+    chosen: List[Piece] = []
+    for i in range(len(items) - 1, -1, -1):
+        if taken[i][w]:
+            chosen.append(items[i])
+            w -= math.ceil(items[i].tokens / GRAIN)
+    return chosen
+
+
+def pack(
+    hits: Sequence[Dict], question: str, max_tokens: int = CONTEXT_TOKENS
+) -> Tuple[str, List[Tuple[Block, Tuple[Tuple[int, int], ...]]], int]:
+    """(contexte, [(extrait, plages de lignes envoyées)] dans l'ordre [n], tokens estimés).
+
+    Extraits rendus dans l'ordre de leur meilleur hit et numérotés [1], [2]…
+    """
+    blocks = merge_hits(hits)
+    chosen = pieces(blocks, question)
+    if sum(p.tokens for p in chosen) > max_tokens:
+        chosen = _knapsack(chosen, max_tokens)
+    chosen.sort(key=lambda p: blocks[p.block].best)
+    parts: List[str] = []
+    packed = []
+    for n, piece in enumerate(chosen, start=1):
+        block = blocks[piece.block]
+        text, ranges = _render(n, block, piece.spans)
+        parts.append(text)
+        packed.append((block, ranges))
+    context = SEPARATOR.join(parts)
+    return context, packed, estimate_tokens(context)
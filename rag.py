@@ -1,11 +1,20 @@
 from __future__ import annotations
 
-import re
+import hashlib
+import json
+import os
+import sqlite3
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-from store.sqlite import connect_db, init_db, search_fts, get_chunk
-from llm import ollama_generate
+from cache import cached_query, query_key
+from store.sqlite import answer_cache_get, answer_cache_put, chunk_features, chunk_fingerprints, connect_db, ensure_schema, search_fts, drop_text
+from symbols import extract_features
+from packing import CONTEXT_TOKENS, Block, pack
+
+# llm (http.client) n'est importé que par les fonctions qui appellent le modèle :
+# les modes rules et context, la recherche et le lot s'en passent au démarrage
 
 
 @dataclass(frozen=True)
@@ -16,58 +25,65 @@ class Citation:
     doc_type: str
 
 
-def build_context(
-    db_path: str,
+def _retrieve_context(
+    conn: sqlite3.Connection,
     question: str,
     *,
-    top_k: int = 8,
-    doc_type: Optional[str] = None,
-    scope: Optional[str] = None,
-    max_context_chars: int = 18_000,
-) -> Tuple[str, List[Dict], List[Citation]]:
-    """Retourne context string + hits + citations (ordre des chunks)."""
-    conn = connect_db(db_path)
-    init_db(conn)
-    hits = search_fts(conn, q=question, top_k=top_k, doc_type=doc_type, scope=scope)
-
-    pieces: List[str] = []
-    citations: List[Citation] = []
-    total = 0
-    for i, h in enumerate(hits, start=1):
-        ch = get_chunk(conn, int(h["chunk_id"]))
-        cite = Citation(
-            path=ch["path"],
-            start_line=int(ch["start_line"]),
-            end_line=int(ch["end_line"]),
-            doc_type=ch["doc_type"],
-        )
-        citations.append(cite)
-        header = f"[{i}] {cite.path} ({cite.doc_type}) lines {cite.start_line}-{cite.end_line}"
-        block = ch["text"]
-        piece = header + "\n" + block
-        if total + len(piece) > max_context_chars:
-            break
-        pieces.append(piece)
-        total += len(piece)
+    top_k: int,
+    doc_type: Optional[str],
+    scope: Optional[str],
+    max_context_tokens: int,
+    hybrid: bool = False,
+) -> Tuple[str, List[Dict], List[Citation], List[Block]]:
+    """Comme build_context, mais sur une connexion ouverte et avec des hits hydratés (texte
+    inclus) ; rend aussi les extraits du contexte, dans l'ordre [n].
 
-    context = "\n\n".join(pieces)
-    return context, hits, citations
+    Citation : plage stockée des chunks de l'extrait, jamais plus étroite que
+    celle d'un chunk (le contexte, lui, peut n'en envoyer qu'une partie)."""
+    hits = search_fts(conn, q=question, top_k=top_k, doc_type=doc_type, scope=scope, hydrate=True, hybrid=hybrid)
+    context, packed, _ = pack(hits, question, max_tokens=max_context_tokens)
+    blocks = [block for block, _ in packed]
+    citations = [
+        Citation(path=block.path, start_line=block.start_line, end_line=block.end_line, doc_type=block.doc_type)
+        for block in blocks
+    ]
+    return context, hits, citations, blocks
 
 
-def answer_with_ollama(
+def build_context(
     db_path: str,
     question: str,
     *,
     top_k: int = 8,
     doc_type: Optional[str] = None,
     scope: Optional[str] = None,
-    model: Optional[str] = None,
-    base_url: Optional[str] = None,
-    timeout_s: int = 120,
-) -> Dict:
-    context, hits, citations = build_context(db_path, question, top_k=top_k, doc_type=doc_type, scope=scope)
+    max_context_tokens: int = CONTEXT_TOKENS,
+    conn: Optional[sqlite3.Connection] = None,
+    hybrid: bool = False,
+) -> Tuple[str, List[Dict], List[Citation]]:
+    """Retourne context string + hits + citations (une par extrait [n] du contexte).
+
+    Le contexte est assemblé par packing.pack sous max_context_tokens (estimés) :
+    hits contigus d'un même fichier fusionnés, extraits éventuellement réduits
+    aux lignes qui contiennent les termes de la question.
+    conn : connexion déjà ouverte (ex. pool du serveur), sinon db_path est ouvert.
+    """
+    if conn is None:
+        conn = connect_db(db_path)
+        ensure_schema(conn)
+
+    def compute() -> Tuple[str, List[Dict], List[Citation]]:
+        context, hits, citations, _ = _retrieve_context(
+            conn, question, top_k=top_k, doc_type=doc_type, scope=scope, max_context_tokens=max_context_tokens, hybrid=hybrid
+        )
+        return context, [drop_text(h) for h in hits], citations
 
-    prompt = (
+    key = query_key("context", question, top_k, doc_type, scope, max_context_tokens, hybrid)
+    return cached_query(conn, db_path, key, compute)
+
+
+def build_prompt(question: str, context: str) -> str:
+    return (
         "Tu es un assistant de rétro-documentation de patrimoine OpenVMS (C/SQLMOD/DCL).\n"
         "Réponds en français de façon factuelle et concise.\n"
         "Tu dois citer tes sources sous forme [n] correspondant aux extraits fournis.\n"
@@ -77,7 +93,67 @@ def answer_with_ollama(
         "RÉPONSE (avec citations [n]):"
     )
 
-    response = ollama_generate(prompt, model=model, base_url=base_url, timeout_s=timeout_s)
+
+# -------------------------
+# Cache persistant des réponses LLM
+# -------------------------
+
+ANSWER_CACHE_TTL_S = float(os.getenv("RAGLITE_ANSWER_CACHE_TTL_S", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_BYTES = int(float(os.getenv("RAGLITE_ANSWER_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def answer_cache_key(conn: sqlite3.Connection, model: str, question: str, context: str, hits: List[Dict]) -> str:
+    """Empreinte modèle + prompt rendu (gabarit, question, extraits) + ids des chunks et sha256 de leur source."""
+    ids = [int(h["chunk_id"]) for h in hits]
+    fingerprints = chunk_fingerprints(conn, ids)
+    payload = json.dumps(
+        [model, build_prompt(question, context), [[cid, (fingerprints.get(cid) or (None, None))[1]] for cid in ids]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def lookup_answer(
+    conn: sqlite3.Connection, model: Optional[str], question: str, context: str, hits: List[Dict]
+) -> Tuple[str, Optional[Dict]]:
+    """(clé, réponse en cache ou None). Lecture seule : utilisable sur une connexion query_only."""
+    from llm import resolve_model
+
+    key = answer_cache_key(conn, resolve_model(model), question, context, hits)
+    cached = answer_cache_get(conn, key, ANSWER_CACHE_TTL_S)
+    if cached is not None:
+        cached["cached"] = True
+    return key, cached
+
+
+def store_answer(conn: sqlite3.Connection, key: str, model: Optional[str], result: Dict) -> None:
+    from llm import resolve_model
+
+    answer_cache_put(
+        conn,
+        key,
+        resolve_model(model),
+        {cid: doc_id for cid, (doc_id, _) in chunk_fingerprints(conn, [h["chunk_id"] for h in result["hits"]]).items()},
+        result,
+        ttl_s=ANSWER_CACHE_TTL_S,
+        max_bytes=ANSWER_CACHE_MAX_BYTES,
+    )
+
+
+def answer_from_context(
+    question: str,
+    context: str,
+    hits: List[Dict],
+    citations: List[Citation],
+    *,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout_s: int = 120,
+) -> Dict:
+    """Appel LLM sur un contexte déjà construit (aucun accès SQLite)."""
+    from llm import ollama_generate
+
+    response = ollama_generate(build_prompt(question, context), model=model, base_url=base_url, timeout_s=timeout_s)
 
     return {
         "question": question,
@@ -85,72 +161,127 @@ def answer_with_ollama(
         "hits": hits,
         "citations": [c.__dict__ for c in citations],
         "context": context,
+        "cached": False,
     }
 
 
+def answer_stream_from_context(
+    question: str,
+    context: str,
+    hits: List[Dict],
+    citations: List[Citation],
+    *,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout_s: int = 120,
+    cached: Optional[Dict] = None,
+    on_done: Optional[Callable[[Dict], None]] = None,
+) -> Iterator[Tuple[str, Dict]]:
+    """Variante streaming : ("meta", hits+citations) d'abord, puis ("token", ...) au fil
+    de la génération, enfin ("done", réponse complète + ttft_s/total_s).
+
+    cached : réponse du cache, rejouée en un seul token sans appel LLM.
+    on_done : reçoit le résultat complet (forme de answer_from_context) après génération.
+    Les LlmError remontent à l'appelant (éventuellement après des tokens).
+    """
+    from llm import ollama_generate_stream
+
+    t0 = time.perf_counter()
+    meta = {
+        "question": question,
+        "hits": hits,
+        "citations": [c.__dict__ for c in citations],
+        "context": context,
+    }
+    yield "meta", meta
+    if cached is not None:
+        yield "token", {"text": cached["answer"]}
+        elapsed = round(time.perf_counter() - t0, 4)
+        yield "done", {"answer": cached["answer"], "ttft_s": elapsed, "total_s": elapsed, "cached": True}
+        return
+    parts: List[str] = []
+    ttft = None
+    for text in ollama_generate_stream(build_prompt(question, context), model=model, base_url=base_url, timeout_s=timeout_s):
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        parts.append(text)
+        yield "token", {"text": text}
+    answer = "".join(parts).strip()
+    if on_done is not None:
+        on_done(dict(meta, answer=answer, cached=False))
+    yield "done", {
+        "answer": answer,
+        "ttft_s": round(ttft, 4) if ttft is not None else None,
+        "total_s": round(time.perf_counter() - t0, 4),
+        "cached": False,
+    }
+
+
+def answer_with_ollama_stream(
+    db_path: str,
+    question: str,
+    *,
+    top_k: int = 8,
+    doc_type: Optional[str] = None,
+    scope: Optional[str] = None,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout_s: int = 120,
+    conn: Optional[sqlite3.Connection] = None,
+    use_cache: bool = True,
+    hybrid: bool = False,
+) -> Iterator[Tuple[str, Dict]]:
+    if conn is None:
+        conn = connect_db(db_path)
+        ensure_schema(conn)
+    context, hits, citations = build_context(
+        db_path, question, top_k=top_k, doc_type=doc_type, scope=scope, conn=conn, hybrid=hybrid
+    )
+    cached = on_done = None
+    if use_cache:
+        key, cached = lookup_answer(conn, model, question, context, hits)
+        on_done = lambda result: store_answer(conn, key, model, result)  # noqa: E731
+    return answer_stream_from_context(
+        question, context, hits, citations,
+        model=model, base_url=base_url, timeout_s=timeout_s, cached=cached, on_done=on_done,
+    )
+
+
+def answer_with_ollama(
+    db_path: str,
+    question: str,
+    *,
+    top_k: int = 8,
+    doc_type: Optional[str] = None,
+    scope: Optional[str] = None,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout_s: int = 120,
+    conn: Optional[sqlite3.Connection] = None,
+    use_cache: bool = True,
+    hybrid: bool = False,
+) -> Dict:
+    """use_cache=False : ni lecture ni écriture du cache de réponses."""
+    if conn is None:
+        conn = connect_db(db_path)
+        ensure_schema(conn)
+    context, hits, citations = build_context(
+        db_path, question, top_k=top_k, doc_type=doc_type, scope=scope, conn=conn, hybrid=hybrid
+    )
+    if not use_cache:
+        return answer_from_context(question, context, hits, citations, model=model, base_url=base_url, timeout_s=timeout_s)
+    key, cached = lookup_answer(conn, model, question, context, hits)
+    if cached is not None:
+        return cached
+    result = answer_from_context(question, context, hits, citations, model=model, base_url=base_url, timeout_s=timeout_s)
+    store_answer(conn, key, model, result)
+    return result
+
+
 # -------------------------
 # Rules mode (no LLM)
 # -------------------------
 
-_DCL_CMD_RE = re.compile(
-    r"^\s*\$\s*(RUN|MCR|PIPE|SUBMIT|COPY|APPEND|RENAME|DELETE|PURGE|SET|ON|GOTO|CALL|@)\b(.*)$",
-    re.IGNORECASE | re.MULTILINE,
-)
-_DCL_LABEL_RE = re.compile(r"^\s*\$([A-Za-z0-9_]+):\s*$", re.MULTILINE)
-_DCL_ONERR_RE = re.compile(r"^\s*\$\s*ON\s+ERROR\b(.*)$", re.IGNORECASE | re.MULTILINE)
-_DCL_EXIT_RE = re.compile(r"^\s*\$\s*(EXIT|STOP|LOGOUT)\b(.*)$", re.IGNORECASE | re.MULTILINE)
-
-_C_CALL_RE = re.compile(r"\b([A-Za-z_]\w*)\s*\(", re.MULTILINE)
-_SQL_TABLE_RE = re.compile(r"\bFROM\s+([A-Za-z0-9_\.]+)|\bJOIN\s+([A-Za-z0-9_\.]+)|\bUPDATE\s+([A-Za-z0-9_\.]+)|\bINTO\s+([A-Za-z0-9_\.]+)", re.IGNORECASE)
-
-
-def _extract_dcl_features(text: str) -> Dict:
-    labels = [m.group(1) for m in _DCL_LABEL_RE.finditer(text)]
-    onerr = [m.group(1).strip() for m in _DCL_ONERR_RE.finditer(text)]
-    exits = [m.group(1).upper() for m in _DCL_EXIT_RE.finditer(text)]
-    cmds = []
-    for m in _DCL_CMD_RE.finditer(text):
-        cmd = m.group(1).upper()
-        rest = (m.group(2) or "").strip()
-        # keep compact preview
-        cmds.append({"cmd": cmd, "arg": rest[:160]})
-    return {"labels": labels[:50], "on_error": onerr[:20], "exits": exits[:20], "commands": cmds[:80]}
-
-
-def _extract_c_features(text: str) -> Dict:
-    # Very light: most frequent call names (excluding obvious keywords)
-    names = [m.group(1) for m in _C_CALL_RE.finditer(text)]
-    stop = {"if", "for", "while", "switch", "return", "sizeof", "typedef"}
-    filt = [n for n in names if n not in stop and len(n) <= 40]
-    # count top
-    counts: Dict[str, int] = {}
-    for n in filt:
-        counts[n] = counts.get(n, 0) + 1
-    top = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:20]
-    return {"top_calls": top}
-
-
-def _extract_sql_features(text: str) -> Dict:
-    tables = []
-    for m in _SQL_TABLE_RE.finditer(text):
-        for g in m.groups():
-            if g:
-                tables.append(g)
-    # normalize
-    norm = []
-    for t in tables:
-        t = t.strip().rstrip(";")
-        if t:
-            norm.append(t)
-    uniq = []
-    seen = set()
-    for t in norm:
-        tl = t.lower()
-        if tl not in seen:
-            seen.add(tl)
-            uniq.append(t)
-    return {"tables": uniq[:40]}
-
 
 def answer_rules(
     db_path: str,
@@ -159,32 +290,39 @@ def answer_rules(
     top_k: int = 8,
     doc_type: Optional[str] = None,
     scope: Optional[str] = None,
+    conn: Optional[sqlite3.Connection] = None,
+    hybrid: bool = False,
 ) -> Dict:
     """Produit une explication structurée à partir des extraits, sans appel LLM."""
-    context, hits, citations = build_context(db_path, question, top_k=top_k, doc_type=doc_type, scope=scope)
-
-    # Build per-citation features (using chunk text, not the header)
-    conn = connect_db(db_path)
-    init_db(conn)
+    if conn is None:
+        conn = connect_db(db_path)
+        ensure_schema(conn)
+    context, hits, citations, blocks = _retrieve_context(
+        conn, question, top_k=top_k, doc_type=doc_type, scope=scope, max_context_tokens=CONTEXT_TOKENS, hybrid=hybrid
+    )
 
+    # Une source par extrait [n] du contexte (hits contigus fusionnés), comme les citations.
+    # Features: extracted at index time (symbols.py), from chunk text only for chunks
+    # indexed before that; from the block text for merged hits (shared lines once)
+    by_id = {int(h["chunk_id"]): h for h in hits}
+    stored = chunk_features(conn, [cid for b in blocks for cid in b.chunk_ids])
     per_source = []
-    for i, h in enumerate(hits, start=1):
-        ch = get_chunk(conn, int(h["chunk_id"]))
-        dtype = ch["doc_type"]
-        txt = ch["text"]
-        features = {}
-        if dtype == "dcl":
-            features = _extract_dcl_features(txt)
-        elif dtype == "c":
-            features = _extract_c_features(txt)
-        elif dtype == "sqlmod":
-            features = _extract_sql_features(txt)
+    for i, (block, cit) in enumerate(zip(blocks, citations), start=1):
+        dtype = block.doc_type
+        if len(block.chunk_ids) == 1:
+            cid = block.chunk_ids[0]
+            features = stored.get(cid)
+            if features is None:
+                features = extract_features(dtype, by_id[cid]["text"])
+        else:
+            features = extract_features(dtype, "\n".join(block.lines))
         per_source.append({
             "n": i,
-            "path": ch["path"],
+            "path": block.path,
             "doc_type": dtype,
-            "start_line": int(ch["start_line"]),
-            "end_line": int(ch["end_line"]),
+            "start_line": cit.start_line,
+            "end_line": cit.end_line,
+            "chunk_ids": block.chunk_ids,
             "features": features,
         })
 
@@ -233,7 +371,7 @@ def answer_rules(
         "question": question,
         "answer": answer_text,
         "mode": "rules",
-        "hits": hits,
+        "hits": [drop_text(h) for h in hits],
         "citations": [c.__dict__ for c in citations],
         "context": context,
         "per_source": per_source,
@@ -0,0 +1,224 @@
+"""Recherche en deux étapes : candidats sur-échantillonnés, puis re-classement.
+
+1. retrieve : search_fts sur fetch × top_k candidats (plan FTS, hybride
+   éventuel) ; au-delà du budget de l'étape, plus de nouvelle étape du plan
+   (les candidats déjà trouvés sont gardés) ;
+2. rerank : caractéristiques dans [0, 1] calculées colonne par colonne sur tous
+   les candidats, score = moyenne pondérée des caractéristiques applicables,
+   donc dans [0, 1] et comparable d'une requête à l'autre (seuil min_score) :
+   - bm25      : -bm25 rapporté au meilleur candidat ;
+   - coverage  : part des termes de la question (query_terms) présents ;
+   - proximity : 1 / (1 + hauteur en lignes de la plus petite fenêtre qui
+                 contient tous les termes présents) ;
+   - symbol    : identifiant de la question (LIB$SIGNAL, lib_compte, SUB_042)
+                 défini par le chunk (table symbols) = 1, présent tel quel = 0.75 ;
+   - doc_type  : a priori par type (DOC_TYPE_PRIORS) ;
+   - vector    : similarité cosinus des embeddings, si l'index en a ;
+   - scorers   : callables (question, hits) -> [score dans [0, 1]] fournis par
+                 l'appelant (cross-encoder...), avec leur poids.
+   vector et scorers (coûteux) sont sautés une fois le budget de l'étape épuisé.
+   La somme pondérée reste une boucle Python, sans NumPy : à 40 candidats × 6
+   colonnes elle coûte ~30 µs. La boucle par candidat est de toute façon nécessaire
+   pour construire features (~115 µs). Importer NumPy coûte ~75 ms au démarrage de
+   `query --rerank`, et NumPy n'est qu'une dépendance optionnelle (embeddings.py).
+
+Chaque étape est décrite dans timings (liste fournie par l'appelant) :
+{stage, ms, budget_ms, ...}.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from store.fts_query import query_terms
+from store.sqlite import chunks_defining, drop_text, get_meta, search_fts
+
+# Candidats de la première étape : FETCH_FACTOR × top_k
+FETCH_FACTOR = 4
+# Budgets par étape (ms)
+RETRIEVE_BUDGET_MS = 250.0
+RERANK_BUDGET_MS = 100.0
+
+DEFAULT_WEIGHTS = {
+    "bm25": 1.0,
+    "coverage": 1.0,
+    "proximity": 0.5,
+    "symbol": 1.0,
+    "doc_type": 0.25,
+    "vector": 1.0,
+}
+DOC_TYPE_PRIORS = {"dcl": 1.0, "c": 1.0, "sqlmod": 1.0, "text": 0.5}
+
+# (question, hits hydratés) -> un score dans [0, 1] par hit
+Scorer = Callable[[str, List[Dict]], List[float]]
+
+
+def symbol_terms(terms: Sequence[str]) -> List[str]:
+    """Termes qui ressemblent à des identifiants : $, _ ou chiffre (LIB$SIGNAL, T_CLIENT, SUB_042)."""
+    return [
+        t for t in terms
+        if " " not in t and any(ch.isalpha() for ch in t) and any(ch in "$_" or ch.isdigit() for ch in t)
+    ]
+
+
+def _identifier_re(names: Sequence[str]) -> Optional[re.Pattern]:
+    if not names:
+        return None
+    alts = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    return re.compile(rf"(?<![\w$])(?:{alts})(?![\w$])", re.IGNORECASE)
+
+
+def _min_window(positions: List[List[int]]) -> int:
+    """Hauteur (lignes) de la plus petite fenêtre contenant une position de chaque liste."""
+    events = sorted((pos, i) for i, plist in enumerate(positions) for pos in plist)
+    need = len(positions)
+    counts = [0] * need
+    have = 0
+    best = events[-1][0] - events[0][0]
+    lo = 0
+    for pos, i in events:
+        counts[i] += 1
+        if counts[i] == 1:
+            have += 1
+        while have == need:
+            lo_pos, j = events[lo]
+            best = min(best, pos - lo_pos)
+            counts[j] -= 1
+            if counts[j] == 0:
+                have -= 1
+            lo += 1
+    return best
+
+
+def _text_features(texts: List[str], terms: List[str]) -> Tuple[List[float], List[float]]:
+    """Colonnes coverage et proximity."""
+    coverage: List[float] = []
+    proximity: List[float] = []
+    for text in texts:
+        lines = text.lower().split("\n")
+        positions = [[i for i, ln in enumerate(lines) if t in ln] for t in terms]
+        present = [p for p in positions if p]
+        coverage.append(len(present) / len(terms))
+        proximity.append(1.0 / (1.0 + _min_window(present)) if present else 0.0)
+    return coverage, proximity
+
+
+def rerank(
+    conn: sqlite3.Connection,
+    q: str,
+    candidates: List[Dict],
+    *,
+    weights: Optional[Dict[str, float]] = None,
+    scorers: Sequence[Tuple[float, Scorer]] = (),
+    deadline: Optional[float] = None,
+) -> Tuple[List[Dict], Dict[str, object]]:
+    """Re-classe des hits hydratés. Renvoie (hits triés par score décroissant,
+    {features, skipped}). Chaque hit reçoit score (dans [0, 1]), first_stage_score,
+    first_stage_pos et features {nom: valeur}. Sans poids > 0 applicable (tous nuls,
+    ou seules les caractéristiques pondérées absentes) : ordre et score de la première étape."""
+    w = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    if not candidates:
+        return [], {"features": [], "skipped": []}
+    terms = [t.lower() for t in query_terms(q)]
+    texts = [h["text"] for h in candidates]
+    columns: Dict[str, List[float]] = {}
+
+    best = max(max(0.0, -float(h["rank"])) for h in candidates)
+    columns["bm25"] = [max(0.0, -float(h["rank"])) / best if best > 0 else 0.0 for h in candidates]
+    if terms:
+        columns["coverage"], columns["proximity"] = _text_features(texts, terms)
+    symbols = symbol_terms(terms)
+    if symbols:
+        ident = _identifier_re(symbols)
+        defined = chunks_defining(conn, [int(h["chunk_id"]) for h in candidates], symbols)
+        columns["symbol"] = [
+            1.0 if int(h["chunk_id"]) in defined else (0.75 if ident.search(text) else 0.0)
+            for h, text in zip(candidates, texts)
+        ]
+    columns["doc_type"] = [DOC_TYPE_PRIORS.get(h["doc_type"], 0.5) for h in candidates]
+
+    skipped: List[str] = []
+    if w.get("vector"):
+        if deadline is not None and time.perf_counter() >= deadline:
+            skipped.append("vector")
+        elif get_meta(conn, "embedder"):
+            # import local, seulement si l'index a des embeddings : embeddings
+            # s'appuie sur store.sqlite et charge NumPy
+            from embeddings import vector_scores
+
+            sims = vector_scores(conn, q, [int(h["chunk_id"]) for h in candidates])
+            if sims is not None:
+                columns["vector"] = [max(0.0, sims.get(int(h["chunk_id"]), 0.0)) for h in candidates]
+    extra: List[Tuple[str, float]] = []
+    for n, (weight, scorer) in enumerate(scorers):
+        name = getattr(scorer, "__name__", f"scorer_{n}")
+        if deadline is not None and time.perf_counter() >= deadline:
+            skipped.append(name)
+            continue
+        columns[name] = [min(1.0, max(0.0, float(v))) for v in scorer(q, candidates)]
+        extra.append((name, weight))
+
+    used = [(name, w.get(name, 0.0)) for name in DEFAULT_WEIGHTS if name in columns] + extra
+    used = [(name, weight) for name, weight in used if weight > 0]
+    total = sum(weight for _, weight in used)
+    scored: List[Dict] = []
+    for pos, h in enumerate(candidates):
+        feats = {name: round(columns[name][pos], 4) for name, _ in used}
+        # aucun poids > 0 parmi les caractéristiques applicables : ordre et score de la première étape
+        score = sum(weight * columns[name][pos] for name, weight in used) / total if total else h["score"]
+        scored.append(dict(h, score=round(score, 4), first_stage_score=h["score"], first_stage_pos=pos, features=feats))
+    scored.sort(key=lambda h: (-h["score"], h["first_stage_pos"]) if total else h["first_stage_pos"])
+    return scored, {"features": [name for name, _ in used], "skipped": skipped}
+
+
+def search_reranked(
+    conn: sqlite3.Connection,
+    q: str,
+    top_k: int = 10,
+    doc_type: Optional[str] = None,
+    scope: Optional[str] = None,
+    hydrate: bool = False,
+    hybrid: bool = False,
+    *,
+    fetch: int = FETCH_FACTOR,
+    min_score: float = 0.0,
+    weights: Optional[Dict[str, float]] = None,
+    scorers: Sequence[Tuple[float, Scorer]] = (),
+    retrieve_budget_ms: float = RETRIEVE_BUDGET_MS,
+    rerank_budget_ms: float = RERANK_BUDGET_MS,
+    stages: Optional[List[Dict]] = None,
+    timings: Optional[List[Dict]] = None,
+) -> List[Dict]:
+    """search_fts sur fetch × top_k candidats puis rerank ; top_k hits de score >= min_score.
+
+    stages : étapes du plan FTS (comme search_fts) ; timings : une entrée par
+    étape du pipeline (retrieve, rerank).
+    """
+    t0 = time.perf_counter()
+    candidates = search_fts(
+        conn, q, top_k=top_k * max(1, fetch), doc_type=doc_type, scope=scope, hydrate=True, hybrid=hybrid,
+        stages=stages, deadline=t0 + retrieve_budget_ms / 1000,
+    )
+    t1 = time.perf_counter()
+    hits, info = rerank(conn, q, candidates, weights=weights, scorers=scorers, deadline=t1 + rerank_budget_ms / 1000)
+    hits = [h for h in hits if h["score"] >= min_score][:top_k]
+    t2 = time.perf_counter()
+    if timings is not None:
+        timings.append({
+            "stage": "retrieve",
+            "ms": round((t1 - t0) * 1000, 3),
+            "budget_ms": retrieve_budget_ms,
+            "candidates": len(candidates),
+            "over_budget": (t1 - t0) * 1000 > retrieve_budget_ms,
+        })
+        timings.append({
+            "stage": "rerank",
+            "ms": round((t2 - t1) * 1000, 3),
+            "budget_ms": rerank_budget_ms,
+            "kept": len(hits),
+            "over_budget": (t2 - t1) * 1000 > rerank_budget_ms,
+            **info,
+        })
+    return hits if hydrate else [drop_text(h) for h in hits]
@@ -2,16 +2,37 @@ from __future__ import annotations
 
 from typing import Dict, List, Optional
 
-from store.sqlite import connect_db, init_db, search_fts as _search_fts, get_chunk as _get_chunk
+from cache import cached_query, query_key
+from store.sqlite import connect_db, ensure_schema, search_fts as _search_fts, get_chunk as _get_chunk, get_chunks as _get_chunks
 
 
-def search_fts(db_path: str, q: str, top_k: int = 10, doc_type: Optional[str] = None, scope: Optional[str] = None) -> List[Dict]:
+def search_fts(
+    db_path: str,
+    q: str,
+    top_k: int = 10,
+    doc_type: Optional[str] = None,
+    scope: Optional[str] = None,
+    hydrate: bool = False,
+    hybrid: bool = False,
+) -> List[Dict]:
     conn = connect_db(db_path)
-    init_db(conn)
-    return _search_fts(conn, q=q, top_k=top_k, doc_type=doc_type, scope=scope)
+    ensure_schema(conn)
+    key = query_key("search", q, top_k, doc_type, scope, hydrate, hybrid)
+    return cached_query(
+        conn,
+        db_path,
+        key,
+        lambda: _search_fts(conn, q=q, top_k=top_k, doc_type=doc_type, scope=scope, hydrate=hydrate, hybrid=hybrid),
+    )
 
 
 def get_chunk(db_path: str, chunk_id: int) -> Dict:
     conn = connect_db(db_path)
-    init_db(conn)
+    ensure_schema(conn)
     return _get_chunk(conn, chunk_id)
+
+
+def get_chunks(db_path: str, chunk_ids: List[int]) -> Dict[int, Dict]:
+    conn = connect_db(db_path)
+    ensure_schema(conn)
+    return _get_chunks(conn, chunk_ids)
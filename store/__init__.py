@@ -1 +1,2 @@
-from store.sqlite import connect_db, init_db, upsert_document, replace_chunks, search_fts, get_chunk, should_reindex
+from store.sqlite import connect_db, init_db, ensure_schema, SCHEMA_VERSION, upsert_document, replace_chunks, BulkWriter, search_fts, get_chunk, should_reindex, get_document_hash, update_document_stat, load_document_states, record_index_run, relink_document, delete_documents, get_meta, set_meta, fts_layout, migrate_fts, FTS_LAYOUTS, get_chunks, drop_text, connect_readonly, ConnectionPool, PoolExhausted, get_generation, bump_generation, chunk_fingerprints, answer_cache_get, answer_cache_put, answer_cache_stats, filter_subquery, chunk_ids_without_vector, chunk_texts, write_vectors, iter_vectors, clear_vectors, FTS_TOKENIZERS, fts_tokenizer, has_trigram, backfill_xref, chunk_features, xref_lookup, bm25_score, chunk_vectors, chunks_defining
+from store.fts_query import plan_fts_query, query_terms, STOPWORDS
@@ -0,0 +1,84 @@
+"""Planification des requêtes FTS5 : phrase exacte, puis NEAR, puis OR des termes significatifs
+(et, si la base a un index trigramme, sous-chaînes).
+
+La saisie utilisateur n'est jamais passée telle quelle à MATCH : chaque terme
+est mis entre guillemets (phrase FTS5), ce qui neutralise la syntaxe FTS5
+(opérateurs, colonnes, parenthèses) et garde les jetons DCL (F$SEARCH,
+SYS$OUTPUT, $STATUS) d'un seul tenant quel que soit le tokenizer.
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+NEAR_DISTANCE = 10
+MAX_TERMS = 16
+
+STOPWORDS = frozenset(
+    """
+    a an and are as at be been but by can could did do does for from had has have how i if in into is it its
+    me my no not of on or our should so such than that the their them then there these they this those to
+    was we were what when where which while who why will with would you your
+    au aux avec ce ces cet cette comme comment dans de des du elle elles en est et été être il ils je la le
+    les leur leurs lui ma mais me mes moi mon ne nos notre nous on ou où par pas pour qu que quel quelle
+    quelles quels qui sa sans se ses si son sont sur ta te tes toi ton tu un une vos votre vous y
+    """.split()
+)
+
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+_TERM_RE = re.compile(r"[^\s\"'’‘()]+")
+_EDGE_PUNCT = ".,;:!?*^+-=<>[]{}"
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def escape_phrase(q: str) -> str:
+    """Requête entière en une phrase FTS5 (apostrophes -> espaces, guillemets doublés)."""
+    q_clean = " ".join(q.replace("'", " ").replace("’", " ").replace("‘", " ").split())
+    return _quote(q_clean) if q_clean else '""'
+
+
+def _significant(term: str) -> bool:
+    if "$" in term:
+        return any(ch.isalnum() for ch in term)
+    if not any(ch.isalnum() for ch in term):
+        return False
+    return term.lower() not in STOPWORDS and (len(term) > 1 or term.isdigit())
+
+
+def query_terms(q: str) -> List[str]:
+    """Termes significatifs de q : phrases entre guillemets conservées, mots vides
+    (français + anglais) retirés, jetons contenant $ toujours gardés. Sans doublons."""
+    terms: List[str] = []
+    for phrase in _PHRASE_RE.findall(q):
+        phrase = " ".join(phrase.split())
+        if phrase:
+            terms.append(phrase)
+    for raw in _TERM_RE.findall(_PHRASE_RE.sub(" ", q)):
+        term = raw.strip(_EDGE_PUNCT)
+        if term and _significant(term):
+            terms.append(term)
+    seen = set()
+    return [t for t in terms if not (t.lower() in seen or seen.add(t.lower()))][:MAX_TERMS]
+
+
+def plan_fts_query(q: str, substring: bool = False) -> List[Tuple[str, str]]:
+    """Étapes [(nom, expression MATCH)] : "phrase" (saisie complète), "near" (termes
+    proches), "or" (n'importe quel terme), puis avec substring=True "substring"
+    (termes d'au moins 3 caractères, pour l'index trigramme chunks_trigram).
+    Les étapes identiques à une précédente sont omises."""
+    stages = [("phrase", escape_phrase(q))]
+    raw_terms = query_terms(q)
+    terms = [_quote(t) for t in raw_terms]
+    if len(terms) > 1:
+        stages.append(("near", f"NEAR({' '.join(terms)}, {NEAR_DISTANCE})"))
+    if terms:
+        stages.append(("or", " OR ".join(terms)))
+    seen = set()
+    planned = [(name, expr) for name, expr in stages if not (expr in seen or seen.add(expr))]
+    long_terms = [_quote(t) for t in raw_terms if len(t) >= 3]
+    if substring and long_terms:
+        planned.append(("substring", " OR ".join(long_terms)))
+    return planned
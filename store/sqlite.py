@@ -1,10 +1,21 @@
 from __future__ import annotations
 
 import json
+import queue
 import sqlite3
-from typing import Dict, List, Optional
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from models import Document, Chunk
+from models import Document, Chunk, FileStat
+from symbols import ChunkXref, XrefAnalyzer, analyze_chunks
+from store.fts_query import escape_phrase, plan_fts_query
+
+# Version du schéma (PRAGMA user_version), écrite par init_db. À incrémenter à
+# chaque changement de SCHEMA_SQL, _ADDED_COLUMNS ou des tables FTS/xref : les
+# bases d'une version antérieure repassent par init_db (ensure_schema).
+SCHEMA_VERSION = 1
 
 SCHEMA_SQL = """
 PRAGMA journal_mode=WAL;
@@ -16,9 +27,15 @@ CREATE TABLE IF NOT EXISTS documents (
   doc_type TEXT NOT NULL,
   mtime INTEGER NOT NULL,
   sha256 TEXT NOT NULL,
-  meta_json TEXT
+  meta_json TEXT,
+  source_root TEXT,
+  size INTEGER,
+  mtime_ns INTEGER,
+  inode INTEGER
 );
 CREATE INDEX IF NOT EXISTS idx_documents_type_folder ON documents(doc_type, rel_folder);
+CREATE INDEX IF NOT EXISTS idx_documents_type_folder_nc ON documents(doc_type, rel_folder COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_documents_folder_nc ON documents(rel_folder COLLATE NOCASE);
 
 CREATE TABLE IF NOT EXISTS chunks (
   id INTEGER PRIMARY KEY,
@@ -33,6 +50,84 @@ CREATE TABLE IF NOT EXISTS chunks (
 );
 CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id, chunk_index);
 
+CREATE TABLE IF NOT EXISTS index_runs (
+  id INTEGER PRIMARY KEY,
+  source_root TEXT NOT NULL,
+  started_at REAL NOT NULL,
+  finished_at REAL NOT NULL,
+  scanned INTEGER NOT NULL,
+  added INTEGER NOT NULL,
+  modified INTEGER NOT NULL,
+  deleted INTEGER NOT NULL,
+  unchanged INTEGER NOT NULL,
+  ignored INTEGER NOT NULL,
+  timings_json TEXT,
+  renamed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS index_meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+
+-- Cache persistant des réponses LLM (cf. rag.answer_cache_key)
+CREATE TABLE IF NOT EXISTS answer_cache (
+  key TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  created_at REAL NOT NULL,
+  size INTEGER NOT NULL,
+  result_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_created ON answer_cache(created_at);
+-- Chunks cités par réponse : réindexer/renommer/supprimer un document invalide
+-- les réponses qui citent un de ses chunks (_invalidate_answers)
+CREATE TABLE IF NOT EXISTS answer_cache_chunks (
+  key TEXT NOT NULL REFERENCES answer_cache(key) ON DELETE CASCADE,
+  chunk_id INTEGER NOT NULL,
+  doc_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_chunks_doc ON answer_cache_chunks(doc_id);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_chunks_key ON answer_cache_chunks(key);
+
+-- Embeddings des chunks (optionnels, cf. embeddings.py) : int8 + échelle par vecteur,
+-- embedder décrit dans index_meta 'embedder'
+CREATE TABLE IF NOT EXISTS chunk_vectors (
+  chunk_id INTEGER PRIMARY KEY,
+  scale REAL NOT NULL,
+  vec BLOB NOT NULL
+);
+
+-- Symboles (définitions) et références extraits à l'indexation (cf. symbols.py) ;
+-- lignes absolues dans le document, noms comparés sans casse, caller = symbole
+-- englobant de la référence
+CREATE TABLE IF NOT EXISTS symbols (
+  chunk_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  name TEXT NOT NULL COLLATE NOCASE,
+  line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols(name, kind);
+CREATE INDEX IF NOT EXISTS idx_symbols_chunk ON symbols(chunk_id);
+CREATE TABLE IF NOT EXISTS refs (
+  chunk_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  name TEXT NOT NULL COLLATE NOCASE,
+  line INTEGER NOT NULL,
+  caller TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_refs_name ON refs(name, kind);
+CREATE INDEX IF NOT EXISTS idx_refs_chunk ON refs(chunk_id);
+"""
+
+# Disposition de la table FTS (index_meta 'fts_layout') :
+#   inline   : texte + colonnes dénormalisées recopiés dans chunks_fts (historique)
+#   external : FTS5 external-content sur chunks (texte stocké une seule fois)
+# Dans les deux cas chunks_fts.rowid == chunks.id et des triggers sur chunks
+# maintiennent l'index : le code d'écriture ne touche que chunks.
+FTS_LAYOUTS = ("inline", "external")
+
+_FTS_SQL = {
+    "inline": """
 CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts
 USING fts5(
   text,
@@ -40,11 +135,72 @@ USING fts5(
   doc_id UNINDEXED,
   path UNINDEXED,
   doc_type UNINDEXED,
-  rel_folder UNINDEXED
+  rel_folder UNINDEXED{options}
 );
+CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+  INSERT INTO chunks_fts(rowid, text, chunk_id, doc_id, path, doc_type, rel_folder)
+  SELECT new.id, new.text, new.id, new.doc_id, d.path, d.doc_type, d.rel_folder
+  FROM documents d WHERE d.id = new.doc_id;
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+  DELETE FROM chunks_fts WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_au AFTER UPDATE OF text, doc_id ON chunks BEGIN
+  DELETE FROM chunks_fts WHERE rowid = old.id;
+  INSERT INTO chunks_fts(rowid, text, chunk_id, doc_id, path, doc_type, rel_folder)
+  SELECT new.id, new.text, new.id, new.doc_id, d.path, d.doc_type, d.rel_folder
+  FROM documents d WHERE d.id = new.doc_id;
+END;
+""",
+    "external": """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts
+USING fts5(text, content='chunks', content_rowid='id'{options});
+CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+  INSERT INTO chunks_fts(rowid, text) VALUES(new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+  INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_au AFTER UPDATE OF text ON chunks BEGIN
+  INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES('delete', old.id, old.text);
+  INSERT INTO chunks_fts(rowid, text) VALUES(new.id, new.text);
+END;
+""",
+}
+
+
+# Tokenizer de chunks_fts (index_meta 'fts_tokenizer') :
+#   unicode61 : défaut FTS5, F$SEARCH / LIB$SIGNAL / my_func découpés en fragments
+#   code      : unicode61 avec $ et _ dans les mots, identifiants VMS/C d'un seul tenant
+FTS_TOKENIZERS = {
+    "unicode61": "",
+    "code": "unicode61 tokenchars '$_'",
+}
+
+# Index secondaire optionnel (index_meta 'fts_trigram') : trigrammes pour la recherche
+# de sous-chaînes (étape "substring" de search_fts), external-content sur chunks
+_TRIGRAM_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_trigram
+USING fts5(text, content='chunks', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS chunks_trigram_ai AFTER INSERT ON chunks BEGIN
+  INSERT INTO chunks_trigram(rowid, text) VALUES(new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_trigram_ad AFTER DELETE ON chunks BEGIN
+  INSERT INTO chunks_trigram(chunks_trigram, rowid, text) VALUES('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_trigram_au AFTER UPDATE OF text ON chunks BEGIN
+  INSERT INTO chunks_trigram(chunks_trigram, rowid, text) VALUES('delete', old.id, old.text);
+  INSERT INTO chunks_trigram(rowid, text) VALUES(new.id, new.text);
+END;
 """
 
 
+def _fts_sql(layout: str, tokenizer: str) -> str:
+    spec = FTS_TOKENIZERS[tokenizer]
+    options = ", tokenize=\"" + spec + "\"" if spec else ""
+    return _FTS_SQL[layout].replace("{options}", options)
+
+
 def connect_db(db_path: str) -> sqlite3.Connection:
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
@@ -52,76 +208,816 @@ def connect_db(db_path: str) -> sqlite3.Connection:
     return conn
 
 
-def init_db(conn: sqlite3.Connection) -> None:
+def connect_readonly(
+    db_path: str,
+    *,
+    mmap_size: int = 268_435_456,
+    cache_size_kib: int = 65_536,
+    cached_statements: int = 256,
+) -> sqlite3.Connection:
+    """Connexion de lecture (query_only) partageable entre threads, pragmas de lecture.
+
+    Le schéma doit déjà exister (init_db une fois au démarrage) : aucune
+    écriture ni executescript ici.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=cached_statements)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class PoolExhausted(TimeoutError):
+    """Aucune connexion du pool libérée dans le délai : à rendre en 503."""
+
+
+class ConnectionPool:
+    """Pool borné de connexions en lecture (connect_readonly), créé une fois.
+
+    Chaque connexion n'est utilisée que par un thread à la fois ; acquire
+    bloque (au plus timeout secondes) quand toutes sont prises.
+    """
+
+    def __init__(self, db_path: str, size: int = 8, **pragmas):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(self.size):
+            conn = connect_readonly(db_path, **pragmas)
+            # préchauffe : premières pages du schéma et de l'index FTS
+            conn.execute("SELECT COUNT(*) FROM chunks_fts WHERE chunks_fts MATCH 'raglite'").fetchone()
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolExhausted("Aucune connexion SQLite disponible") from None
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Colonnes ajoutées après coup : créées par migration sur les bases existantes
+_ADDED_COLUMNS = {
+    "documents": {
+        "source_root": "TEXT",
+        "size": "INTEGER",
+        "mtime_ns": "INTEGER",
+        "inode": "INTEGER",
+    },
+    "index_runs": {
+        "renamed": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+
+def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM index_meta WHERE key=?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        "INSERT INTO index_meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (key, value),
+    )
+
+
+def get_generation(conn: sqlite3.Connection) -> int:
+    """Génération de l'index : incrémentée à chaque commit qui modifie les chunks."""
+    value = get_meta(conn, "generation")
+    return int(value) if value else 0
+
+
+def bump_generation(conn: sqlite3.Connection) -> None:
+    """À appeler dans la transaction d'écriture, avant son commit."""
+    conn.execute(
+        "INSERT INTO index_meta(key, value) VALUES('generation', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value=CAST(value AS INTEGER) + 1"
+    )
+
+
+def _rebuild_fts_rows(conn: sqlite3.Connection, layout: str) -> None:
+    if layout == "external":
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('rebuild')")
+        return
+    conn.execute("DELETE FROM chunks_fts")
+    conn.execute(
+        """
+        INSERT INTO chunks_fts(rowid, text, chunk_id, doc_id, path, doc_type, rel_folder)
+        SELECT c.id, c.text, c.id, c.doc_id, d.path, d.doc_type, d.rel_folder
+        FROM chunks c JOIN documents d ON d.id = c.doc_id
+        ORDER BY c.id
+        """
+    )
+
+
+def _existing_fts_layout(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name='chunks_fts'").fetchone()
+    if not row:
+        return None
+    return get_meta(conn, "fts_layout") or ("external" if "content=" in row[0].replace(" ", "") else "inline")
+
+
+def fts_layout(conn: sqlite3.Connection) -> str:
+    return _existing_fts_layout(conn) or "inline"
+
+
+def _existing_fts_tokenizer(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name='chunks_fts'").fetchone()
+    if not row:
+        return None
+    return get_meta(conn, "fts_tokenizer") or ("code" if "tokenchars" in row[0] else "unicode61")
+
+
+def fts_tokenizer(conn: sqlite3.Connection) -> str:
+    return _existing_fts_tokenizer(conn) or "unicode61"
+
+
+def has_trigram(conn: sqlite3.Connection) -> bool:
+    return get_meta(conn, "fts_trigram") == "1"
+
+
+def _fts_tables(conn: sqlite3.Connection) -> List[str]:
+    return ["chunks_fts"] + (["chunks_trigram"] if has_trigram(conn) else [])
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    added = set()
+    for table, columns in _ADDED_COLUMNS.items():
+        cols = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+        for name, decl in columns.items():
+            if name not in cols:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+                added.add((table, name))
+    if ("documents", "source_root") in added:
+        conn.execute("UPDATE documents SET source_root = json_extract(meta_json, '$.source_root')")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_root ON documents(source_root)")
+
+
+def _check_choice(name: str, value: Optional[str], choices) -> None:
+    if value is not None and value not in choices:
+        raise ValueError(f"{name} inconnu: {value} (attendu: {', '.join(choices)})")
+
+
+def _ensure_fts(
+    conn: sqlite3.Connection,
+    requested: Optional[str],
+    tokenizer: Optional[str] = None,
+    trigram: Optional[bool] = None,
+) -> None:
+    _check_choice("fts_layout", requested, FTS_LAYOUTS)
+    _check_choice("fts_tokenizer", tokenizer, FTS_TOKENIZERS)
+    layout = _existing_fts_layout(conn)
+    current_tok = _existing_fts_tokenizer(conn)
+    if layout is None:
+        # base neuve : options demandées, enregistrées dans index_meta
+        layout = requested or "inline"
+        current_tok = tokenizer or "unicode61"
+        if trigram:
+            for stmt in _split_sql(_TRIGRAM_SQL):
+                conn.execute(stmt)
+            set_meta(conn, "fts_trigram", "1")
+    else:
+        if requested is not None and requested != layout:
+            raise ValueError(f"Base existante en layout FTS '{layout}' : utilisez la commande migrate pour passer en '{requested}'.")
+        if tokenizer is not None and tokenizer != current_tok:
+            raise ValueError(f"Base existante en tokenizer FTS '{current_tok}' : utilisez la commande migrate pour passer en '{tokenizer}'.")
+        if trigram is not None and trigram != has_trigram(conn):
+            raise ValueError("Index trigramme : utilisez la commande migrate (--trigram / --no-trigram) sur une base existante.")
+    for stmt in _split_sql(_fts_sql(layout, current_tok)):
+        conn.execute(stmt)
+
+    # Invariant : rowid FTS == chunks.id. Vérifié une seule fois par base ;
+    # les anciennes bases (rowid attribué par FTS) sont réalignées.
+    if get_meta(conn, "fts_rowid") != "chunk_id":
+        if layout == "inline" and conn.execute("SELECT 1 FROM chunks_fts WHERE rowid != chunk_id LIMIT 1").fetchone():
+            _rebuild_fts_rows(conn, layout)
+        set_meta(conn, "fts_rowid", "chunk_id")
+    if get_meta(conn, "fts_layout") != layout:
+        set_meta(conn, "fts_layout", layout)
+    if get_meta(conn, "fts_tokenizer") != current_tok:
+        set_meta(conn, "fts_tokenizer", current_tok)
+
+
+def _ensure_xref(conn: sqlite3.Connection) -> None:
+    # base neuve : symboles extraits à l'écriture des chunks ; base antérieure aux
+    # tables symbols/refs : complétée par backfill_xref (appelé par index_root)
+    if get_meta(conn, "xref") is None and not conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone():
+        set_meta(conn, "xref", "1")
+
+
+def _split_sql(script: str) -> List[str]:
+    # executescript validerait la transaction en cours : instructions une à une
+    stmts: List[str] = []
+    buf = ""
+    for line in script.strip().splitlines():
+        buf += line + "\n"
+        if sqlite3.complete_statement(buf):
+            stmts.append(buf.strip())
+            buf = ""
+    return stmts
+
+
+def init_db(
+    conn: sqlite3.Connection,
+    fts_layout: Optional[str] = None,
+    fts_tokenizer: Optional[str] = None,
+    trigram: Optional[bool] = None,
+) -> None:
+    """Crée/migre le schéma. fts_layout, fts_tokenizer et trigram ne s'appliquent
+    qu'à une base neuve (migrate_fts pour une base existante)."""
     try:
         conn.executescript(SCHEMA_SQL)
+        _migrate(conn)
+        _ensure_fts(conn, fts_layout, fts_tokenizer, trigram)
+        _ensure_xref(conn)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
         conn.commit()
     except sqlite3.OperationalError as e:
         msg = str(e).lower()
         if "fts5" in msg or "no such module" in msg:
             raise RuntimeError("SQLite FTS5 indisponible. Utilisez une distribution Python/SQLite incluant FTS5.") from e
+        if "trigram" in msg:
+            raise RuntimeError("Tokenizer FTS5 trigram indisponible (SQLite >= 3.34 requis).") from e
         raise
 
 
-def upsert_document(conn: sqlite3.Connection, doc: Document, mtime: int, file_hash: str) -> None:
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """init_db seulement si la base n'est pas à SCHEMA_VERSION : sur une base à jour,
+    une lecture de l'en-tête au lieu de l'executescript et des vérifications."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        init_db(conn)
+
+
+def migrate_fts(
+    conn: sqlite3.Connection,
+    layout: Optional[str] = None,
+    vacuum: bool = True,
+    tokenizer: Optional[str] = None,
+    trigram: Optional[bool] = None,
+    rebuild: bool = False,
+) -> None:
+    """Reconstruit en place chunks_fts (disposition et/ou tokenizer) et crée ou
+    supprime l'index trigramme. Les options None conservent l'état actuel ;
+    rebuild=True reconstruit chunks_fts même sans changement."""
+    _check_choice("fts_layout", layout, FTS_LAYOUTS)
+    _check_choice("fts_tokenizer", tokenizer, FTS_TOKENIZERS)
+    init_db(conn)
+    layout = layout or fts_layout(conn)
+    tokenizer = tokenizer or fts_tokenizer(conn)
+    if rebuild or layout != fts_layout(conn) or tokenizer != fts_tokenizer(conn):
+        for trig in ("chunks_fts_ai", "chunks_fts_ad", "chunks_fts_au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trig}")
+        conn.execute("DROP TABLE IF EXISTS chunks_fts")
+        for stmt in _split_sql(_fts_sql(layout, tokenizer)):
+            conn.execute(stmt)
+        _rebuild_fts_rows(conn, layout)
+        set_meta(conn, "fts_layout", layout)
+        set_meta(conn, "fts_tokenizer", tokenizer)
+    if trigram is not None and trigram != has_trigram(conn):
+        for trig in ("chunks_trigram_ai", "chunks_trigram_ad", "chunks_trigram_au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trig}")
+        conn.execute("DROP TABLE IF EXISTS chunks_trigram")
+        if trigram:
+            for stmt in _split_sql(_TRIGRAM_SQL):
+                conn.execute(stmt)
+            conn.execute("INSERT INTO chunks_trigram(chunks_trigram) VALUES('rebuild')")
+        set_meta(conn, "fts_trigram", "1" if trigram else "0")
+    bump_generation(conn)
+    conn.commit()
+    if vacuum:
+        conn.execute("VACUUM")
+
+
+def upsert_document(
+    conn: sqlite3.Connection,
+    doc: Document,
+    mtime: int,
+    file_hash: str,
+    stat: Optional[FileStat] = None,
+) -> None:
     conn.execute(
         """
-        INSERT INTO documents(id, path, rel_folder, doc_type, mtime, sha256, meta_json)
-        VALUES(?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO documents(id, path, rel_folder, doc_type, mtime, sha256, meta_json, source_root, size, mtime_ns, inode)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT(id) DO UPDATE SET
           path=excluded.path,
           rel_folder=excluded.rel_folder,
           doc_type=excluded.doc_type,
           mtime=excluded.mtime,
           sha256=excluded.sha256,
-          meta_json=excluded.meta_json;
+          meta_json=excluded.meta_json,
+          source_root=excluded.source_root,
+          size=excluded.size,
+          mtime_ns=excluded.mtime_ns,
+          inode=excluded.inode;
         """,
-        (doc.doc_id, doc.path, doc.rel_folder, doc.doc_type, mtime, file_hash, json.dumps(doc.meta, ensure_ascii=False)),
+        (
+            doc.doc_id, doc.path, doc.rel_folder, doc.doc_type, mtime, file_hash,
+            json.dumps(doc.meta, ensure_ascii=False), doc.meta.get("source_root"),
+            stat.size if stat else None, stat.mtime_ns if stat else None, stat.inode if stat else None,
+        ),
     )
 
 
-def should_reindex(conn: sqlite3.Connection, doc_id: str, file_hash: str) -> bool:
+def update_document_stat(conn: sqlite3.Connection, doc_id: str, stat: FileStat) -> None:
+    """Met à jour l'état fichier (contenu inchangé, ex. fichier touché)."""
+    conn.execute(
+        "UPDATE documents SET mtime=?, size=?, mtime_ns=?, inode=? WHERE id=?",
+        (stat.mtime_ns // 1_000_000_000, stat.size, stat.mtime_ns, stat.inode, doc_id),
+    )
+
+
+def load_document_states(conn: sqlite3.Connection, source_root: str) -> Dict[str, sqlite3.Row]:
+    """Charge en une requête l'état (sha256, size, mtime_ns, inode) des documents d'une racine."""
+    rows = conn.execute(
+        "SELECT id, path, doc_type, sha256, size, mtime_ns, inode FROM documents WHERE source_root=?",
+        (source_root,),
+    ).fetchall()
+    return {r["id"]: r for r in rows}
+
+
+def record_index_run(conn: sqlite3.Connection, journal: Dict) -> None:
+    conn.execute(
+        """
+        INSERT INTO index_runs(source_root, started_at, finished_at, scanned, added, modified, deleted, renamed, unchanged, ignored, timings_json)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            journal["source_root"], journal["started_at"], journal["finished_at"], journal["scanned"],
+            journal["added"], journal["modified"], journal["deleted"], journal["renamed"], journal["unchanged"],
+            journal["ignored"], json.dumps(journal["timings"], ensure_ascii=False),
+        ),
+    )
+    conn.commit()
+
+
+def get_document_hash(conn: sqlite3.Connection, doc_id: str) -> Optional[str]:
     row = conn.execute("SELECT sha256 FROM documents WHERE id=?", (doc_id,)).fetchone()
-    if not row:
-        return True
-    return row["sha256"] != file_hash
+    return row["sha256"] if row else None
+
+
+def should_reindex(conn: sqlite3.Connection, doc_id: str, file_hash: str) -> bool:
+    return get_document_hash(conn, doc_id) != file_hash
+
+
+def _invalidate_answers(conn: sqlite3.Connection, doc_ids: List[str]) -> None:
+    # une requête par lot de documents (pas de trigger par chunk : coût nul à l'indexation)
+    marks = ",".join("?" * len(doc_ids))
+    conn.execute(
+        f"DELETE FROM answer_cache WHERE key IN (SELECT key FROM answer_cache_chunks WHERE doc_id IN ({marks}))",
+        doc_ids,
+    )
+
+
+def _drop_vectors(conn: sqlite3.Connection, doc_ids: List[str]) -> None:
+    marks = ",".join("?" * len(doc_ids))
+    conn.execute(f"DELETE FROM chunk_vectors WHERE chunk_id IN (SELECT id FROM chunks WHERE doc_id IN ({marks}))", doc_ids)
+
+
+def _drop_xref(conn: sqlite3.Connection, doc_ids: List[str]) -> None:
+    marks = ",".join("?" * len(doc_ids))
+    for table in ("symbols", "refs"):
+        conn.execute(f"DELETE FROM {table} WHERE chunk_id IN (SELECT id FROM chunks WHERE doc_id IN ({marks}))", doc_ids)
 
 
-def replace_chunks(conn: sqlite3.Connection, doc: Document, chunks: List[Chunk]) -> None:
+def _write_xref(conn: sqlite3.Connection, chunk_ids: List[int], xrefs: List[ChunkXref]) -> None:
+    """Définitions et références de chunks déjà insérés (xrefs aligné sur chunk_ids)."""
+    conn.executemany(
+        "INSERT INTO symbols(chunk_id, kind, name, line) VALUES(?, ?, ?, ?)",
+        [(cid, *row) for cid, x in zip(chunk_ids, xrefs) for row in x[1]],
+    )
+    conn.executemany(
+        "INSERT INTO refs(chunk_id, kind, name, line, caller) VALUES(?, ?, ?, ?, ?)",
+        [(cid, *row) for cid, x in zip(chunk_ids, xrefs) for row in x[2]],
+    )
+
+
+# Lot de chunks insérés ensemble quand ils arrivent en flux (replace_chunks)
+CHUNK_BATCH = 256
+
+
+def _insert_chunks(conn: sqlite3.Connection, doc: Document, chunks: List[Chunk], xrefs: List[ChunkXref]) -> int:
+    conn.executemany(
+        "INSERT INTO chunks(doc_id, chunk_index, start_line, end_line, text, kind, meta_json) VALUES(?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                doc.doc_id, ch.chunk_index, ch.start_line, ch.end_line, ch.text, ch.kind,
+                json.dumps(dict(ch.meta, features=x[0]) if x[0] else ch.meta, ensure_ascii=False),
+            )
+            for ch, x in zip(chunks, xrefs)
+        ],
+    )
+    if chunks and any(x[1] or x[2] for x in xrefs):
+        by_index = dict(conn.execute(
+            "SELECT chunk_index, id FROM chunks WHERE doc_id=? AND chunk_index BETWEEN ? AND ?",
+            (doc.doc_id, min(ch.chunk_index for ch in chunks), max(ch.chunk_index for ch in chunks)),
+        ).fetchall())
+        _write_xref(conn, [by_index[ch.chunk_index] for ch in chunks], xrefs)
+    return sum(len(ch.text) for ch in chunks)
+
+
+def replace_chunks(
+    conn: sqlite3.Connection, doc: Document, chunks: Iterable[Chunk], xrefs: Optional[List[ChunkXref]] = None
+) -> int:
+    """Remplace les chunks d'un document ; renvoie le nombre de caractères écrits.
+
+    xrefs (symbols.analyze_chunks, calculé par le worker d'indexation) : features
+    rangées dans meta_json, symboles et références dans symbols/refs. Sans xrefs,
+    chunks peut être un itérateur (lecture en flux) : consommé et analysé par lots
+    de CHUNK_BATCH.
+    """
+    # chunks_fts est maintenu par les triggers de chunks (cf. _FTS_SQL)
+    _invalidate_answers(conn, [doc.doc_id])
+    _drop_vectors(conn, [doc.doc_id])
+    _drop_xref(conn, [doc.doc_id])
     conn.execute("DELETE FROM chunks WHERE doc_id=?", (doc.doc_id,))
-    conn.execute("DELETE FROM chunks_fts WHERE doc_id=?", (doc.doc_id,))
+    if xrefs is not None:
+        chunks = list(chunks)
+        return _insert_chunks(conn, doc, chunks, xrefs)
+    analyzer = XrefAnalyzer(doc.doc_type)
+    written = 0
+    it = iter(chunks)
+    while True:
+        part = list(islice(it, CHUNK_BATCH))
+        if not part:
+            return written
+        written += _insert_chunks(conn, doc, part, analyzer.analyze(part))
+
+
+def relink_document(
+    conn: sqlite3.Connection,
+    old_doc_id: str,
+    doc: Document,
+    mtime: int,
+    file_hash: str,
+    stat: Optional[FileStat] = None,
+) -> None:
+    """Renommage : rattache les chunks existants de old_doc_id au nouveau document (sans re-chunking)."""
+    upsert_document(conn, doc, mtime, file_hash, stat)
+    _invalidate_answers(conn, [old_doc_id])
+    conn.execute(
+        "UPDATE chunks SET doc_id=?, meta_json=json_set(meta_json, '$.path', ?) WHERE doc_id=?",
+        (doc.doc_id, doc.path, old_doc_id),
+    )
+    conn.execute("DELETE FROM documents WHERE id=?", (old_doc_id,))
+
+
+def delete_documents(conn: sqlite3.Connection, doc_ids: Iterable[str], batch_size: int = 500) -> int:
+    """Supprime des documents et leurs chunks par lots (chunks_fts suit via triggers)."""
+    ids = list(doc_ids)
+    for i in range(0, len(ids), batch_size):
+        part = ids[i:i + batch_size]
+        marks = ",".join("?" * len(part))
+        _invalidate_answers(conn, part)
+        _drop_vectors(conn, part)
+        _drop_xref(conn, part)
+        conn.execute(f"DELETE FROM chunks WHERE doc_id IN ({marks})", part)
+        conn.execute(f"DELETE FROM documents WHERE id IN ({marks})", part)
+    return len(ids)
+
+
+class BulkWriter:
+    """Écriture groupée de documents : plusieurs documents par transaction.
+
+    La transaction est validée dès que batch_docs documents ou batch_bytes
+    octets de texte ont été écrits. Chaque document est isolé par un
+    SAVEPOINT : une erreur n'annule que ce document.
+
+    bulk_load=True (reconstruction complète) : synchronous=OFF, cache plus
+    grand et fusion FTS différée pendant le chargement, puis 'optimize' FTS
+    et restauration des réglages à la fermeture.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        batch_docs: int = 200,
+        batch_bytes: int = 32_000_000,
+        bulk_load: bool = False,
+        cache_size_kib: int = 262_144,
+    ):
+        self.conn = conn
+        self.batch_docs = max(1, batch_docs)
+        self.batch_bytes = max(1, batch_bytes)
+        self.bulk_load = bulk_load
+        self._pending_docs = 0
+        self._pending_bytes = 0
+        self._changed = False
+        self._saved_pragmas: Dict[str, int] = {}
+        if bulk_load:
+            for name in ("synchronous", "cache_size"):
+                self._saved_pragmas[name] = int(conn.execute(f"PRAGMA {name}").fetchone()[0])
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+            for table in _fts_tables(conn):
+                conn.execute(f"INSERT INTO {table}({table}, rank) VALUES('automerge', 0)")
+            conn.commit()
+
+    def write(
+        self,
+        doc: Document,
+        mtime: int,
+        file_hash: str,
+        chunks: List[Chunk],
+        stat: Optional[FileStat] = None,
+        xrefs: Optional[List[ChunkXref]] = None,
+    ) -> None:
+        conn = self.conn
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT raglite_doc")
+        try:
+            upsert_document(conn, doc, mtime, file_hash, stat)
+            written = replace_chunks(conn, doc, chunks, xrefs)
+        except Exception:
+            conn.execute("ROLLBACK TO raglite_doc")
+            conn.execute("RELEASE raglite_doc")
+            raise
+        conn.execute("RELEASE raglite_doc")
+        self._written(written)
+
+    def write_stream(
+        self,
+        doc: Document,
+        mtime: int,
+        chunks: Iterable[Chunk],
+        digest: Callable[[], str],
+        stat: Optional[FileStat] = None,
+        keep: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[str, bool]:
+        """write pour un document lu en flux : chunks consommés par lots, sha256
+        connu seulement une fois le flux épuisé (digest()). keep(sha256) faux
+        (contenu inchangé, renommage) : écriture annulée, le document garde son
+        état antérieur. Renvoie (sha256, écrit)."""
+        conn = self.conn
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT raglite_doc")
+        try:
+            upsert_document(conn, doc, mtime, "", stat)
+            written = replace_chunks(conn, doc, chunks)
+            file_hash = digest()
+            if keep is not None and not keep(file_hash):
+                conn.execute("ROLLBACK TO raglite_doc")
+                conn.execute("RELEASE raglite_doc")
+                return file_hash, False
+            conn.execute("UPDATE documents SET sha256=? WHERE id=?", (file_hash, doc.doc_id))
+        except Exception:
+            conn.execute("ROLLBACK TO raglite_doc")
+            conn.execute("RELEASE raglite_doc")
+            raise
+        conn.execute("RELEASE raglite_doc")
+        self._written(written)
+        return file_hash, True
+
+    def _written(self, n_bytes: int) -> None:
+        self._pending_docs += 1
+        self._pending_bytes += n_bytes
+        self._changed = True
+        self._maybe_commit()
+
+    def relink(
+        self,
+        old_doc_id: str,
+        doc: Document,
+        mtime: int,
+        file_hash: str,
+        stat: Optional[FileStat] = None,
+    ) -> None:
+        relink_document(self.conn, old_doc_id, doc, mtime, file_hash, stat)
+        self._pending_docs += 1
+        self._changed = True
+        self._maybe_commit()
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        n = delete_documents(self.conn, doc_ids)
+        self._pending_docs += n
+        self._changed = self._changed or n > 0
+        self._maybe_commit()
+        return n
+
+    def touch(self, doc_id: str, stat: FileStat) -> None:
+        update_document_stat(self.conn, doc_id, stat)
+        self._pending_docs += 1
+        self._maybe_commit()
 
-    for ch in chunks:
-        cur = conn.execute(
-            "INSERT INTO chunks(doc_id, chunk_index, start_line, end_line, text, kind, meta_json) VALUES(?, ?, ?, ?, ?, ?, ?)",
-            (doc.doc_id, ch.chunk_index, ch.start_line, ch.end_line, ch.text, ch.kind, json.dumps(ch.meta, ensure_ascii=False)),
+    def _maybe_commit(self) -> None:
+        if self._pending_docs >= self.batch_docs or self._pending_bytes >= self.batch_bytes:
+            self.commit()
+
+    def commit(self) -> None:
+        # les caches de requêtes (cache.py) comparent cette génération
+        if self._changed:
+            bump_generation(self.conn)
+            self._changed = False
+        self.conn.commit()
+        self._pending_docs = 0
+        self._pending_bytes = 0
+
+    def close(self) -> None:
+        self.commit()
+        if self.bulk_load:
+            conn = self.conn
+            for table in _fts_tables(conn):
+                conn.execute(f"INSERT INTO {table}({table}, rank) VALUES('automerge', 4)")
+                conn.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+            conn.commit()
+            for name, value in self._saved_pragmas.items():
+                conn.execute(f"PRAGMA {name}={value}")
+            self.bulk_load = False
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Les documents déjà écrits sont complets (SAVEPOINT) : on les valide
+        self.close()
+
+
+def _escape_fts5_query(q: str) -> str:
+    """Requête entière en une phrase FTS5 (première étape de plan_fts_query)."""
+    return escape_phrase(q)
+
+
+def filter_subquery(doc_type: Optional[str], scope: Optional[str]) -> Tuple[str, List]:
+    """SELECT des ids de chunks candidats (doc_type / préfixe de dossier), servi par index.
+
+    scope est un préfixe de rel_folder, insensible à la casse ASCII comme
+    l'ancien LIKE, exprimé en intervalle pour utiliser les index *_nc de documents.
+    ("", []) sans filtre.
+    """
+    preds: List[str] = []
+    params: List = []
+    if doc_type:
+        preds.append("d.doc_type = ?")
+        params.append(doc_type)
+    if scope:
+        preds.append("d.rel_folder >= ? COLLATE NOCASE AND d.rel_folder < ? COLLATE NOCASE")
+        params += [scope, scope + "\U0010ffff"]
+    if not preds:
+        return "", []
+    return "SELECT c.id FROM documents d JOIN chunks c ON c.doc_id = d.id WHERE " + " AND ".join(preds), params
+
+
+def _filter_sql(doc_type: Optional[str], scope: Optional[str], table: str = "chunks_fts") -> Tuple[str, List]:
+    """Filtre de search_fts : semi-jointure sur filter_subquery."""
+    sub, params = filter_subquery(doc_type, scope)
+    if not sub:
+        return "", []
+    return f"AND +{table}.rowid IN ({sub})", params
+
+
+# Fusion hybride bm25 + vecteurs : reciprocal rank fusion, k usuel
+RRF_K = 60
+
+
+def _hit_rows(
+    conn: sqlite3.Connection, q_escaped: str, ids: List[int], hydrate: bool, table: str = "chunks_fts"
+) -> Dict[int, sqlite3.Row]:
+    """Métadonnées + snippet FTS des chunks ids (qui correspondent à la requête dans table)."""
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    return {
+        int(r["chunk_id"]): r
+        for r in conn.execute(
+            f"""
+            SELECT
+              c.id AS chunk_id,
+              d.path,
+              d.doc_type,
+              d.rel_folder,
+              snippet({table}, 0, '<<<', '>>>', ' … ', 24) AS snip
+              {", c.start_line, c.end_line, c.kind, c.text" if hydrate else ""}
+            FROM {table}
+            JOIN chunks c ON c.id = {table}.rowid
+            JOIN documents d ON d.id = c.doc_id
+            WHERE {table} MATCH ? AND {table}.rowid IN ({marks});
+            """,
+            [q_escaped, *ids],
         )
-        chunk_id = int(cur.lastrowid)
-        conn.execute(
-            "INSERT INTO chunks_fts(text, chunk_id, doc_id, path, doc_type, rel_folder) VALUES(?, ?, ?, ?, ?, ?)",
-            (ch.text, chunk_id, doc.doc_id, doc.path, doc.doc_type, doc.rel_folder),
+    }
+
+
+def _plain_rows(conn: sqlite3.Connection, ids: List[int], hydrate: bool) -> Dict[int, sqlite3.Row]:
+    """Comme _hit_rows pour des chunks hors MATCH (voie vectorielle) : début du texte en snippet."""
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    return {
+        int(r["chunk_id"]): r
+        for r in conn.execute(
+            f"""
+            SELECT c.id AS chunk_id, d.path, d.doc_type, d.rel_folder, substr(c.text, 1, 160) AS snip
+              {", c.start_line, c.end_line, c.kind, c.text" if hydrate else ""}
+            FROM chunks c
+            JOIN documents d ON d.id = c.doc_id
+            WHERE c.id IN ({marks});
+            """,
+            ids,
         )
+    }
 
 
-def _escape_fts5_query(q: str) -> str:
-    """Échappe une requête pour FTS5.
-    
-    FTS5 a une syntaxe spéciale. Pour éviter les erreurs :
-    - Remplacer les apostrophes par des espaces
-    - Échapper les guillemets doubles
-    - Mettre la requête entre guillemets doubles pour forcer une recherche de phrase
+def _make_hit(r: sqlite3.Row, rank: float, score: float, hydrate: bool) -> Dict:
+    hit = {
+        "chunk_id": int(r["chunk_id"]),
+        "path": r["path"],
+        "doc_type": r["doc_type"],
+        "rel_folder": r["rel_folder"],
+        "rank": rank,
+        "score": score,
+        "snippet": r["snip"],
+    }
+    if hydrate:
+        hit.update(start_line=r["start_line"], end_line=r["end_line"], kind=r["kind"], text=r["text"])
+    return hit
+
+
+def _stage_table(stage: str) -> str:
+    return "chunks_trigram" if stage == "substring" else "chunks_fts"
+
+
+def _ranked_ids(
+    conn: sqlite3.Connection,
+    q: str,
+    depth: int,
+    doc_type: Optional[str],
+    scope: Optional[str],
+    stages: Optional[List[Dict]],
+    deadline: Optional[float] = None,
+) -> Dict[int, Tuple[float, str, str]]:
+    """{chunk_id: (bm25, étape, expression MATCH)} dans l'ordre du classement.
+
+    Étapes de plan_fts_query exécutées tant que moins de depth chunks ont été
+    trouvés : les résultats d'une étape plus stricte restent devant. L'étape
+    "substring" interroge l'index trigramme (si la base en a un).
+    deadline (time.perf_counter()) : pas de nouvelle étape au-delà, si des
+    chunks ont déjà été trouvés.
     """
-    # Remplacer les apostrophes simples et typographiques par des espaces
-    q_clean = q.replace("'", " ").replace("'", " ").replace("'", " ").replace("'", " ")
-    # Nettoyer les espaces multiples
-    q_clean = " ".join(q_clean.split())
-    if not q_clean:
-        return '""'
-    # Échapper les guillemets doubles en les doublant
-    q_escaped = q_clean.replace('"', '""')
-    # Mettre entre guillemets doubles pour forcer une recherche de phrase
-    # Cela évite que FTS5 interprète les mots comme des opérateurs ou colonnes
-    return f'"{q_escaped}"'
+    # 1) top-k par bm25, les filtres restreignant les candidats avant le calcul
+    #    du score (semi-jointure sur documents indexé, pas de LIKE post-MATCH) ;
+    # 2) snippet + métadonnées calculés ensuite pour ces k lignes seulement.
+    # rowid FTS == chunks.id, valable pour les deux dispositions FTS.
+    found: Dict[int, Tuple[float, str, str]] = {}
+    for stage, expr in plan_fts_query(q, substring=has_trigram(conn)):
+        table = _stage_table(stage)
+        filter_sql, filter_params = _filter_sql(doc_type, scope, table)
+        t0 = time.perf_counter()
+        rows = conn.execute(
+            f"""
+            SELECT {table}.rowid AS id, bm25({table}) AS rank
+            FROM {table}
+            WHERE {table} MATCH ? {filter_sql}
+            ORDER BY rank
+            LIMIT ?;
+            """,
+            [expr, *filter_params, depth],
+        ).fetchall()
+        before = len(found)
+        for r in rows:
+            if len(found) >= depth:
+                break
+            if int(r["id"]) not in found:
+                found[int(r["id"])] = (float(r["rank"]) if r["rank"] is not None else 9999.0, stage, expr)
+        if stages is not None:
+            stages.append({
+                "stage": stage,
+                "query": expr,
+                "hits": len(rows),
+                "new": len(found) - before,
+                "ms": round((time.perf_counter() - t0) * 1000, 3),
+            })
+        if len(found) >= depth:
+            break
+        if deadline is not None and found and time.perf_counter() >= deadline:
+            break
+    return found
+
+
+def _match_rows(conn: sqlite3.Connection, found: Dict[int, Tuple[float, str, str]], ids: List[int], hydrate: bool) -> Dict[int, sqlite3.Row]:
+    """_hit_rows par expression MATCH (le snippet surligne les termes de l'étape qui a trouvé le chunk)."""
+    by_expr: Dict[Tuple[str, str], List[int]] = {}
+    for cid in ids:
+        by_expr.setdefault(found[cid][1:], []).append(cid)
+    details: Dict[int, sqlite3.Row] = {}
+    for (stage, expr), part in by_expr.items():
+        details.update(_hit_rows(conn, expr, part, hydrate, _stage_table(stage)))
+    return details
 
 
 def search_fts(
@@ -130,49 +1026,90 @@ def search_fts(
     top_k: int = 10,
     doc_type: Optional[str] = None,
     scope: Optional[str] = None,
+    hydrate: bool = False,
+    hybrid: bool = False,
+    stages: Optional[List[Dict]] = None,
+    deadline: Optional[float] = None,
 ) -> List[Dict]:
-    # Échapper la requête pour FTS5
-    q_escaped = _escape_fts5_query(q)
-    # Construire la requête SQL avec la syntaxe FTS5 correcte
-    # Utiliser des paramètres liés pour éviter les injections SQL
-    query_sql = """
-        SELECT
-          chunk_id,
-          path,
-          doc_type,
-          rel_folder,
-          bm25(chunks_fts) AS rank,
-          snippet(chunks_fts, 0, '<<<', '>>>', ' … ', 24) AS snip
-        FROM chunks_fts
-        WHERE chunks_fts MATCH ?
-          AND (? IS NULL OR doc_type = ?)
-          AND (? IS NULL OR rel_folder LIKE ? || '%')
-        ORDER BY rank
-        LIMIT ?;
+    """Recherche FTS. hydrate=True ajoute start_line, end_line, kind et text
+    à chaque hit, lus dans la même requête (pas de get_chunk par hit).
+
+    La requête est planifiée (store.fts_query) : phrase exacte, puis termes
+    significatifs proches (NEAR), puis n'importe lequel (OR), puis sous-chaînes
+    (index trigramme optionnel), chaque étape n'étant tentée que si les
+    précédentes ont trouvé moins de top_k chunks.
+    hit["stage"] indique l'étape d'origine ; stages (liste fournie par
+    l'appelant) reçoit {stage, query, hits, new, ms} par étape exécutée.
+    score = b / (1 + b), b = -bm25 (bm25 FTS5 négatif, plus bas = meilleur) :
+    dans [0, 1[, croissant avec la pertinence. deadline : voir _ranked_ids.
+
+    hybrid=True : fusionne (RRF) le classement bm25 et celui des embeddings
+    (embeddings.vector_search) si l'index en contient ; score = score RRF,
+    vector_score = similarité cosinus (None hors voie vectorielle).
     """
-    rows = conn.execute(
-        query_sql,
-        (q_escaped, doc_type, doc_type, scope, scope, top_k),
-    ).fetchall()
+    depth = max(top_k * 5, 50) if hybrid else top_k
+    found = _ranked_ids(conn, q, depth, doc_type, scope, stages, deadline)
+    if hybrid:
+        return _search_hybrid(conn, q, found, top_k, depth, doc_type, scope, hydrate)
+    if not found:
+        return []
 
+    details = _match_rows(conn, found, list(found), hydrate)
     hits: List[Dict] = []
-    for r in rows:
-        rank = float(r["rank"]) if r["rank"] is not None else 9999.0
-        score = 1.0 / (1.0 + max(0.0, rank))
-        hits.append(
-            {
-                "chunk_id": int(r["chunk_id"]),
-                "path": r["path"],
-                "doc_type": r["doc_type"],
-                "rel_folder": r["rel_folder"],
-                "rank": rank,
-                "score": score,
-                "snippet": r["snip"],
-            }
-        )
+    for cid, (rank, stage, _) in found.items():
+        r = details.get(cid)
+        if r is None:
+            continue
+        hits.append(_make_hit(r, rank, bm25_score(rank), hydrate))
+        hits[-1]["stage"] = stage
+    return hits
+
+
+def bm25_score(rank: float) -> float:
+    """bm25 FTS5 (négatif, plus bas = meilleur) -> [0, 1[, croissant avec la pertinence."""
+    b = max(0.0, -rank)
+    return b / (1.0 + b)
+
+
+def _search_hybrid(
+    conn: sqlite3.Connection,
+    q: str,
+    found: Dict[int, Tuple[float, str, str]],
+    top_k: int,
+    depth: int,
+    doc_type: Optional[str],
+    scope: Optional[str],
+    hydrate: bool,
+) -> List[Dict]:
+    # import local : embeddings s'appuie sur ce module
+    from embeddings import vector_search
+
+    vectors = dict(vector_search(conn, q, depth, doc_type=doc_type, scope=scope))
+    fused: Dict[int, float] = {}
+    for ranking in (list(found), list(vectors)):
+        for pos, cid in enumerate(ranking):
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (RRF_K + pos + 1)
+    order = sorted(fused, key=lambda cid: -fused[cid])[:top_k]
+
+    details = _match_rows(conn, found, [cid for cid in order if cid in found], hydrate)
+    details.update(_plain_rows(conn, [cid for cid in order if cid not in found], hydrate))
+    hits: List[Dict] = []
+    for cid in order:
+        r = details.get(cid)
+        if r is None:
+            continue
+        rank, stage, _ = found.get(cid, (9999.0, "vector", ""))
+        hits.append(_make_hit(r, rank, fused[cid], hydrate))
+        hits[-1]["stage"] = stage
+        hits[-1]["vector_score"] = vectors.get(cid)
     return hits
 
 
+def drop_text(hit: Dict) -> Dict:
+    """Hit hydraté sans le texte du chunk (sorties JSON)."""
+    return {k: v for k, v in hit.items() if k != "text"}
+
+
 def get_chunk(conn: sqlite3.Connection, chunk_id: int) -> Dict:
     row = conn.execute(
         """
@@ -187,3 +1124,220 @@ def get_chunk(conn: sqlite3.Connection, chunk_id: int) -> Dict:
     if not row:
         raise KeyError(f"chunk_id not found: {chunk_id}")
     return dict(row)
+
+
+def get_chunks(conn: sqlite3.Connection, chunk_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Version groupée de get_chunk : {chunk_id: chunk}, ids absents ignorés."""
+    ids = [int(i) for i in chunk_ids]
+    out: Dict[int, Dict] = {}
+    for i in range(0, len(ids), 500):
+        part = ids[i:i + 500]
+        marks = ",".join("?" * len(part))
+        for row in conn.execute(
+            f"""
+            SELECT c.id as chunk_id, c.doc_id, c.chunk_index, c.start_line, c.end_line, c.kind, c.text,
+                   d.path, d.doc_type, d.rel_folder
+            FROM chunks c
+            JOIN documents d ON d.id = c.doc_id
+            WHERE c.id IN ({marks});
+            """,
+            part,
+        ):
+            out[int(row["chunk_id"])] = dict(row)
+    return out
+
+
+def chunk_fingerprints(conn: sqlite3.Connection, chunk_ids: Iterable[int]) -> Dict[int, Tuple[str, str]]:
+    """{chunk_id: (doc_id, sha256 du document source)} pour les ids existants."""
+    ids = [int(i) for i in chunk_ids]
+    out: Dict[int, Tuple[str, str]] = {}
+    for i in range(0, len(ids), 500):
+        part = ids[i:i + 500]
+        marks = ",".join("?" * len(part))
+        for row in conn.execute(
+            f"SELECT c.id, d.id, d.sha256 FROM chunks c JOIN documents d ON d.id = c.doc_id WHERE c.id IN ({marks})",
+            part,
+        ):
+            out[int(row[0])] = (row[1], row[2])
+    return out
+
+
+def answer_cache_get(conn: sqlite3.Connection, key: str, ttl_s: float) -> Optional[Dict]:
+    """Réponse en cache si présente et plus récente que ttl_s (lecture seule)."""
+    row = conn.execute(
+        "SELECT result_json FROM answer_cache WHERE key=? AND created_at >= ?",
+        (key, time.time() - ttl_s),
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def answer_cache_put(
+    conn: sqlite3.Connection,
+    key: str,
+    model: str,
+    chunk_docs: Dict[int, str],
+    result: Dict,
+    *,
+    ttl_s: float,
+    max_bytes: int,
+) -> None:
+    """Enregistre une réponse (chunk_docs : {chunk_id: doc_id} cités) puis évince les
+    entrées expirées et les plus anciennes au-delà de max_bytes."""
+    data = json.dumps(result, ensure_ascii=False)
+    with conn:
+        conn.execute("DELETE FROM answer_cache WHERE key=?", (key,))
+        conn.execute(
+            "INSERT INTO answer_cache(key, model, created_at, size, result_json) VALUES(?, ?, ?, ?, ?)",
+            (key, model, time.time(), len(data), data),
+        )
+        conn.executemany(
+            "INSERT INTO answer_cache_chunks(key, chunk_id, doc_id) VALUES(?, ?, ?)",
+            [(key, int(cid), doc_id) for cid, doc_id in chunk_docs.items()],
+        )
+        conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (time.time() - ttl_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM answer_cache").fetchone()[0]
+        if total > max_bytes:
+            # plus anciennes d'abord, jusqu'à repasser sous la limite
+            excess = total - max_bytes
+            drop: List[str] = []
+            for row in conn.execute("SELECT key, size FROM answer_cache ORDER BY created_at"):
+                if excess <= 0:
+                    break
+                drop.append(row[0])
+                excess -= row[1]
+            conn.executemany("DELETE FROM answer_cache WHERE key=?", [(k,) for k in drop])
+
+
+def answer_cache_stats(conn: sqlite3.Connection) -> Dict:
+    row = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answer_cache").fetchone()
+    return {"entries": row[0], "bytes": row[1]}
+
+
+def chunk_ids_without_vector(conn: sqlite3.Connection) -> List[int]:
+    return [
+        int(r[0])
+        for r in conn.execute(
+            "SELECT c.id FROM chunks c WHERE NOT EXISTS (SELECT 1 FROM chunk_vectors v WHERE v.chunk_id = c.id) ORDER BY c.id"
+        )
+    ]
+
+
+def chunk_texts(conn: sqlite3.Connection, chunk_ids: List[int]) -> List[Tuple[int, str]]:
+    marks = ",".join("?" * len(chunk_ids))
+    return [(int(r[0]), r[1]) for r in conn.execute(f"SELECT id, text FROM chunks WHERE id IN ({marks})", chunk_ids)]
+
+
+def chunk_vectors(conn: sqlite3.Connection, chunk_ids: List[int]) -> List[Tuple[int, float, bytes]]:
+    """(chunk_id, échelle, vecteur int8) des chunks qui en ont un."""
+    if not chunk_ids:
+        return []
+    marks = ",".join("?" * len(chunk_ids))
+    rows = conn.execute(f"SELECT chunk_id, scale, vec FROM chunk_vectors WHERE chunk_id IN ({marks})", chunk_ids)
+    return [(int(r[0]), float(r[1]), r[2]) for r in rows]
+
+
+def write_vectors(conn: sqlite3.Connection, rows: Iterable[Tuple[int, float, bytes]]) -> None:
+    conn.executemany("INSERT OR REPLACE INTO chunk_vectors(chunk_id, scale, vec) VALUES(?, ?, ?)", rows)
+
+
+def iter_vectors(conn: sqlite3.Connection) -> Iterator[Tuple[int, float, bytes]]:
+    for r in conn.execute("SELECT chunk_id, scale, vec FROM chunk_vectors ORDER BY chunk_id"):
+        yield int(r[0]), float(r[1]), r[2]
+
+
+def clear_vectors(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM chunk_vectors")
+
+
+def backfill_xref(conn: sqlite3.Connection) -> int:
+    """Base antérieure aux tables symbols/refs : extrait features, symboles et
+    références des chunks existants (une fois, index_meta 'xref'). Renvoie le
+    nombre de chunks traités."""
+    n = 0
+    for doc_id, doc_type in conn.execute("SELECT id, doc_type FROM documents").fetchall():
+        rows = conn.execute(
+            "SELECT id, chunk_index, start_line, text, meta_json FROM chunks WHERE doc_id=? ORDER BY chunk_index", (doc_id,)
+        ).fetchall()
+        chunks = [Chunk(r["chunk_index"], r["start_line"] or 1, r["start_line"] or 1, r["text"], "", {}) for r in rows]
+        xrefs = analyze_chunks(doc_type, chunks)
+        _drop_xref(conn, [doc_id])
+        _write_xref(conn, [int(r["id"]) for r in rows], xrefs)
+        conn.executemany(
+            "UPDATE chunks SET meta_json=json_set(COALESCE(meta_json, '{}'), '$.features', json(?)) WHERE id=?",
+            [(json.dumps(x[0], ensure_ascii=False), int(r["id"])) for r, x in zip(rows, xrefs) if x[0]],
+        )
+        n += len(rows)
+    set_meta(conn, "xref", "1")
+    conn.commit()
+    return n
+
+
+def chunk_features(conn: sqlite3.Connection, chunk_ids: Iterable[int]) -> Dict[int, Dict]:
+    """{chunk_id: features extraites à l'indexation} (chunks sans features absents)."""
+    ids = [int(i) for i in chunk_ids]
+    out: Dict[int, Dict] = {}
+    for i in range(0, len(ids), 500):
+        part = ids[i:i + 500]
+        marks = ",".join("?" * len(part))
+        for cid, features in conn.execute(
+            f"SELECT id, json_extract(meta_json, '$.features') FROM chunks WHERE id IN ({marks})", part
+        ):
+            if features:
+                out[int(cid)] = json.loads(features)
+    return out
+
+
+def chunks_defining(conn: sqlite3.Connection, chunk_ids: List[int], names: List[str]) -> Dict[int, List[str]]:
+    """{chunk_id: [noms définis]} parmi chunk_ids pour les symboles names (casse ignorée)."""
+    if not chunk_ids or not names:
+        return {}
+    id_marks = ",".join("?" * len(chunk_ids))
+    name_marks = ",".join("?" * len(names))
+    out: Dict[int, List[str]] = {}
+    for r in conn.execute(
+        f"SELECT chunk_id, name FROM symbols WHERE name IN ({name_marks}) AND chunk_id IN ({id_marks})",
+        [*names, *chunk_ids],
+    ):
+        out.setdefault(int(r[0]), []).append(r[1])
+    return out
+
+
+def xref_lookup(
+    conn: sqlite3.Connection,
+    name: str,
+    kind: Optional[str] = None,
+    prefix: bool = False,
+    limit: int = 200,
+) -> Dict[str, List[Dict]]:
+    """Définitions et références d'un symbole (nom sans casse, ou préfixe).
+
+    {"definitions": [...], "references": [...]} ; chaque entrée porte kind, name,
+    path, doc_type, line et chunk_id ; une référence porte aussi "caller"
+    (symbole englobant, cf. symbols.analyze_chunks).
+    """
+    if prefix:
+        cond, param = "x.name LIKE ? ESCAPE '\\'", name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    else:
+        cond, param = "x.name = ?", name
+    params: List = [param]
+    if kind:
+        cond += " AND x.kind = ?"
+        params.append(kind)
+    out: Dict[str, List[Dict]] = {}
+    for key, table, caller in (("definitions", "symbols", ""), ("references", "refs", ", x.caller")):
+        out[key] = [
+            dict(r)
+            for r in conn.execute(
+                f"""
+                SELECT x.kind, x.name, d.path, d.doc_type, x.line, x.chunk_id {caller}
+                FROM {table} x
+                JOIN chunks c ON c.id = x.chunk_id
+                JOIN documents d ON d.id = c.doc_id
+                WHERE {cond}
+                ORDER BY d.path, x.line
+                LIMIT ?;
+                """,
+                [*params, limit],
+            )
+        ]
+    return out
@@ -0,0 +1,187 @@
+"""Extraction de symboles et de références par chunk (C, DCL, SQL), faite une fois à l'indexation.
+
+- features : résumé utilisé par rag.answer_rules (commandes DCL, appels C les plus
+  fréquents, tables SQL), stocké dans chunks.meta_json ;
+- définitions (table symbols) : fonctions C, labels DCL, procédures SQL ;
+- références (table refs) : appels C, procédures DCL (@), images (RUN), GOTO/GOSUB,
+  tables SQL. Lignes absolues dans le document.
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models import Chunk
+
+# (kind, name, line)
+XrefRow = Tuple[str, str, int]
+# (features, définitions, références (kind, name, line, appelant)) d'un chunk
+ChunkXref = Tuple[Dict, List[XrefRow], List[Tuple[str, str, int, Optional[str]]]]
+
+_DCL_CMD_RE = re.compile(
+    r"^\s*\$\s*(RUN|MCR|PIPE|SUBMIT|COPY|APPEND|RENAME|DELETE|PURGE|SET|ON|GOTO|CALL|@)\b(.*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_DCL_LABEL_RE = re.compile(r"^\s*\$([A-Za-z0-9_]+):\s*$", re.MULTILINE)
+_DCL_ONERR_RE = re.compile(r"^\s*\$\s*ON\s+ERROR\b(.*)$", re.IGNORECASE | re.MULTILINE)
+_DCL_EXIT_RE = re.compile(r"^\s*\$\s*(EXIT|STOP|LOGOUT)\b(.*)$", re.IGNORECASE | re.MULTILINE)
+# @proc, RUN image, GOTO/GOSUB label (y compris après THEN)
+_DCL_PROC_RE = re.compile(r"(?:^\s*\$\s*|\bTHEN\s+)@\s*([^\s/,\"]+)", re.IGNORECASE | re.MULTILINE)
+_DCL_RUN_RE = re.compile(r"(?:^\s*\$\s*|\bTHEN\s+)(?:RUN|MCR)\s+(?:/\S+\s+)*([^\s/,\"]+)", re.IGNORECASE | re.MULTILINE)
+_DCL_GOTO_RE = re.compile(r"\b(GOTO|GOSUB)\s+([A-Za-z0-9_$]+)", re.IGNORECASE)
+# labels pour xref : "$LABEL:" comme "$ LABEL:"
+_DCL_XLABEL_RE = re.compile(r"^\s*\$\s*([A-Za-z0-9_$]+):", re.MULTILINE)
+
+_C_CALL_RE = re.compile(r"\b([A-Za-z_]\w*)\s*\(", re.MULTILINE)
+# appels pour xref : identifiants VMS entiers (LIB$SIGNAL, SYS$QIOW)
+_C_REF_RE = re.compile(r"(?<![\w$])([A-Za-z_][\w$]*)\s*\(")
+_C_DEF_RE = re.compile(r"^[A-Za-z_][\w \t\*]*?\b([A-Za-z_]\w*)[ \t]*\([^;{}]*\)\s*\{", re.MULTILINE)
+_C_KEYWORDS = {"if", "for", "while", "switch", "return", "sizeof", "typedef"}
+
+_SQL_TABLE_RE = re.compile(r"\bFROM\s+([A-Za-z0-9_\.]+)|\bJOIN\s+([A-Za-z0-9_\.]+)|\bUPDATE\s+([A-Za-z0-9_\.]+)|\bINTO\s+([A-Za-z0-9_\.]+)", re.IGNORECASE)
+_SQL_PROC_RE = re.compile(r"^\s*PROCEDURE\s+([A-Za-z0-9_$]+)", re.IGNORECASE | re.MULTILINE)
+
+_NEWLINE_RE = re.compile("\n")
+
+# kinds de définitions et de références (xref)
+DEF_KINDS = ("function", "label", "procedure")
+REF_KINDS = ("call", "run", "goto", "table")
+
+
+def extract_dcl_features(text: str) -> Dict:
+    labels = [m.group(1) for m in _DCL_LABEL_RE.finditer(text)]
+    onerr = [m.group(1).strip() for m in _DCL_ONERR_RE.finditer(text)]
+    exits = [m.group(1).upper() for m in _DCL_EXIT_RE.finditer(text)]
+    cmds = []
+    for m in _DCL_CMD_RE.finditer(text):
+        cmd = m.group(1).upper()
+        rest = (m.group(2) or "").strip()
+        # keep compact preview
+        cmds.append({"cmd": cmd, "arg": rest[:160]})
+    return {"labels": labels[:50], "on_error": onerr[:20], "exits": exits[:20], "commands": cmds[:80]}
+
+
+def extract_c_features(text: str) -> Dict:
+    # Very light: most frequent call names (excluding obvious keywords)
+    names = [m.group(1) for m in _C_CALL_RE.finditer(text)]
+    filt = [n for n in names if n not in _C_KEYWORDS and len(n) <= 40]
+    # count top
+    counts: Dict[str, int] = {}
+    for n in filt:
+        counts[n] = counts.get(n, 0) + 1
+    top = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:20]
+    return {"top_calls": top}
+
+
+def _sql_tables(text: str) -> List[Tuple[str, int]]:
+    """(table, position) dans l'ordre du texte."""
+    out = []
+    for m in _SQL_TABLE_RE.finditer(text):
+        for i, g in enumerate(m.groups(), start=1):
+            if g:
+                t = g.strip().rstrip(";")
+                if t:
+                    out.append((t, m.start(i)))
+    return out
+
+
+def extract_sql_features(text: str) -> Dict:
+    uniq = []
+    seen = set()
+    for t, _ in _sql_tables(text):
+        tl = t.lower()
+        if tl not in seen:
+            seen.add(tl)
+            uniq.append(t)
+    return {"tables": uniq[:40]}
+
+
+def extract_features(doc_type: str, text: str) -> Dict:
+    """Résumé pour le mode rules ({} pour les types sans extraction)."""
+    if doc_type == "dcl":
+        return extract_dcl_features(text)
+    if doc_type == "c":
+        return extract_c_features(text)
+    if doc_type == "sqlmod":
+        return extract_sql_features(text)
+    return {}
+
+
+def _dcl_basename(spec: str) -> str:
+    """COM:SUB_010.COM -> SUB_010 ; SYS$SYSTEM:[X]PROG.EXE;1 -> PROG."""
+    name = re.split(r"[:\]>]", spec)[-1]
+    return name.split(";")[0].split(".")[0]
+
+
+def extract_xref(doc_type: str, text: str, start_line: int = 1) -> Tuple[List[XrefRow], List[XrefRow]]:
+    """(définitions, références) [(kind, name, ligne)] d'un texte débutant à start_line."""
+    newlines = [m.start() for m in _NEWLINE_RE.finditer(text)]
+
+    def line(pos: int) -> int:
+        return start_line + bisect_right(newlines, pos - 1)
+
+    defs: List[XrefRow] = []
+    refs: List[XrefRow] = []
+    if doc_type == "dcl":
+        defs += [("label", m.group(1), line(m.start(1))) for m in _DCL_XLABEL_RE.finditer(text)]
+        for m in _DCL_PROC_RE.finditer(text):
+            name = _dcl_basename(m.group(1))
+            if name:
+                refs.append(("call", name, line(m.start(1))))
+        for m in _DCL_RUN_RE.finditer(text):
+            name = _dcl_basename(m.group(1))
+            if name:
+                refs.append(("run", name, line(m.start(1))))
+        refs += [("goto", m.group(2), line(m.start(2))) for m in _DCL_GOTO_RE.finditer(text)]
+    elif doc_type == "c":
+        def_pos = set()
+        for m in _C_DEF_RE.finditer(text):
+            if m.group(1) not in _C_KEYWORDS:
+                defs.append(("function", m.group(1), line(m.start(1))))
+                def_pos.add(m.start(1))
+        refs += [
+            ("call", m.group(1), line(m.start(1)))
+            for m in _C_REF_RE.finditer(text)
+            if m.group(1) not in _C_KEYWORDS and m.start(1) not in def_pos and len(m.group(1)) <= 40
+        ]
+    elif doc_type == "sqlmod":
+        defs += [("procedure", m.group(1), line(m.start(1))) for m in _SQL_PROC_RE.finditer(text)]
+        refs += [("table", t, line(pos)) for t, pos in _sql_tables(text)]
+    return defs, refs
+
+
+class XrefAnalyzer:
+    """features + symboles + références des chunks successifs d'un document.
+
+    Chaque référence porte son appelant : le symbole défini le plus près avant
+    elle dans le document (fonction C, label DCL, procédure SQL), None au
+    niveau fichier. Les chunks peuvent être fournis par lots, dans l'ordre du
+    document (lecture en flux).
+    """
+
+    def __init__(self, doc_type: str):
+        self.doc_type = doc_type
+        self._def_lines: List[int] = []
+        self._def_names: List[str] = []
+
+    def analyze(self, chunks: Sequence[Chunk]) -> List[ChunkXref]:
+        extracted = [extract_xref(self.doc_type, ch.text, ch.start_line) for ch in chunks]
+        for d, _ in extracted:
+            for _, name, line in d:
+                i = bisect_right(self._def_lines, line)
+                self._def_lines.insert(i, line)
+                self._def_names.insert(i, name)
+        out: List[ChunkXref] = []
+        for ch, (d, refs) in zip(chunks, extracted):
+            rows = []
+            for kind, name, line in dict.fromkeys(refs):
+                i = bisect_right(self._def_lines, line)
+                rows.append((kind, name, line, self._def_names[i - 1] if i else None))
+            out.append((extract_features(self.doc_type, ch.text), d, rows))
+        return out
+
+
+def analyze_chunks(doc_type: str, chunks: Sequence[Chunk]) -> List[ChunkXref]:
+    """XrefAnalyzer sur tous les chunks d'un document (exécuté par les workers d'indexation)."""
+    return XrefAnalyzer(doc_type).analyze(chunks)